@@ -0,0 +1,158 @@
+# Microbenchmark for http_parser.RequestParser against the string helpers
+# server.py and proxy.py used before (copied below as the baseline).
+#
+# The legacy path decodes the request and calls get_request_line, get_html_version,
+# get_method, get_path and get_headers_dict, which split the request text about
+# five times. The parser works on bytes and splits the head once.
+#
+#   python bench_parser.py --requests 100000
+import argparse
+import time
+from urllib.parse import urlparse
+
+from http_parser import ParseError, RequestParser
+
+# --- Legacy helpers (baseline) ---
+def get_headers(request):
+    lines = request.split('\n')
+    return lines
+
+def get_request_line(request):
+    lines = request.split('\r\n')
+    if len(lines) > 0:
+        return lines[0]
+    return ''
+
+def get_html_version(request):
+    request_line = get_request_line(request)
+    parts = request_line.split(' ')
+    if len(parts) == 3:
+        return parts[2]
+    return ''
+
+def get_method(request):
+    request_line = get_request_line(request)
+    parts = request_line.split(' ')
+    if len(parts) >= 1:
+        return parts[0]
+    return ''
+
+def get_headers_dict(request):
+    headers = get_headers(request)
+    headerLines = {}
+
+    for header in headers[1:]:
+        if ': ' in header:
+            key, value = header.split(': ', 1)
+            headerLines[key.lower()] = value
+    return headerLines
+
+def get_path(headerComponents):
+    if len(headerComponents) >= 2:
+        if 'http://' in headerComponents[1]:
+            path = urlparse(headerComponents[1]).path
+        else:
+            path = headerComponents[1]
+    else:
+        return '/'
+    return path
+
+def legacy_parse(data):
+    request = data.decode()
+    request_line = get_request_line(request)
+    return (get_method(request), get_path(request_line.split(' ')),
+            get_html_version(request), get_headers_dict(request))
+
+# --- Sample requests ---
+SIMPLE = (b'GET /test.html HTTP/1.1\r\n'
+          b'Host: 127.0.0.1:12000\r\n'
+          b'User-Agent: curl/7.88.1\r\n'
+          b'Accept: */*\r\n\r\n')
+
+PROXIED = (b'GET http://127.0.0.1:12000/test.html HTTP/1.1\r\n'
+           b'Host: 127.0.0.1:12000\r\n'
+           b'User-Agent: Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0\r\n'
+           b'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n'
+           b'Accept-Language: en-CA,en-US;q=0.7,en;q=0.3\r\n'
+           b'Accept-Encoding: gzip, deflate\r\n'
+           b'If-Modified-Since: Tue, 25 Nov 2025 02:19:50 GMT\r\n'
+           b'Cache-Control: max-age=0\r\n'
+           b'Proxy-Connection: keep-alive\r\n\r\n')
+
+# Checks that the parser handles split, whole, pipelined, Content-Length and chunked input,
+# and rejects chunk sizes that aren't plain hex
+def self_check():
+    chunked = (b'POST /upload HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+               b'5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\n')
+    with_length = b'POST /form HTTP/1.1\r\nContent-Length: 7\r\n\r\na=1&b=2'
+    stream = SIMPLE + chunked + with_length + PROXIED
+
+    # Feed one byte at a time, the worst case for an incremental parser
+    parser = RequestParser()
+    requests = []
+    for i in range(len(stream)):
+        requests += parser.feed(stream[i:i + 1])
+
+    assert [r.path for r in requests] == ['/test.html', '/upload', '/form', '/test.html']
+    assert requests[1].body == b'hello world'
+    assert requests[2].body == b'a=1&b=2'
+    assert requests[3].headers['if-modified-since'] == 'Tue, 25 Nov 2025 02:19:50 GMT'
+    assert b''.join(r.raw for r in requests) == stream
+    assert parser.pending == 0
+
+    # Whole, then split inside the chunked body: bodyless requests take the fast path,
+    # the others are handed to the buffered one
+    for split in (len(stream), len(SIMPLE) + 60):
+        parser = RequestParser()
+        requests = parser.feed(stream[:split]) + parser.feed(stream[split:])
+        assert [r.body for r in requests] == [b'', b'hello world', b'a=1&b=2', b'']
+        assert b''.join(r.raw for r in requests) == stream
+        assert parser.pending == 0
+
+    # A negative size would move the parser backwards over bytes it already read
+    for size in (b'-5', b'0x5', b'+5', b'5_0', b''):
+        try:
+            RequestParser().feed(b'POST /upload HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n'
+                                 + size + b'\r\nhello\r\n0\r\n\r\n')
+        except ParseError:
+            continue
+        raise AssertionError(f'chunk size {size!r} accepted')
+
+def bench(label, fn, count):
+    start = time.perf_counter()
+    fn(count)
+    elapsed = time.perf_counter() - start
+    print(f'{label:<40} {count / elapsed:>12,.0f} req/s {elapsed / count * 1e6:>8.2f} us/req')
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shared request parser')
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    self_check()
+
+    for name, sample in (('simple', SIMPLE), ('proxied', PROXIED)):
+        def run_legacy(count, sample=sample):
+            for _ in range(count):
+                legacy_parse(sample)
+
+        def run_parser(count, sample=sample):
+            for _ in range(count):
+                RequestParser().feed(sample)
+
+        # Many requests through one parser, like a keep-alive connection
+        def run_pipelined(count, sample=sample):
+            parser = RequestParser()
+            batch = sample * 100
+            for _ in range(count // 100):
+                parser.feed(batch)
+
+        print(f'--- {name} request ({len(sample)} bytes) ---')
+        legacy = bench('legacy helpers', run_legacy, args.requests)
+        fresh = bench('RequestParser (new parser each request)', run_parser, args.requests)
+        pipelined = bench('RequestParser (pipelined, 100 per feed)', run_pipelined, args.requests)
+        print(f'speedup: {legacy / fresh:.2f}x per request, {legacy / pipelined:.2f}x pipelined')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Per-route benchmark for the origin's request handling
+#
+# Times build_response (route lookup + response) and the full per-request path
+# (parse + route + response) for each route in server.py, with no sockets
+# involved. The static routes serve www/test.html.
+#
+#   python bench_routes.py --requests 100000
+import argparse
+import contextlib
+import io
+import time
+
+import server
+from http_parser import RequestParser
+
+ROUTES = [
+    ('welcome', b'GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'),
+    ('static', b'GET /test.html HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'),
+    ('static 304', b'GET /test.html HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                   b'If-Modified-Since: Fri, 01 Jan 2100 00:00:00 GMT\r\n\r\n'),
+    ('not found', b'GET /garbage.txt HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'),
+    ('forbidden', b'GET /secret/key.txt HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'),
+    ('bad version', b'GET / HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n'),
+]
+
+def bench(label, fn, count):
+    start = time.perf_counter()
+    fn(count)
+    elapsed = time.perf_counter() - start
+    return count / elapsed, elapsed / count * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark origin routes')
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f'{"route":<12} {"status":<8} {"route req/s":>12} {"us":>7} {"parse+route req/s":>18} {"us":>7}')
+    for name, raw in ROUTES:
+        request = RequestParser().feed(raw)[0]
+
+        def route_only(count, request=request):
+            for _ in range(count):
+                server.build_response(request)
+
+        def parse_and_route(count, raw=raw):
+            for _ in range(count):
+                server.build_response(RequestParser().feed(raw)[0])
+
+        # build_response logs the request line, keep that out of the terminal
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            response, _ = server.build_response(request)
+            route_rate, route_us = bench(name, route_only, args.requests)
+            out.seek(0)
+            out.truncate()
+            full_rate, full_us = bench(name, parse_and_route, args.requests)
+
+        if isinstance(response, tuple):
+            response = response[0]
+        status = response.split(b' ', 2)[1].decode()
+        print(f'{name:<12} {status:<8} {route_rate:>12,.0f} {route_us:>7.2f} {full_rate:>18,.0f} {full_us:>7.2f}')
+
+if __name__ == '__main__':
+    main()
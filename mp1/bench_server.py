@@ -0,0 +1,109 @@
+# Benchmark comparing the threaded and asyncio serving modes of server.py
+#
+# Starts server.py once per mode (no injected latency), opens
+# connections from many concurrent clients, sends one request per connection
+# and reports connections/sec plus latency percentiles.
+#
+#   python bench_server.py --connections 2000 --concurrency 200
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+HOST = '127.0.0.1'
+BASE_PORT = 12100   # Each mode gets its own port so TIME_WAIT sockets don't collide
+
+# helper function to wait until the server accepts connections
+async def wait_for_server(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+# Opens one connection, sends one request and reads the full response.
+# Returns latency in seconds or None on failure
+async def one_connection(host, port, request):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(request)
+        await writer.drain()
+        await reader.read()     # server closes after Connection: close
+        writer.close()
+    except OSError:
+        return None
+    return time.perf_counter() - start
+
+async def run_load(host, port, path, connections, concurrency):
+    request = f'GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode()
+    latencies = []
+    failures = 0
+    remaining = connections
+
+    async def worker():
+        nonlocal remaining, failures
+        while remaining > 0:
+            remaining -= 1
+            latency = await one_connection(host, port, request)
+            if latency is None:
+                failures += 1
+            else:
+                latencies.append(latency)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return latencies, failures, elapsed
+
+# helper function to get a percentile from sorted samples
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+    return samples[index]
+
+def bench_mode(mode, port, args):
+    server = subprocess.Popen(
+        [sys.executable, 'server.py', '--mode', mode, '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_for_server(HOST, port))
+        latencies, failures, elapsed = asyncio.run(
+            run_load(HOST, port, args.path, args.connections, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'conn_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'failures': failures,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded and asyncio server modes')
+    parser.add_argument('--connections', type=int, default=2000, help='total connections per mode')
+    parser.add_argument('--concurrency', type=int, default=100, help='connections in flight at once')
+    parser.add_argument('--path', default='/', help='request path (default: /)')
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asyncio'])
+    args = parser.parse_args()
+
+    print(f'{args.connections} connections, {args.concurrency} concurrent, GET {args.path}')
+    print(f'{"mode":<10} {"conn/s":>10} {"p50 ms":>10} {"p99 ms":>10} {"failed":>8}')
+    for i, mode in enumerate(args.modes):
+        result = bench_mode(mode, BASE_PORT + i, args)
+        print(f'{result["mode"]:<10} {result["conn_per_sec"]:>10.0f} {result["p50_ms"]:>10.2f} '
+              f'{result["p99_ms"]:>10.2f} {result["failures"]:>8}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# Latency injection for server.py and proxy.py
+#
+# Replaces the hard-coded time.sleep(5) the servers used to demonstrate
+# threading. Off by default. A spec string picks the mode:
+#
+#   off                             no delay
+#   fixed:0.5                       every request waits 0.5s
+#   random:0.05-0.25                uniform random delay between 0.05s and 0.25s
+#   route:/test.html=0.2,/=0.01     delay by path prefix, longest prefix wins
+#
+# Random delays are seedable so a load test can be repeated exactly.
+import random
+
+class LatencyInjector:
+    def __init__(self, mode='off', delay=0.0, low=0.0, high=0.0, routes=None, seed=None):
+        if mode not in ('off', 'fixed', 'random', 'route'):
+            raise ValueError(f'Unknown latency mode: {mode!r}')
+        self.mode = mode
+        self.delay = delay
+        self.low = low
+        self.high = high
+        # Longest prefix first so '/test.html' wins over '/'
+        self.routes = sorted((routes or {}).items(), key=lambda route: len(route[0]), reverse=True)
+        self.rng = random.Random(seed)
+
+        # Stats
+        self.injected = 0
+        self.total_delay = 0.0
+
+    @classmethod
+    def from_spec(cls, spec, seed=None):
+        mode, _, arg = (spec or 'off').partition(':')
+        try:
+            if mode == 'off':
+                return cls(seed=seed)
+            if mode == 'fixed':
+                return cls('fixed', delay=float(arg), seed=seed)
+            if mode == 'random':
+                low, _, high = arg.partition('-')
+                return cls('random', low=float(low), high=float(high or low), seed=seed)
+            if mode == 'route':
+                routes = {}
+                for item in arg.split(','):
+                    prefix, _, delay = item.partition('=')
+                    routes[prefix] = float(delay)
+                return cls('route', routes=routes, seed=seed)
+        except ValueError:
+            pass
+        raise ValueError(f'Bad latency spec: {spec!r} (expected off, fixed:S, random:LOW-HIGH or route:/path=S,...)')
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    # Seconds to delay a request for the given path
+    def delay_for(self, path='/'):
+        if self.mode == 'off':
+            return 0.0
+        if self.mode == 'fixed':
+            delay = self.delay
+        elif self.mode == 'random':
+            delay = self.rng.uniform(self.low, self.high)
+        else:
+            delay = 0.0
+            for prefix, route_delay in self.routes:
+                if path.startswith(prefix):
+                    delay = route_delay
+                    break
+
+        if delay > 0:
+            self.injected += 1
+            self.total_delay += delay
+        return delay
+
+    def __str__(self):
+        if self.mode == 'fixed':
+            return f'fixed {self.delay}s'
+        if self.mode == 'random':
+            return f'random {self.low}-{self.high}s'
+        if self.mode == 'route':
+            return 'route ' + ', '.join(f'{prefix}={delay}s' for prefix, delay in self.routes)
+        return 'off'
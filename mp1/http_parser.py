@@ -0,0 +1,286 @@
+# Incremental HTTP/1.x parser shared by server.py and proxy.py
+#
+# RequestParser is fed raw bytes as they come off the socket and hands back
+# every request that is complete so far. The request line and headers are
+# parsed in one pass once the blank line arrives, bodies are framed by
+# Content-Length or chunked transfer encoding, and anything left over is kept
+# for the next feed() so partial and pipelined requests both work.
+#
+# Most requests are bodyless and arrive whole in one recv. While nothing is
+# pending, feed() parses those straight from the received bytes: no copy into
+# the buffer, and a request that is all of data keeps data itself as its raw
+# bytes. The buffered state machine takes over at the first request that has
+# a body or is incomplete.
+import re
+
+MAX_HEAD_SIZE = 64 * 1024           # Largest request line + headers we will buffer
+MAX_BODY_SIZE = 16 * 1024 * 1024    # Largest request body we will accept
+CHUNK_SIZE = re.compile(rb'[0-9A-Fa-f]+')   # Hex digits only, int() would also take a sign, 0x or _
+
+class ParseError(ValueError):
+    pass
+
+# One parsed request
+class Request:
+    __slots__ = ('method', 'target', 'version', 'headers', 'body', 'raw')
+
+    def __init__(self, method, target, version, headers, body, raw):
+        self.method = method        # 'GET'
+        self.target = target        # Request target as sent, '/test.html' or 'http://host:port/test.html'
+        self.version = version      # 'HTTP/1.1'
+        self.headers = headers      # Lower-cased header name -> value
+        self.body = body            # Decoded body bytes (chunked framing removed)
+        self.raw = raw              # Exact bytes of the request as received, for forwarding
+
+    @property
+    def request_line(self):
+        return f'{self.method} {self.target} {self.version}'
+
+    # Path part of the target. Proxies send the absolute URL, servers get the path directly
+    @property
+    def path(self):
+        target = self.target
+        if not target:
+            return '/'
+        if '://' in target:
+            target = target.split('://', 1)[1]
+            slash = target.find('/')
+            target = target[slash:] if slash != -1 else '/'
+        query = target.find('?')
+        return target[:query] if query != -1 else target
+
+# helper function to find the end of a header block, returns (index, separator length).
+# Accepts bare '\n' line endings as well as '\r\n'
+def find_head_end(data, start=0):
+    head_end = data.find(b'\r\n\r\n', start)
+    if head_end != -1:
+        return head_end, 4
+    head_end = data.find(b'\n\n', start)
+    if head_end != -1:
+        return head_end, 2
+    return -1, 0
+
+# helper function to parse header lines into a dict with lower-cased names.
+# Repeated headers are joined with ', '
+def parse_headers(lines):
+    headers = {}
+    for line in lines:
+        name, sep, value = line.partition(':')
+        if not sep:
+            continue
+        name = name.lower()    # No whitespace allowed before the colon
+        value = value.strip()
+        if name in headers:
+            headers[name] += ', ' + value
+        else:
+            headers[name] = value
+    return headers
+
+# helper function to split the head of a request, returns (method, target, version, headers)
+def parse_request_head(head, newline):
+    lines = head.decode('latin-1').split(newline)
+    parts = lines[0].split(' ')
+    method = parts[0]
+    target = parts[1] if len(parts) >= 2 else ''
+    version = parts[2] if len(parts) == 3 else ''
+    return method, target, version, parse_headers(lines[1:])
+
+# helper function to get status code and headers from the head of a response
+def parse_response_head(head):
+    lines = head.decode('latin-1').split('\n')
+    parts = lines[0].split(' ', 2)
+    status = int(parts[1]) if len(parts) >= 2 and parts[1].isdigit() else 0
+    return status, parse_headers(lines[1:])
+
+class RequestParser:
+    def __init__(self, max_head=MAX_HEAD_SIZE, max_body=MAX_BODY_SIZE):
+        self.max_head = max_head
+        self.max_body = max_body
+        self.buffer = bytearray()
+        self.pos = 0            # Where parsing resumes in buffer
+        self.start = 0          # Where the current request starts in buffer
+        self.scan_from = 0      # Where to resume looking for the end of the head
+        self.error = None       # ParseError hit after earlier requests were returned
+
+        # State for the request whose head has been parsed but whose body is incomplete
+        self.current = None
+        self.remaining = 0      # Content-Length bytes still to come
+        self.chunked = False
+        self.chunk_left = None  # Bytes left in the current chunk (+2 for its CRLF), None = reading a size line
+        self.in_trailers = False
+        self.body = bytearray()
+
+    # Bytes received but not yet part of a complete request
+    @property
+    def pending(self):
+        return len(self.buffer) - self.start
+
+    # Adds received bytes, returns the list of requests completed by them.
+    # Malformed input raises ParseError, unless requests before it completed in the
+    # same feed. Those are returned and the error is left in self.error for the caller
+    def feed(self, data):
+        if self.error is not None:
+            raise self.error
+        requests = []
+        if self.current is None and not self.buffer and type(data) is bytes:
+            try:
+                data = self.parse_whole(data, requests)
+            except ParseError as e:
+                self.error = e
+                if not requests:
+                    raise
+                return requests
+        self.buffer += data
+        while self.current is not None or self.pos < len(self.buffer):
+            try:
+                request = self.parse_one()
+            except ParseError as e:
+                self.error = e
+                if not requests:
+                    raise
+                break
+            if request is None:
+                break
+            requests.append(request)
+
+        # Drop consumed bytes so the buffer doesn't grow across a long connection
+        if self.start:
+            del self.buffer[:self.start]
+            self.pos -= self.start
+            self.scan_from = max(0, self.scan_from - self.start)
+            self.start = 0
+        return requests
+
+    # Fast path while nothing is pending: parses the complete bodyless requests at the start of
+    # data without buffering them. Returns the rest of data for the buffered path, with the head
+    # of a request that has a body already parsed into self.current
+    def parse_whole(self, data, requests):
+        pos = 0
+        end = len(data)
+        while pos < end:
+            head_end = data.find(b'\r\n\r\n', pos)
+            if head_end == -1 or head_end - pos > self.max_head or data[pos] in b'\r\n':
+                break
+            head = parse_request_head(data[pos:head_end], '\r\n')
+            headers = head[3]
+            if 'content-length' in headers or 'transfer-encoding' in headers:
+                # Hand the request over to the buffered path, framing and all
+                self.frame_body(headers)
+                self.current = head
+                self.pos = head_end + 4 - pos
+                break
+            next_pos = head_end + 4
+            raw = data if pos == 0 and next_pos == end else data[pos:next_pos]
+            requests.append(Request(*head, b'', raw))
+            pos = next_pos
+        return data[pos:] if pos else data
+
+    def parse_one(self):
+        if self.current is None and not self.parse_head():
+            return None
+
+        # Requests without a body (most GETs) skip the body state entirely
+        if self.chunked or self.remaining:
+            if not self.parse_body():
+                return None
+            body = bytes(self.body)
+            self.body = bytearray()
+        else:
+            body = b''
+
+        method, target, version, headers = self.current
+        raw = bytes(self.buffer[self.start:self.pos])
+        request = Request(method, target, version, headers, body, raw)
+
+        self.start = self.pos
+        self.scan_from = self.pos
+        self.current = None
+        return request
+
+    # Parses the request line and headers in one pass once the blank line has arrived
+    def parse_head(self):
+        buffer = self.buffer
+
+        # Tolerate blank lines between pipelined requests
+        while self.pos < len(buffer) and buffer[self.pos] in b'\r\n':
+            self.pos += 1
+            self.start = self.scan_from = self.pos
+
+        head_end, sep_len = find_head_end(buffer, max(self.pos, self.scan_from - 3))
+        if head_end == -1:
+            if len(buffer) - self.pos > self.max_head:
+                raise ParseError('Request head too large')
+            self.scan_from = len(buffer)
+            return False
+        if head_end - self.pos > self.max_head:
+            raise ParseError('Request head too large')
+
+        # One decode and one split for the whole head
+        self.current = parse_request_head(buffer[self.pos:head_end], '\r\n' if sep_len == 4 else '\n')
+        self.pos = head_end + sep_len
+        self.frame_body(self.current[3])
+        return True
+
+    # Works out how the body of the request with these headers is framed
+    def frame_body(self, headers):
+        self.remaining = 0
+        self.chunk_left = None
+        self.in_trailers = False
+        if 'transfer-encoding' not in headers and 'content-length' not in headers:
+            self.chunked = False
+            return
+        self.chunked = 'chunked' in headers.get('transfer-encoding', '').lower()
+        if not self.chunked and 'content-length' in headers:
+            length = headers['content-length']
+            if not length.isdigit():
+                raise ParseError(f'Bad Content-Length: {length!r}')
+            self.remaining = int(length)
+            if self.remaining > self.max_body:
+                raise ParseError('Request body too large')
+
+    # Collects the body, returns True once it is complete
+    def parse_body(self):
+        buffer = self.buffer
+        if not self.chunked:
+            available = min(self.remaining, len(buffer) - self.pos)
+            self.body += buffer[self.pos:self.pos + available]
+            self.pos += available
+            self.remaining -= available
+            return self.remaining == 0
+
+        while True:
+            if self.in_trailers:
+                # Trailer section ends with an empty line
+                if buffer[self.pos:self.pos + 2] == b'\r\n':
+                    self.pos += 2
+                    return True
+                trailer_end = buffer.find(b'\r\n\r\n', self.pos)
+                if trailer_end == -1:
+                    return False
+                self.pos = trailer_end + 4
+                return True
+
+            if self.chunk_left is None:
+                line_end = buffer.find(b'\r\n', self.pos)
+                if line_end == -1:
+                    return False
+                size = bytes(buffer[self.pos:line_end]).split(b';', 1)[0].strip()
+                if not CHUNK_SIZE.fullmatch(size):
+                    raise ParseError(f'Bad chunk size: {size!r}')
+                size = int(size, 16)
+                self.pos = line_end + 2
+                if size == 0:
+                    self.in_trailers = True
+                    continue
+                if len(self.body) + size > self.max_body:
+                    raise ParseError('Request body too large')
+                self.chunk_left = size + 2  # chunk data plus its trailing CRLF
+
+            available = min(self.chunk_left, len(buffer) - self.pos)
+            data_left = max(0, self.chunk_left - 2)
+            self.body += buffer[self.pos:self.pos + min(available, data_left)]
+            self.pos += available
+            self.chunk_left -= available
+            if self.chunk_left:
+                return False
+            self.chunk_left = None
@@ -0,0 +1,157 @@
+# Load generator: drives concurrent clients through the proxy to the origin
+#
+# Each client opens a connection to the proxy, sends a GET for an origin URL,
+# reads the whole response and starts over (the proxy closes the client
+# connection after every response). Reports throughput, status codes, latency
+# percentiles and a latency histogram.
+#
+# Against servers that are already running:
+#   python load_test.py --clients 50 --requests 5000
+#
+# Or let it start its own origin and proxy, with injected latency:
+#   python load_test.py --spawn --origin-latency random:0.001-0.01 --clients 50
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+
+from bench_server import percentile, wait_for_server
+
+# Upper edges of the histogram buckets in milliseconds
+HISTOGRAM_EDGES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+HISTOGRAM_WIDTH = 40
+
+# Sends one request through the proxy. Returns (latency seconds, status code), status 0 on failure
+async def one_request(proxy_host, proxy_port, request, timeout):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(proxy_host, proxy_port), timeout)
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return time.perf_counter() - start, 0
+
+    parts = response.split(b' ', 2)
+    status = int(parts[1]) if len(parts) >= 2 and parts[1].isdigit() else 0
+    return time.perf_counter() - start, status
+
+async def run_load(args):
+    requests = [
+        (f'GET http://{args.origin_host}:{args.origin_port}{path} HTTP/1.1\r\n'
+         f'Host: {args.origin_host}:{args.origin_port}\r\n\r\n').encode()
+        for path in args.paths
+    ]
+    latencies = []
+    statuses = {}
+    issued = 0
+    deadline = time.perf_counter() + args.duration if args.duration else None
+
+    async def client():
+        nonlocal issued
+        while True:
+            if deadline is not None:
+                if time.perf_counter() >= deadline:
+                    return
+            elif issued >= args.requests:
+                return
+            request = requests[issued % len(requests)]
+            issued += 1
+
+            latency, status = await one_request(args.proxy_host, args.proxy_port, request, args.timeout)
+            latencies.append(latency)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    return latencies, statuses, time.perf_counter() - start
+
+def print_report(latencies, statuses, elapsed):
+    latencies.sort()
+    total = len(latencies)
+    ok = sum(count for status, count in statuses.items() if 200 <= status < 400)
+
+    print(f'\nRequests: {total} in {elapsed:.2f}s -> {total / elapsed:.1f} req/s ({ok / elapsed:.1f} successful req/s)')
+    print('Status codes: ' + ', '.join(
+        f'{"failed" if status == 0 else status}={count}' for status, count in sorted(statuses.items())))
+    if not latencies:
+        return
+
+    print('Latency (ms): ' + '  '.join(
+        f'{label}={percentile(latencies, pct) * 1000:.2f}'
+        for label, pct in (('p50', 50), ('p90', 90), ('p99', 99), ('p99.9', 99.9))
+    ) + f'  max={latencies[-1] * 1000:.2f}')
+
+    # Latency histogram
+    counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+    for latency in latencies:
+        ms = latency * 1000
+        for i, edge in enumerate(HISTOGRAM_EDGES_MS):
+            if ms <= edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    peak = max(counts)
+    print('\nLatency histogram:')
+    labels = [f'<= {edge} ms' for edge in HISTOGRAM_EDGES_MS] + [f'> {HISTOGRAM_EDGES_MS[-1]} ms']
+    for label, count in zip(labels, counts):
+        if count == 0:
+            continue
+        bar = '#' * max(1, round(count / peak * HISTOGRAM_WIDTH))
+        print(f'  {label:>12} {count:>8} {count / total * 100:6.2f}% {bar}')
+
+# Starts the origin and proxy as subprocesses for a self-contained run
+def spawn_servers(args):
+    origin = subprocess.Popen(
+        [sys.executable, 'server.py', '--port', str(args.origin_port), '--mode', args.origin_mode,
+         '--latency', args.origin_latency, '--seed', str(args.seed)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    proxy = subprocess.Popen(
+        [sys.executable, 'proxy.py', '--port', str(args.proxy_port),
+         '--origin-host', args.origin_host, '--origin-port', str(args.origin_port),
+         '--latency', args.proxy_latency, '--seed', str(args.seed)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return [origin, proxy]
+
+def main():
+    parser = argparse.ArgumentParser(description='Drive concurrent clients through the proxy to the origin')
+    parser.add_argument('--clients', type=int, default=20, help='concurrent clients (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=1000, help='total requests (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=None, help='run for this many seconds instead of --requests')
+    parser.add_argument('--paths', nargs='+', default=['/', '/test.html'], help='origin paths to request, round robin')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per request timeout in seconds')
+    parser.add_argument('--proxy-host', default='127.0.0.1')
+    parser.add_argument('--proxy-port', type=int, default=8080)
+    parser.add_argument('--origin-host', default='127.0.0.1')
+    parser.add_argument('--origin-port', type=int, default=12000)
+    parser.add_argument('--spawn', action='store_true', help='start server.py and proxy.py for the run')
+    parser.add_argument('--origin-mode', choices=['threaded', 'asyncio'], default='threaded')
+    parser.add_argument('--origin-latency', default='off', help='--latency spec for the spawned origin')
+    parser.add_argument('--proxy-latency', default='off', help='--latency spec for the spawned proxy')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the spawned servers\' random latency')
+    args = parser.parse_args()
+
+    processes = spawn_servers(args) if args.spawn else []
+    try:
+        if args.spawn:
+            asyncio.run(wait_for_server(args.origin_host, args.origin_port))
+            asyncio.run(wait_for_server(args.proxy_host, args.proxy_port))
+
+        target = f'{args.duration}s' if args.duration else f'{args.requests} requests'
+        print(f'{args.clients} clients, {target} via proxy {args.proxy_host}:{args.proxy_port} '
+              f'to origin {args.origin_host}:{args.origin_port}, paths {args.paths}')
+        latencies, statuses, elapsed = asyncio.run(run_load(args))
+        print_report(latencies, statuses, elapsed)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == '__main__':
+    main()
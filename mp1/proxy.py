@@ -1,6 +1,14 @@
 from socket import *
+from collections import OrderedDict # Keeps cache entries in least recently used order
+from worker_pool import WorkerPool # Fixed-size pool of handler threads
+from http_parser import RequestParser, ParseError, find_head_end, parse_response_head # Shared HTTP parsing
+import argparse # Allows configuring the proxy at startup
+import logging # Leveled logging, per-request lines only at debug
+import selectors # Allows waiting on both sockets of a tunnel at once
 import threading # Allows multiple connections in parallle
-import time # Allows for time related operations (Testing for multithread)
+import sys
+import time # Allows for time related operations
+from fault_injection import LatencyInjector # Optional artificial latency for testing
 
 PROXY_HOST = '127.0.0.1'
 PROXY_PORT = 8080
@@ -8,118 +16,622 @@ PROXY_PORT = 8080
 ORIGIN_HOST = '127.0.0.1'
 ORIGIN_PORT = 12000
 
-# --- Helpers ---
-def get_headers(request):
-    lines = request.split('\n')
-    return lines
-
-# helper function to get HTTP request line
-def get_request_line(request):
-    lines = request.split('\r\n')
-    if len(lines) > 0:
-        return lines[0]
-    return ''
-
-# helper function to get HTTP version from request line
-def get_html_version(request):
-    request_line = get_request_line(request)
-    parts = request_line.split(' ')
-    if len(parts) == 3:
-        return parts[2]
-    return ''
-
-# helper function to get HTTP method from request line
-# use this to handle specific methods like GET, POST, etc.
-# for this server, we only care about GET
-def get_method(request):
-    request_line = get_request_line(request)
-    parts = request_line.split(' ')
-    if len(parts) >= 1:
-        return parts[0]
-    return ''
-
-def get_headers_dict(request):
-    headers = get_headers(request)
-    headerLines = {}
-
-    for header in headers[1:]:
-        if ': ' in header:
-            key, value = header.split(': ', 1)
-            headerLines[key.lower()] = value
-    return headerLines
-
-
-def parse_request_line_for_path(request):
-    request_line = get_request_line(request)
-    parts = request_line.split(' ')
-    if len(parts) == 3:
-        path = parts[1]
-        # get string after 127.0.0.1:12000
-        return path
-    return '/'
+LISTEN_BACKLOG = 128            # Pending connections the OS queues for accept()
+
+latency = LatencyInjector()     # Off unless --latency is given
+log = logging.getLogger('proxy')
+
+BAD_REQUEST = b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+# --- Worker pool settings ---
+WORKER_THREADS = 32             # Clients served at the same time
+ACCEPT_QUEUE_SIZE = 64          # Accepted clients waiting for a worker, beyond this we answer 503
+
+# --- Cache settings ---
+CACHE_MAX_BYTES = 4 * 1024 * 1024     # Total byte budget for all cached responses
+CACHE_MAX_OBJECT = 512 * 1024         # Largest single response we will keep
+
+# Cached copy of an origin response
+class CacheEntry:
+    def __init__(self, response, last_modified):
+        self.response = response              # Full response bytes (status line, headers and body)
+        self.last_modified = last_modified    # Validator used for If-Modified-Since
+        self.size = len(response)
+
+# In-memory LRU response cache keyed by (method, path)
+# Least recently used entries are evicted once the byte budget is exceeded
+class ResponseCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_object=CACHE_MAX_OBJECT):
+        self.max_bytes = max_bytes
+        self.max_object = max_object
+        self.used_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()  # Handler threads share one cache
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        if entry.size > self.max_object or entry.size > self.max_bytes:
+            return False
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old.size
+
+            self.entries[key] = entry
+            self.used_bytes += entry.size
+
+            # Evict least recently used entries until we are back under budget
+            while self.used_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.used_bytes -= evicted.size
+                self.evictions += 1
+        return True
+
+    def remove(self, key):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used_bytes -= old.size
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+responseCache = ResponseCache()
+
+# --- Origin connection pool settings ---
+POOL_MAX_SIZE = 8               # Max open connections per origin (idle + in use)
+POOL_IDLE_TIMEOUT = 30.0        # Seconds an idle connection may sit in the pool
+POOL_ACQUIRE_TIMEOUT = 10.0     # Seconds to wait for a free connection before giving up
+ORIGIN_TIMEOUT = 10.0           # Socket timeout while talking to the origin
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'TRACE', 'PUT', 'DELETE'}  # Safe to resend (RFC 7230 6.3.1)
+
+# Keep-alive connection to the origin plus bookkeeping for the pool
+class PooledConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.last_used = time.monotonic()
+        self.requests = 0       # Requests carried so far, > 0 means the connection is being reused
+
+# Bounded, thread-safe pool of HTTP/1.1 keep-alive connections to one origin
+class OriginPool:
+    def __init__(self, host, port, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.idle = []          # Idle connections, most recently used last
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_size)  # Caps idle + in use connections
+
+        # Stats
+        self.in_use = 0
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    # Returns a pooled connection, or a new one if fresh is set or none is idle
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT, fresh=False):
+        if not self.slots.acquire(timeout=timeout):
+            raise TimeoutError(f'No free origin connection after {timeout}s')
+
+        try:
+            # Take the warmest idle connection that is still usable
+            while not fresh:
+                with self.lock:
+                    conn = self.idle.pop() if self.idle else None
+                if conn is None:
+                    break
+                if self.is_healthy(conn):
+                    with self.lock:
+                        self.reused += 1
+                        self.in_use += 1
+                    return conn
+                self.discard(conn)
+
+            sock = socket(AF_INET, SOCK_STREAM)
+            sock.settimeout(ORIGIN_TIMEOUT)
+            sock.connect((self.host, self.port))
+        except BaseException:
+            self.slots.release()
+            raise
+
+        with self.lock:
+            self.created += 1
+            self.in_use += 1
+        return PooledConnection(sock)
+
+    def release(self, conn, reusable):
+        with self.lock:
+            self.in_use -= 1
+
+        if reusable:
+            conn.last_used = time.monotonic()
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            self.discard(conn)
+
+        self.reap_idle()
+        self.slots.release()
+
+    def discard(self, conn):
+        with self.lock:
+            self.discarded += 1
+        try:
+            conn.sock.close()
+        except OSError:
+            pass
+
+    # Close connections that have been idle longer than idle_timeout
+    def reap_idle(self):
+        now = time.monotonic()
+        with self.lock:
+            expired = [c for c in self.idle if now - c.last_used > self.idle_timeout]
+            self.idle = [c for c in self.idle if now - c.last_used <= self.idle_timeout]
+        for conn in expired:
+            self.discard(conn)
+
+    # Idle connection is healthy if it has not timed out and the origin has not closed it.
+    # A readable idle socket means EOF or stray bytes, either way it can't be reused
+    def is_healthy(self, conn):
+        if time.monotonic() - conn.last_used > self.idle_timeout:
+            return False
+        try:
+            conn.sock.setblocking(False)
+            try:
+                conn.sock.recv(1, MSG_PEEK)
+            finally:
+                conn.sock.settimeout(ORIGIN_TIMEOUT)
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def stats(self):
+        with self.lock:
+            return {
+                'idle': len(self.idle),
+                'in_use': self.in_use,
+                'max_size': self.max_size,
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+            }
+
+originPools = {}
+originPoolsLock = threading.Lock()
+
+# helper function to get (or create) the connection pool for an origin
+def get_origin_pool(host, port):
+    with originPoolsLock:
+        pool = originPools.get((host, port))
+        if pool is None:
+            pool = OriginPool(host, port)
+            originPools[(host, port)] = pool
+        return pool
+
+# Response read from the origin, framed by Content-Length so the connection can be reused.
+# Responses without a length are read until the origin closes the connection
+class OriginResponse:
+    def __init__(self, sock, method):
+        self.sock = sock
+        self.method = method
+
+        data = b''
+        head_end = -1
+        while head_end == -1:
+            chunk = sock.recv(4096)
+            if not chunk:
+                if not data:
+                    raise ConnectionError('Origin closed connection before responding')
+                head_end = len(data)
+                break
+            data += chunk
+            head_end, sep_len = find_head_end(data)
+            if head_end != -1:
+                head_end += sep_len
+
+        self.head = data[:head_end]
+        self.leftover = data[head_end:]
+        self.status, self.headers = parse_response_head(self.head)
+
+        # Work out how the body is framed
+        if method == 'HEAD' or self.status in (204, 304) or 100 <= self.status < 200:
+            self.length = 0
+        elif self.headers.get('content-length', '').strip().isdigit():
+            self.length = int(self.headers['content-length'])
+        else:
+            self.length = None  # read until close
+
+        version = self.head.split(b' ', 1)[0]
+        connection = self.headers.get('connection', '').lower()
+        self.reusable = (self.length is not None and version == b'HTTP/1.1'
+                         and connection != 'close')
+
+    # Yields body chunks, stopping at Content-Length or when the origin closes.
+    # Chunks are memoryviews into this thread's relay buffer, so each one is only
+    # valid until the next chunk is requested
+    def body_chunks(self):
+        remaining = self.length
+        if self.leftover:
+            chunk = self.leftover if remaining is None else self.leftover[:remaining]
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+        view = get_relay_buffer()
+        while remaining != 0:
+            want = len(view) if remaining is None else min(len(view), remaining)
+            received = self.sock.recv_into(view, want)
+            if not received:
+                if remaining is not None:
+                    # Body was cut short, connection can't be trusted
+                    self.reusable = False
+                return
+            if remaining is not None:
+                remaining -= received
+            yield view[:received]
+
+    def drain(self):
+        for _ in self.body_chunks():
+            pass
+
+# --- Relay buffers ---
+RELAY_CHUNK_SIZE = 64 * 1024    # Bytes read per recv_into while relaying
+TUNNEL_IDLE_TIMEOUT = 60.0      # Seconds a tunnel may sit with no traffic either way
+
+relayBuffers = threading.local()
+
+# helper function to get this thread's reusable relay buffer. Every relay on the
+# thread reads into the same memory instead of allocating a new bytes per recv
+def get_relay_buffer():
+    view = getattr(relayBuffers, 'view', None)
+    if view is None or len(view) != RELAY_CHUNK_SIZE:
+        view = memoryview(bytearray(RELAY_CHUNK_SIZE))
+        relayBuffers.view = view
+    return view
+
+# Byte counters for one relay, reported as throughput when it finishes
+class RelayStats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.to_client = 0
+        self.to_origin = 0
+
+    def report(self, label):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        total = self.to_client + self.to_origin
+        log.debug('[RELAY] %s: %d bytes to origin, %d bytes to client in %.1f ms (%.2f MB/s)',
+                  label, self.to_origin, self.to_client, elapsed * 1000, total / elapsed / 1e6)
+
+# Splice-style pump that copies bytes both ways between two sockets until both
+# sides have closed (or the tunnel goes idle). Each direction reads into its own
+# reused buffer with recv_into, nothing is decoded or copied into new objects.
+# When one side stops sending, the other side's write half is shut down so the
+# close propagates. chunk_size defaults to RELAY_CHUNK_SIZE as --chunk-size set it.
+# Returns (bytes a -> b, bytes b -> a)
+def pump(sockA, sockB, chunk_size=None, idle_timeout=TUNNEL_IDLE_TIMEOUT):
+    chunk_size = chunk_size or RELAY_CHUNK_SIZE
+    buffers = {
+        sockA: memoryview(bytearray(chunk_size)),
+        sockB: memoryview(bytearray(chunk_size)),
+    }
+    peer = {sockA: sockB, sockB: sockA}
+    sent = {sockA: 0, sockB: 0}
+
+    selector = selectors.DefaultSelector()
+    for sock in (sockA, sockB):
+        sock.settimeout(idle_timeout)
+        selector.register(sock, selectors.EVENT_READ)
+
+    try:
+        while selector.get_map():
+            events = selector.select(idle_timeout)
+            if not events:
+                log.debug('[RELAY] Tunnel idle, closing')
+                break
+
+            for key, _ in events:
+                src = key.fileobj
+                view = buffers[src]
+                try:
+                    received = src.recv_into(view)
+                except OSError:
+                    received = 0
+
+                if received:
+                    peer[src].sendall(view[:received])
+                    sent[src] += received
+                    continue
+
+                # Source finished sending, pass the half-close along
+                selector.unregister(src)
+                try:
+                    peer[src].shutdown(SHUT_WR)
+                except OSError:
+                    pass
+    finally:
+        selector.close()
+
+    return sent[sockA], sent[sockB]
+
+# Tunnel mode: relay raw bytes between the client and the origin without parsing.
+# The origin connection belongs to this client, so it doesn't come from the pool
+def handle_tunnel(clientSocket, clientAddr, ORIGIN_HOST, ORIGIN_PORT):
+    log.debug('[%s] Tunnel for %s', threading.current_thread().name, clientAddr)
+    stats = RelayStats()
+    try:
+        originSocket = create_connection((ORIGIN_HOST, ORIGIN_PORT), ORIGIN_TIMEOUT)
+    except OSError as e:
+        log.warning('Error connecting to origin server: %s', e)
+        clientSocket.close()
+        return
+    try:
+        stats.to_origin, stats.to_client = pump(clientSocket, originSocket)
+    except OSError as e:
+        log.warning('Tunnel for %s failed after connecting to the origin: %s', clientAddr, e)
+    finally:
+        originSocket.close()
+        clientSocket.close()
+    stats.report(f'tunnel {clientAddr}')
+
+HOP_HEADERS = (b'connection', b'proxy-connection', b'keep-alive')    # Describe one hop, never forwarded
+
+# helper function to drop the hop-by-hop lines from a head's header lines
+def without_hop_headers(lines):
+    return [line for line in lines if line.split(b':', 1)[0].strip().lower() not in HOP_HEADERS]
+
+# helper function to strip hop-by-hop headers from a client request before it goes to the origin.
+# The proxy owns the origin connection so the client's Connection header does not apply to it
+def prepare_origin_request(request):
+    head_end, sep_len = find_head_end(request)
+    if head_end == -1:
+        return request
+
+    lines = request[:head_end].split(b'\r\n')
+    kept = [lines[0]] + without_hop_headers(lines[1:])
+    return b'\r\n'.join(kept) + b'\r\n\r\n' + request[head_end + sep_len:]
+
+# helper function to rewrite an origin response head for the client. The origin's Connection
+# header is about the pooled origin connection, the client connection closes after one response
+def prepare_client_head(head):
+    head_end, _ = find_head_end(head)
+    if head_end == -1:
+        return head
+
+    lines = head[:head_end].split(b'\r\n')
+    kept = [lines[0]] + without_hop_headers(lines[1:]) + [b'Connection: close']
+    return b'\r\n'.join(kept) + b'\r\n\r\n'
+
+# helper function to send a request over a pooled origin connection.
+# A reused connection may have been closed by the origin since its health check,
+# in that case an idempotent request is retried once on a fresh connection. Others
+# are not, the origin may have acted on them before the connection dropped
+def send_to_origin(pool, request, method):
+    conn = pool.acquire()
+    try:
+        return conn, exchange(conn, request, method)
+    except (ConnectionError, OSError):
+        pool.release(conn, reusable=False)
+        if conn.requests == 0 or method not in IDEMPOTENT_METHODS:
+            raise
+    except BaseException:
+        pool.release(conn, reusable=False)
+        raise
+
+    log.debug('Pooled origin connection was closed, retrying %s on a new one', method)
+    conn = pool.acquire(fresh=True)
+    try:
+        return conn, exchange(conn, request, method)
+    except BaseException:
+        pool.release(conn, reusable=False)
+        raise
+
+# helper function to send a request and read the response head on one origin connection
+def exchange(conn, request, method):
+    conn.sock.sendall(request)
+    response = OriginResponse(conn.sock, method)
+    conn.requests += 1
+    return response
+
+# helper function to turn a request into a conditional GET against the cached copy
+def make_conditional_request(request, last_modified):
+    line_end = request.find(b'\r\n')
+    if line_end == -1:
+        return request
+    header = f'If-Modified-Since: {last_modified}\r\n'.encode()
+    return request[:line_end + 2] + header + request[line_end + 2:]
+
+# helper function to read one complete request from the client.
+# Returns None (after answering 400 if it was malformed) if no request arrived
+def read_client_request(clientSocket, clientAddr):
+    parser = RequestParser()
+    try:
+        while True:
+            data = clientSocket.recv(4096)
+            if not data:
+                return None
+            requests = parser.feed(data)
+            if requests:
+                return requests[0]
+    except ParseError as e:
+        log.debug('Bad request from %s: %s', clientAddr, e)
+        try:
+            clientSocket.sendall(BAD_REQUEST)
+        except OSError:
+            pass
+    except OSError as e:
+        log.warning('Error reading request from %s: %s', clientAddr, e)
+    return None
 
 # Handles client requests and origin request/response
 def handle_client(clientSocket, clientAddr, ORIGIN_HOST, ORIGIN_PORT):
     
-    # Prints start time of current thread
-    start = time.strftime('%H:%M:%S')
-    print(f'[{threading.current_thread().name}] Started {clientAddr} at {start}')
+    # Logs start time of current thread
+    log.debug('[%s] Started %s at %s', threading.current_thread().name, clientAddr, time.strftime('%H:%M:%S'))
 
-    # Pause 5 secs (Test for multithread)
-    time.sleep(5)
+    # Keep reading until one whole request (head and body) has arrived
+    clientRequest = read_client_request(clientSocket, clientAddr)
+    if clientRequest is None:
+        clientSocket.close()
+        return
+
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('Received request:\n%s', clientRequest.raw.decode('latin-1'))
+        log.debug('Request line: %s', clientRequest.request_line)
+
+    processed_request = clientRequest.target
+    log.debug('Processed request path: %s', processed_request)
 
-    clientRequest = clientSocket.recv(4096).decode()
-    print(f'Received request:\n{clientRequest}')
+    # Injected latency (off by default), used to test behaviour with slow requests
+    delay = latency.delay_for(clientRequest.path)
+    if delay:
+        time.sleep(delay)
 
-    request_line = get_request_line(clientRequest)
-    print('Request line: ', request_line)
+    # Only plain GETs are served from cache, a client sending its own
+    # If-Modified-Since wants the origin's answer to that question
+    method = clientRequest.method
+    cache_key = (method, processed_request)
+    cacheable = method == 'GET' and 'if-modified-since' not in clientRequest.headers
 
-    processed_request = parse_request_line_for_path(clientRequest)
-    print('Processed request path: ', processed_request)
+    entry = responseCache.get(cache_key) if cacheable else None
+    outgoing = clientRequest.raw
+    if entry is not None:
+        log.debug('Cache hit for %s, revalidating with origin...', processed_request)
+        outgoing = make_conditional_request(outgoing, entry.last_modified)
 
-    # connect to origin server
-    print('Attempting to connect to origin server...')
+    # send request over a pooled keep-alive connection to the origin server
+    log.debug('Attempting to connect to origin server...')
+    pool = get_origin_pool(ORIGIN_HOST, ORIGIN_PORT)
+    conn = None
+    stats = RelayStats()
     try: 
-        originSocket = socket(AF_INET, SOCK_STREAM)
-        originSocket.connect((ORIGIN_HOST, ORIGIN_PORT))
-        originSocket.sendall(clientRequest.encode())
+        originRequest = prepare_origin_request(outgoing)
+        conn, response = send_to_origin(pool, originRequest, method)
+        stats.to_origin = len(originRequest)
+        log.debug('Sent request to origin server, received response head')
 
-        # receive response from origin server
-        print('Sent request to origin server, waiting for response...')
-        while True:
-            originResponse = originSocket.recv(4096).decode()
-            if not originResponse:
-                break
-            
-            print(f'Received response from origin server:\n{originResponse}')
+        if entry is not None and response.status == 304:
+            log.debug('Origin returned 304, serving %s from cache', processed_request)
+            response.drain()
+            responseCache.record(hit=True)
+            clientSocket.sendall(entry.response)
+            stats.to_client = entry.size
+        else:
+            responseCache.record(hit=False)
+            if entry is not None:
+                responseCache.remove(cache_key)
+
+            clientHead = prepare_client_head(response.head)
+
+            # Keep a copy of cacheable responses while relaying them to the client
+            capture = None
+            if cacheable and response.status == 200 and 'last-modified' in response.headers:
+                capture = bytearray(clientHead)
+
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug('Received response from origin server:\n%s', response.head.decode('latin-1'))
             # send response back to client
-            clientSocket.sendall(originResponse.encode())
+            clientSocket.sendall(clientHead)
+            stats.to_client = len(clientHead)
+
+            for originResponse in response.body_chunks():
+                clientSocket.sendall(originResponse)
+                stats.to_client += len(originResponse)
+
+                if capture is not None:
+                    capture += originResponse
+                    if len(capture) > responseCache.max_object:
+                        capture = None
+
+            if capture is not None:
+                responseCache.put(cache_key, CacheEntry(bytes(capture), response.headers['last-modified']))
+                log.debug('Cached %s (%d bytes, %d/%d used)', processed_request, len(capture),
+                          responseCache.used_bytes, responseCache.max_bytes)
+
+        # Return the origin connection to the pool if its framing allows another request
+        pool.release(conn, response.reusable)
+        conn = None
+        log.debug('Origin pool: %s', pool.stats())
+        stats.report(processed_request)
 
     except Exception as e:
-        print('Error connecting to origin server:', e)
+        log.warning('Error connecting to origin server: %s', e)
     finally:
-        originSocket.close()
+        if conn is not None:
+            pool.release(conn, reusable=False)
         clientSocket.close()
     
-    # Prints end time of current thread
-    end = time.strftime('%H:%M:%S')
-    print(f'[{threading.current_thread().name}] Ended {clientAddr} at {end}')
+    # Logs end time of current thread
+    log.debug('[%s] Ended %s at %s', threading.current_thread().name, clientAddr, time.strftime('%H:%M:%S'))
 
 
-# --- Socket setup ---
-proxySocket = socket(AF_INET, SOCK_STREAM)
-proxySocket.bind((PROXY_HOST, PROXY_PORT))
-proxySocket.listen(5)
-print(f'Proxy server listening on port {PROXY_PORT}...')
+def main():
+    global RELAY_CHUNK_SIZE, latency
 
-while True:
-    clientSocket, clientAddr = proxySocket.accept()
-    print(f'Accepted connection from {clientAddr}')
+    parser = argparse.ArgumentParser(description='Caching proxy server')
+    parser.add_argument('--port', type=int, default=PROXY_PORT)
+    parser.add_argument('--workers', type=int, default=WORKER_THREADS,
+                        help='worker threads handling clients (default: %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=ACCEPT_QUEUE_SIZE,
+                        help='clients waiting for a worker before we answer 503 (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=RELAY_CHUNK_SIZE,
+                        help='bytes read per recv while relaying (default: %(default)s)')
+    parser.add_argument('--tunnel', action='store_true',
+                        help='relay raw bytes to the origin without parsing or caching')
+    parser.add_argument('--origin-host', default=ORIGIN_HOST)
+    parser.add_argument('--origin-port', type=int, default=ORIGIN_PORT)
+    parser.add_argument('--latency', default='off',
+                        help='inject latency per request: off, fixed:S, random:LOW-HIGH or route:/path=S,... (default: off)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for random latency')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                        help='debug logs every connection, request and response head (default: %(default)s)')
+    args = parser.parse_args()
 
-    # Added multithread functionality
-    proxyThread = threading.Thread(target=handle_client, args=(clientSocket, clientAddr, ORIGIN_HOST, ORIGIN_PORT))
-    proxyThread.start()
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s', stream=sys.stdout)
+    RELAY_CHUNK_SIZE = args.chunk_size
+    latency = LatencyInjector.from_spec(args.latency, args.seed)
+    handler = handle_tunnel if args.tunnel else handle_client
 
-    
+    # --- Socket setup ---
+    proxySocket = socket(AF_INET, SOCK_STREAM)
+    proxySocket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)  # Allow quick restarts while old connections are in TIME_WAIT
+    proxySocket.bind((PROXY_HOST, args.port))
+    proxySocket.listen(LISTEN_BACKLOG)
+
+    # Fixed pool of handler threads instead of a new thread per client
+    pool = WorkerPool(
+        lambda clientSocket, clientAddr: handler(clientSocket, clientAddr, args.origin_host, args.origin_port),
+        args.workers, args.queue_size, name='proxy',
+    )
+    pool.start()
+    log.info('Proxy server listening on port %d (%d workers, queue %d)...', args.port, args.workers, args.queue_size)
+    log.info('Forwarding to %s:%d, injected latency: %s', args.origin_host, args.origin_port, latency)
+
+    while True:
+        clientSocket, clientAddr = proxySocket.accept()
 
+        if pool.submit(clientSocket, clientAddr):
+            log.debug('Accepted connection from %s', clientAddr)
+        else:
+            log.warning('Proxy overloaded, rejected %s: %s', clientAddr, pool.stats())
 
+if __name__ == '__main__':
+    main()
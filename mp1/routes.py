@@ -0,0 +1,43 @@
+# Route table for server.py
+#
+# Routes are registered once at startup. Exact paths are a single dict lookup,
+# prefix routes are checked longest first. A handler is called as
+# handler(request, keep_alive) and returns the response for build_response.
+#
+# ConstantResponse is a handler for responses that never change (the welcome
+# page, error pages). Both the keep-alive and the close variant are serialized to
+# bytes when the route is registered, so serving one is just returning the bytes.
+
+class ConstantResponse:
+    def __init__(self, make_response, status, body=b'', extra_headers=None):
+        self.status = status
+        self.keep_alive_bytes = make_response(status, body, True, extra_headers)
+        self.close_bytes = make_response(status, body, False, extra_headers)
+
+    def __call__(self, request, keep_alive):
+        return self.keep_alive_bytes if keep_alive else self.close_bytes
+
+class Router:
+    def __init__(self):
+        self.exact = {}         # Path -> handler
+        self.prefixes = []      # (prefix, handler), longest prefix first
+        self.names = {}         # Handler -> route label, for stats and benchmarks
+
+    def add_exact(self, path, handler, name=None):
+        self.exact[path] = handler
+        self.names[handler] = name or path
+
+    def add_prefix(self, prefix, handler, name=None):
+        self.prefixes.append((prefix, handler))
+        self.prefixes.sort(key=lambda route: len(route[0]), reverse=True)
+        self.names[handler] = name or prefix + '*'
+
+    # Returns the handler for a path, or None if no route matches
+    def match(self, path):
+        handler = self.exact.get(path)
+        if handler is not None:
+            return handler
+        for prefix, handler in self.prefixes:
+            if path.startswith(prefix):
+                return handler
+        return None
@@ -1,161 +1,339 @@
 from socket import *
-import os
-import datetime
 from email.utils import parsedate_to_datetime  # Allows parsing of HTTP timestamp
-from urllib.parse import urlparse # Allows parsing of URLs
+from http_parser import RequestParser, ParseError # Incremental request parser shared with the proxy
+from worker_pool import WorkerPool # Fixed-size pool of handler threads
+from static_files import StaticFile, StaticFileCache # Cached file metadata for the static route
+from routes import Router, ConstantResponse # Route table built once at startup
+from fault_injection import LatencyInjector # Optional artificial latency for testing
 import threading # Allows for multiple connections in parallel
+import asyncio # Allows for the event loop serving mode
+import argparse # Allows picking the serving mode at startup
+import logging # Leveled logging, per-request lines only at debug
+import os
+import sys
 import time # Allows for time related operations (Testing for multithread)
 
 HOST = '127.0.0.1'
 PORT = 12000
 
+# --- Keep-alive settings ---
+KEEP_ALIVE_TIMEOUT = 15.0       # Seconds an idle connection stays open
+KEEP_ALIVE_MAX_REQUESTS = 100   # Requests served on one connection before closing it
+MAX_REQUEST_SIZE = 64 * 1024    # Largest request line + headers we will buffer
+
+# Directory served by the static file route, www/ next to this file so the source isn't served
+DOC_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'www')
+
+LISTEN_BACKLOG = 128            # Pending connections the OS queues for accept()
+
+# --- Worker pool settings (threaded mode) ---
+WORKER_THREADS = 32             # Connections served at the same time
+ACCEPT_QUEUE_SIZE = 64          # Accepted connections waiting for a worker, beyond this we answer 503
+
 STATUS_TEXT = {
     200: "OK",
     304: "Not Modified",
+    400: "Bad Request",
     403: "Forbidden",
     404: "Not Found",
+    503: "Service Unavailable",
     505: "HTTP Version Not Supported"
 }
 
-# --- Helpers ---
-def get_headers(request):
-    lines = request.split('\n')
-    return lines
-
-# helper function to get HTTP request line
-def get_request_line(request):
-    lines = request.split('\r\n')
-    if len(lines) > 0:
-        return lines[0]
-    return ''
-
-# helper function to get HTTP version from request line
-def get_html_version(request):
-    request_line = get_request_line(request)
-    parts = request_line.split(' ')
-    if len(parts) == 3:
-        return parts[2]
-    return ''
-
-# helper function to get HTTP method from request line
-# use this to handle specific methods like GET, POST, etc.
-# for this server, we only care about GET
-def get_method(request):
-    request_line = get_request_line(request)
-    parts = request_line.split(' ')
-    if len(parts) >= 1:
-        return parts[0]
-    return ''
-
-def get_headers_dict(request):
-    headers = get_headers(request)
-    headerLines = {}
-
-    for header in headers[1:]:
-        if ': ' in header:
-            key, value = header.split(': ', 1)
-            headerLines[key.lower()] = value
-    return headerLines
-
-# Gets path from request line
-def get_path(headerComponents):
-    if len(headerComponents) >= 2:
-        
-        # request came with a url
-        if 'http://' in headerComponents[1]:
-            parsedUrl = urlparse(headerComponents[1])   # Parses through the URL
-            path = parsedUrl.path                       # Takes the path part of the URL
-
-        # request for obj directly
+staticFiles = StaticFileCache(DOC_ROOT)
+latency = LatencyInjector()     # Off unless --latency is given
+log = logging.getLogger('server')
+
+# helper function to build the status line and headers of a response
+def make_head(status, length, keep_alive=True, extra_headers=None):
+    lines = [f'HTTP/1.1 {status} {STATUS_TEXT[status]}']
+    for key, value in (extra_headers or {}).items():
+        lines.append(f'{key}: {value}')
+
+    # 304 has no body, Content-Length would describe the cached representation instead
+    if status != 304:
+        lines.append(f'Content-Length: {length}')
+    lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+
+    head = '\r\n'.join(lines) + '\r\n\r\n'
+    return head.encode()
+
+# helper function to build a full response with Content-Length and Connection headers
+def make_response(status, body=b'', keep_alive=True, extra_headers=None):
+    return make_head(status, len(body), keep_alive, extra_headers) + body
+
+# --- Pre-encoded responses that never change ---
+WELCOME = ConstantResponse(make_response, 200, 'Welcome to Derek and Kevin\'s server!'.encode())
+RESPONSE_400 = ConstantResponse(make_response, 400)
+RESPONSE_403 = ConstantResponse(make_response, 403)
+RESPONSE_404 = ConstantResponse(make_response, 404)
+RESPONSE_505 = ConstantResponse(make_response, 505)
+
+# Serves a file from the document root. Small files come from the cache, larger ones
+# are returned as (head, StaticFile) so the connection loop can sendfile them
+def serve_static(clientRequest, keep_alive):
+    filepath = staticFiles.resolve(clientRequest.path)
+    if filepath is None:
+        return RESPONSE_403(clientRequest, keep_alive)
+
+    entry = staticFiles.lookup(filepath)
+    if entry is None:
+        return RESPONSE_404(clientRequest, keep_alive)
+
+    file_headers = {'Content-Type': entry.content_type, 'Last-Modified': entry.last_modified}
+    headers = clientRequest.headers
+
+    if 'if-modified-since' in headers:
+        try:
+            http_fileTimestamp = parsedate_to_datetime(headers['if-modified-since'].strip()).timestamp()
+        except (TypeError, ValueError):
+            http_fileTimestamp = None
+        if http_fileTimestamp is not None and entry.mtime <= http_fileTimestamp:
+            return make_response(304, keep_alive=keep_alive, extra_headers={'Last-Modified': entry.last_modified})
+
+    # Small files keep their whole 200 response serialized until the file changes
+    response = entry.responses.get(keep_alive)
+    if response is not None:
+        return response
+
+    body = staticFiles.small_body(entry)
+    if body is not None:
+        response = make_response(200, body, keep_alive, file_headers)
+        if entry.body is not None:
+            entry.responses[keep_alive] = response
+        return response
+    return make_head(200, entry.size, keep_alive, file_headers), entry
+
+# Registers every route, called once at startup
+def build_router():
+    router = Router()
+    router.add_exact('/', WELCOME, name='welcome')
+    router.add_prefix('/', serve_static, name='static')
+    return router
+
+router = build_router()
+
+# Builds the response for one request, returns (response, keep connection open).
+# The response is bytes, or (head bytes, StaticFile) for a file to stream
+def build_response(clientRequest):
+    log.debug('%s', clientRequest.request_line)
+
+    # --- Handle responses ---
+    if clientRequest.version != 'HTTP/1.1':
+        log.debug('html version %s', clientRequest.version)
+        return RESPONSE_505.close_bytes, False
+
+    # HTTP/1.1 connections stay open unless the client asks to close
+    keep_alive = clientRequest.headers.get('connection', '').lower() != 'close'
+
+    path = clientRequest.path
+    if '..' in path or '/secret/' in path:
+        return RESPONSE_403(clientRequest, keep_alive), keep_alive
+
+    handler = router.match(path) or RESPONSE_404
+    return handler(clientRequest, keep_alive), keep_alive
+
+# Feeds received bytes to the connection's parser and answers every request they
+# complete, in order. Pipelined requests get their responses joined so they go back
+# in a single send. Returns (response parts, requests served, keep connection open,
+# injected delay) where each part is bytes or a StaticFile to stream with sendfile.
+# The caller waits out the delay before sending, in whatever way suits its engine
+def answer_requests(parser, data, served):
+    try:
+        requests = parser.feed(data)
+    except ParseError as e:
+        log.debug('Bad request: %s', e)
+        return [RESPONSE_400.close_bytes], served, False, 0.0
+
+    parts = []
+    pending = []
+    keep_alive = True
+    delay = 0.0
+    for clientRequest in requests:
+        delay += latency.delay_for(clientRequest.path)
+        serverResponse, keep_alive = build_response(clientRequest)
+        served += 1
+        if served >= KEEP_ALIVE_MAX_REQUESTS:
+            keep_alive = False
+
+        if isinstance(serverResponse, tuple):
+            head, entry = serverResponse
+            pending.append(head)
+            parts.append(b''.join(pending))
+            parts.append(entry)
+            pending = []
         else:
-            path = headerComponents[1]
-    else:
-        return '/'            
+            pending.append(serverResponse)
+
+        # Anything pipelined after a closing response is dropped
+        if not keep_alive:
+            break
+
+    # Malformed request after the good ones, answer it and close
+    if keep_alive and parser.error is not None:
+        log.debug('Bad request: %s', parser.error)
+        pending.append(RESPONSE_400.close_bytes)
+        keep_alive = False
+
+    if pending:
+        parts.append(b''.join(pending))
+    return parts, served, keep_alive, delay
+
+# helper function to write response parts to a blocking socket
+def send_parts(clientSocket, parts):
+    for part in parts:
+        if isinstance(part, StaticFile):
+            with open(part.path, 'rb') as fin:
+                clientSocket.sendfile(fin, 0, part.size)
+        else:
+            clientSocket.sendall(part)
 
-    return path
+# helper function to write response parts to an asyncio stream
+async def send_parts_async(writer, parts):
+    loop = asyncio.get_running_loop()
+    for part in parts:
+        if isinstance(part, StaticFile):
+            await writer.drain()
+            with open(part.path, 'rb') as fin:
+                await loop.sendfile(writer.transport, fin, 0, part.size)
+        else:
+            writer.write(part)
+    await writer.drain()
 
-# Handles client requests
+# Handles client requests, serving requests on the connection until the client
+# closes it, asks for Connection: close, or goes idle for KEEP_ALIVE_TIMEOUT
 def handle_client(clientSocket, clientAddr, HOST, PORT):
     
-    # Prints start time of current thread
-    start = time.strftime('%H:%M:%S')
-    print(f'[{threading.current_thread().name}] Started {clientAddr} at {start}')
+    # Logs start time of current thread
+    log.debug('[%s] Started %s at %s', threading.current_thread().name, clientAddr, time.strftime('%H:%M:%S'))
 
-    # Pause 5 secs (Test for multithread)
-    time.sleep(5)
+    clientSocket.settimeout(KEEP_ALIVE_TIMEOUT)
+    parser = RequestParser(max_head=MAX_REQUEST_SIZE)
+    served = 0
 
-    clientRequest = clientSocket.recv(1024).decode()
-    print(clientRequest)
+    try:
+        while True:
+            data = clientSocket.recv(4096)
+            if not data:
+                break
 
-    request_line = get_request_line(clientRequest)
-    print(request_line)
+            parts, served, keep_alive, delay = answer_requests(parser, data, served)
+            if delay:
+                time.sleep(delay)
+            send_parts(clientSocket, parts)
+            if not keep_alive:
+                break
+    except timeout:
+        log.debug('Connection from %s idle for %ss, closing', clientAddr, KEEP_ALIVE_TIMEOUT)
+    except OSError as e:
+        log.warning('Connection error from %s: %s', clientAddr, e)
+    finally:
+        clientSocket.close()
 
-    html_version = get_html_version(clientRequest)
-    headerComponents = request_line.split(' ')
-    path = get_path(headerComponents)
-    headers = get_headers_dict(clientRequest)
+    # Logs end time of current thread
+    log.debug('[%s] Ended %s at %s after %d request(s)',
+              threading.current_thread().name, clientAddr, time.strftime('%H:%M:%S'), served)
 
-    # --- Handle responses ---
-    if html_version != 'HTTP/1.1':
-        print('html version', html_version)
-        serverResponse = f'HTTP/1.1 505 {STATUS_TEXT[505]}\n\n'
-
-    elif '..' in path or '/secret/' in path:
-        serverResponse = f'HTTP/1.1 403 {STATUS_TEXT[403]}\n\n'
-
-    elif path == '/':
-        content = 'Welcome to Derek and Kevin\'s server!'
-        serverResponse = f'HTTP/1.1 200 {STATUS_TEXT[200]}\n\n{content}'
-
-    elif path == '/test.html':
-        filepath = '.' + path
-        if os.path.exists(filepath):
-            file_ModifiedTime = datetime.datetime.fromtimestamp(
-                os.path.getmtime(filepath), tz=datetime.timezone.utc
-            )
-
-            if 'if-modified-since' in headers:
-                http_fileTimestamp = parsedate_to_datetime(headers['if-modified-since'])
-                if file_ModifiedTime <= http_fileTimestamp:
-                    serverResponse = f'HTTP/1.1 304 {STATUS_TEXT[304]}\n\n'
-                else:
-                    with open(filepath) as fin:
-                        content = fin.read()
-                    serverResponse = f'HTTP/1.1 200 {STATUS_TEXT[200]}\n\n{content}'
-            else:
-                with open(filepath) as fin:
-                    content = fin.read()
-                serverResponse = f'HTTP/1.1 200 {STATUS_TEXT[200]}\n\n{content}'
-        else:
-            serverResponse = f'HTTP/1.1 404 {STATUS_TEXT[404]}\n\n'
+# asyncio version of handle_client. Same routing and keep-alive rules, but each
+# connection is a coroutine on one event loop instead of its own thread
+async def handle_client_async(reader, writer):
+    clientAddr = writer.get_extra_info('peername')
+    log.debug('[asyncio] Started %s at %s', clientAddr, time.strftime('%H:%M:%S'))
 
-    elif path == '/garbage.txt':
-        serverResponse = f'HTTP/1.1 404 {STATUS_TEXT[404]}\n\n'
+    parser = RequestParser(max_head=MAX_REQUEST_SIZE)
+    served = 0
 
-    else:
-        serverResponse = f'HTTP/1.1 404 {STATUS_TEXT[404]}\n\n'
+    try:
+        while True:
+            data = await asyncio.wait_for(reader.read(4096), KEEP_ALIVE_TIMEOUT)
+            if not data:
+                break
+
+            parts, served, keep_alive, delay = answer_requests(parser, data, served)
+            if delay:
+                await asyncio.sleep(delay)     # only this connection waits
+            if parts:
+                await send_parts_async(writer, parts)
+            if not keep_alive:
+                break
+    except asyncio.TimeoutError:
+        log.debug('Connection from %s idle for %ss, closing', clientAddr, KEEP_ALIVE_TIMEOUT)
+    except OSError as e:
+        log.warning('Connection error from %s: %s', clientAddr, e)
+    finally:
+        writer.close()
+
+    log.debug('[asyncio] Ended %s at %s after %d request(s)', clientAddr, time.strftime('%H:%M:%S'), served)
 
-    print(serverResponse)
-    clientSocket.sendall(serverResponse.encode())
-    clientSocket.close()    
+# Threaded server, connections are handed to a fixed pool of worker threads
+def serve_threaded(host, port, workers=WORKER_THREADS, queue_size=ACCEPT_QUEUE_SIZE):
+    # --- Socket setup ---
+    serverSocket = socket(AF_INET, SOCK_STREAM)
+    serverSocket.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)  # Allow quick restarts while old connections are in TIME_WAIT
+    serverSocket.bind((host, port))
+    serverSocket.listen(LISTEN_BACKLOG)
 
-    # Prints end time of current thread
-    end = time.strftime('%H:%M:%S')
-    print(f'[{threading.current_thread().name}] Ended {clientAddr} at {end}')
+    pool = WorkerPool(
+        lambda clientSocket, clientAddr: handle_client(clientSocket, clientAddr, host, port),
+        workers, queue_size, name='server',
+        reject_response=make_response(503, keep_alive=False, extra_headers={'Retry-After': '1'}),
+    )
+    pool.start()
 
-# --- Socket setup ---
-serverSocket = socket(AF_INET, SOCK_STREAM)
-serverSocket.bind((HOST, PORT))
-serverSocket.listen(5)
+    log.info('Listening on port %d (threaded, %d workers, queue %d)...', port, workers, queue_size)
 
-print(f'Listening on port {PORT}...')
+    # assume we are using http version 1.1
+    try:
+        while True:
+            clientSocket, clientAddr = serverSocket.accept()
 
-# assume we are using http version 1.1
-while True:
-    clientSocket, clientAddr = serverSocket.accept()
+            # Shed load with a 503 once the accept queue is full
+            if not pool.submit(clientSocket, clientAddr):
+                log.warning('Server overloaded, rejected %s: %s', clientAddr, pool.stats())
+    finally:
+        serverSocket.close()
 
-    # Added multithread functionality
-    serverThread = threading.Thread(target=handle_client, args=(clientSocket, clientAddr, HOST, PORT))
-    serverThread.start()
+# Single threaded event loop server
+async def serve_asyncio(host, port):
+    server = await asyncio.start_server(handle_client_async, host, port,
+                                        reuse_address=True, backlog=LISTEN_BACKLOG)
+    log.info('Listening on port %d (asyncio)...', port)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    global staticFiles, latency
+
+    parser = argparse.ArgumentParser(description='Origin web server')
+    parser.add_argument('--mode', choices=['threaded', 'asyncio'], default='threaded',
+                        help='serving engine (default: threaded)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--latency', default='off',
+                        help='inject latency per request: off, fixed:S, random:LOW-HIGH or route:/path=S,... (default: off)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for random latency')
+    parser.add_argument('--root', default=DOC_ROOT,
+                        help='document root for static files (default: www/ next to server.py)')
+    parser.add_argument('--workers', type=int, default=WORKER_THREADS,
+                        help='worker threads in threaded mode (default: %(default)s)')
+    parser.add_argument('--queue-size', type=int, default=ACCEPT_QUEUE_SIZE,
+                        help='connections waiting for a worker before we answer 503 (default: %(default)s)')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='info',
+                        help='debug logs every connection and request (default: %(default)s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s', stream=sys.stdout)
+    latency = LatencyInjector.from_spec(args.latency, args.seed)
+    staticFiles = StaticFileCache(args.root)
+
+    log.info('Injected latency: %s', latency)
+    if args.mode == 'asyncio':
+        try:
+            asyncio.run(serve_asyncio(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        serve_threaded(args.host, args.port, args.workers, args.queue_size)
 
-serverSocket.close()
+if __name__ == '__main__':
+    main()
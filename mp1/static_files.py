@@ -0,0 +1,132 @@
+# Static file lookup for server.py
+#
+# Keeps stat() results for files under the document root so a hot file isn't
+# stat'ed on every request. Small files also keep their body in memory. Entries
+# are re-checked against the file's mtime and size at most once every
+# STAT_CACHE_TTL seconds. Large files are never read into Python, the server
+# streams them to the socket with sendfile.
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import unquote
+import mimetypes
+import os
+import stat
+import threading
+import time
+
+STAT_CACHE_TTL = 1.0            # Seconds a cached stat() result is trusted
+SMALL_FILE_MAX = 64 * 1024      # Files up to this size keep their body in memory
+CACHE_MAX_ENTRIES = 1024        # Files tracked at once, least recently used dropped first
+CACHE_MAX_BODY_BYTES = 16 * 1024 * 1024  # Total bytes of cached file bodies
+RESOLVE_CACHE_MAX = 4096        # URL paths whose filesystem path we remember
+
+# Metadata (and maybe the body) of one file under the document root
+class StaticFile:
+    def __init__(self, path, st):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)   # HTTP dates only have second resolution
+        self.ino = st.st_ino
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.body = None                # Set for small files once read
+        self.responses = {}             # Pre-serialized 200 responses built by the server, keyed by keep-alive
+        self.checked_at = time.monotonic()
+
+    # Same file on disk if inode, size and mtime all match
+    def matches(self, st):
+        return st.st_ino == self.ino and st.st_size == self.size and int(st.st_mtime) == self.mtime
+
+class StaticFileCache:
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.entries = OrderedDict()    # Filesystem path -> StaticFile
+        self.resolved = {}              # URL path -> filesystem path (or None if outside the root)
+        self.body_bytes = 0
+        self.lock = threading.Lock()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    # Maps a URL path to a file under the document root.
+    # Returns None if the path escapes the root
+    def resolve(self, url_path):
+        try:
+            return self.resolved[url_path]
+        except KeyError:
+            pass
+
+        relative = unquote(url_path).lstrip('/')
+        filepath = os.path.realpath(os.path.join(self.root, relative))
+        if filepath != self.root and not filepath.startswith(self.root + os.sep):
+            filepath = None
+
+        # realpath() walks every path component, so remember the answer
+        if len(self.resolved) >= RESOLVE_CACHE_MAX:
+            self.resolved.clear()
+        self.resolved[url_path] = filepath
+        return filepath
+
+    # Returns the StaticFile for a filesystem path, or None if it isn't a regular file
+    def lookup(self, filepath):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(filepath)
+            if entry is not None and now - entry.checked_at < STAT_CACHE_TTL:
+                self.entries.move_to_end(filepath)
+                self.hits += 1
+                return entry
+
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            st = None
+
+        with self.lock:
+            self.misses += 1
+            if st is None or not stat.S_ISREG(st.st_mode):
+                self.drop(filepath)
+                return None
+
+            if entry is not None and entry.matches(st):
+                # Unchanged on disk, keep the cached body
+                entry.checked_at = now
+                return entry
+
+            self.drop(filepath)
+            entry = StaticFile(filepath, st)
+            self.entries[filepath] = entry
+
+            while len(self.entries) > CACHE_MAX_ENTRIES:
+                _, old = self.entries.popitem(last=False)
+                if old.body is not None:
+                    self.body_bytes -= len(old.body)
+            return entry
+
+    # Body of a small file, read once and kept until the file changes.
+    # Returns None for files that should be streamed instead
+    def small_body(self, entry):
+        if entry.size > SMALL_FILE_MAX:
+            return None
+        if entry.body is not None:
+            return entry.body
+
+        with open(entry.path, 'rb') as fin:
+            body = fin.read(SMALL_FILE_MAX + 1)
+        if len(body) != entry.size:
+            # Changed while we were reading, serve what we read but don't keep it
+            return body
+
+        with self.lock:
+            if (entry.body is None and self.entries.get(entry.path) is entry
+                    and self.body_bytes + len(body) <= CACHE_MAX_BODY_BYTES):
+                entry.body = body
+                self.body_bytes += len(body)
+        return body
+
+    # Caller holds the lock
+    def drop(self, filepath):
+        old = self.entries.pop(filepath, None)
+        if old is not None and old.body is not None:
+            self.body_bytes -= len(old.body)
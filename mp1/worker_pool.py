@@ -0,0 +1,113 @@
+# Fixed-size worker pool shared by server.py and proxy.py
+#
+# The accept loop hands each connection to submit(). Connections wait in a
+# bounded queue until one of the worker threads picks them up. When the queue
+# is full the connection is answered with 503 and closed right away, so a burst
+# can't create more threads than the OS (or memory) allows.
+import logging
+import queue
+import threading
+
+SERVICE_UNAVAILABLE = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                       b'Retry-After: 1\r\n'
+                       b'Content-Length: 0\r\n'
+                       b'Connection: close\r\n\r\n')
+
+REJECT_SEND_TIMEOUT = 1.0   # Don't let a slow client stall the accept loop while we shed it
+
+log = logging.getLogger('worker_pool')
+
+class WorkerPool:
+    def __init__(self, handler, num_workers, queue_size, name='worker', reject_response=SERVICE_UNAVAILABLE):
+        self.handler = handler              # Called as handler(clientSocket, clientAddr)
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.name = name
+        self.reject_response = reject_response
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.lock = threading.Lock()
+
+        # Stats
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.busy = 0
+        self.max_queue_depth = 0
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(target=self.worker, name=f'{self.name}-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # Queue a connection for the workers. Returns False if it was shed with a 503
+    def submit(self, clientSocket, clientAddr):
+        try:
+            self.queue.put_nowait((clientSocket, clientAddr))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            self.reject(clientSocket)
+            return False
+
+        depth = self.queue.qsize()
+        with self.lock:
+            self.accepted += 1
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return True
+
+    def reject(self, clientSocket):
+        try:
+            # Read whatever request bytes already arrived, closing with unread
+            # data makes the OS send a reset that can wipe out our 503
+            clientSocket.setblocking(False)
+            try:
+                clientSocket.recv(65536)
+            except BlockingIOError:
+                pass
+
+            clientSocket.settimeout(REJECT_SEND_TIMEOUT)
+            clientSocket.sendall(self.reject_response)
+        except OSError:
+            pass
+        finally:
+            clientSocket.close()
+
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            with self.lock:
+                self.busy += 1
+            try:
+                self.handler(*item)
+            except Exception as e:
+                log.error('[%s] Unhandled error: %s', threading.current_thread().name, e)
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    self.completed += 1
+
+    # Stops the workers once they have drained the queue
+    def shutdown(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.num_workers,
+                'busy': self.busy,
+                'queue_depth': self.queue.qsize(),
+                'queue_size': self.queue_size,
+                'max_queue_depth': self.max_queue_depth,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'completed': self.completed,
+            }
@@ -0,0 +1,63 @@
+# asyncio sender: runs --connections transfers of the test data at once from
+# one socket and one event loop (see aio_transport.py)
+import argparse
+import asyncio
+import time
+
+import congestion
+from aio_transport import RTO, open_endpoint
+from test_data import client_data
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+async def transfer(endpoint, addr, data):
+    stream = await endpoint.connect(addr)
+    await stream.send(data)
+    fin_acked = await stream.close()
+    return {**stream.stats(), 'fin_acked': fin_acked}
+
+async def run(args):
+    endpoint = await open_endpoint(mode=args.mode, cc=args.cc, rto=args.rto, loss_rate=args.loss_rate)
+    data = client_data(args.repeat)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(transfer(endpoint, (args.host, args.port), data)
+                                     for _ in range(args.connections)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    endpoint.close()
+
+    done = [stats for stats in results if isinstance(stats, dict)]
+    for error in results:
+        if not isinstance(error, dict):
+            print(f'[ERROR] {error}')
+
+    print(f'\n[STATS]')
+    print(f'    Connections: {len(done)}/{args.connections} completed, mode {args.mode}, congestion control {args.cc}')
+    print(f'    Bytes: {sum(s["bytes"] for s in done)} in {elapsed:.2f}s '
+          f'({sum(s["bytes"] for s in done) / elapsed / 1e3:.2f} KB/s)')
+    print(f'    Packets sent: {sum(s["pkts_sent"] for s in done)}')
+    print(f'    Packets retransmitted: {sum(s["pkts_retransmitted"] for s in done)}')
+    print(f'    ACKs received: {sum(s["acks_received"] for s in done)}')
+    print(f'    Timeouts: {sum(s["timeouts"] for s in done)}')
+    print(f'    FIN ACKed: {sum(s["fin_acked"] for s in done)}')
+    print(f'    Endpoint: {endpoint.stats()}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Reliable UDP sender on asyncio')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--connections', type=int, default=1, help='transfers to run at once')
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr',
+                        help='gbn: Go-Back-N, sr: selective repeat with SACK (default: %(default)s)')
+    parser.add_argument('--rto', type=float, default=RTO,
+                        help='initial retransmission timeout in seconds, before RTTs are measured')
+    parser.add_argument('--cc', choices=list(congestion.CONTROLLERS), default='reno',
+                        help='congestion control (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=20, help='times to repeat the test data')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='fraction of received datagrams to drop, SYN-ACKs included')
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# asyncio receiver: accepts any number of connections on one socket and reads
+# each stream to EOF on the same event loop (see aio_transport.py)
+import argparse
+import asyncio
+import hashlib
+
+from aio_transport import ACK_DELAY, ACK_EVERY, IDLE_TIMEOUT, RECV_BUFFER, serve
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+async def handle(stream):
+    try:
+        data = await stream.read()
+    except ConnectionError as e:
+        print(f'[{stream.addr[0]}:{stream.addr[1]}#{stream.conn_id}] evicted: {e}')
+        return
+    print(f'[{stream.addr[0]}:{stream.addr[1]}#{stream.conn_id}] received {len(data)} bytes, '
+          f'sha256 {hashlib.sha256(data).hexdigest()[:16]}, {stream.acks_sent} ACKs sent')
+
+async def run(args):
+    endpoint = await serve(args.host, args.port, mode=args.mode, buffer_size=args.buffer_size,
+                           ack_every=args.ack_every, ack_delay=args.ack_delay / 1000, idle_timeout=args.idle_timeout,
+                           loss_rate=args.loss_rate)
+    print(f'Server ready ({args.mode})')
+    while True:
+        stream = await endpoint.accept()
+        print(f'Connection established with {stream.addr} (conn {stream.conn_id})')
+        asyncio.create_task(handle(stream))
+
+def main():
+    parser = argparse.ArgumentParser(description='Reliable UDP receiver on asyncio')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr',
+                        help='gbn: Go-Back-N, sr: selective repeat with SACK (default: %(default)s)')
+    parser.add_argument('--buffer-size', type=int, default=RECV_BUFFER,
+                        help='receive buffer in packets per connection (default: %(default)s)')
+    parser.add_argument('--ack-every', type=int, default=ACK_EVERY,
+                        help='in-order packets per cumulative ACK (default: %(default)s)')
+    parser.add_argument('--ack-delay', type=float, default=ACK_DELAY * 1000,
+                        help='ms an in-order packet may wait for its ACK, 0 ACKs every packet (default: %(default)s)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds before an idle connection is evicted (default: %(default)s)')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='fraction of received packets to drop')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
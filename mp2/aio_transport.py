@@ -0,0 +1,556 @@
+# asyncio engine for the reliable-UDP protocol
+#
+# Same wire format and handshake as client.py and pipeline_server.py, so either
+# side can talk to the other, but every connection lives on one event loop:
+#
+#   endpoint = await open_endpoint()                  # one UDP socket, any number of connections
+#   stream = await endpoint.connect((host, port))     # three-way handshake
+#   await stream.send(data)                           # returns once data fits in the send buffer
+#   await stream.close()                              # waits until everything is ACKed, then FIN
+#
+#   server = await serve(host, port)
+#   stream = await server.accept()
+#   payload = await stream.recv()                     # b'' once the sender closed
+#
+# Nothing polls. Datagrams arrive through DatagramProtocol callbacks, and
+# retransmission, delayed-ACK and handshake timers are scheduled on a shared
+# TimerWheel, which goes idle when no timer is pending. Each sender keeps one
+# retransmission timer, for send_base, and moves it on every ACK.
+#
+# Senders use the same RTO estimator (rto.py) and congestion control
+# (congestion.py) as client.py. Receivers use pipeline_server.py's delayed ACKs.
+# FIN (sent by close() with the next seq) is ACKed like data and shows up as
+# EOF at the receiver.
+import asyncio
+import random
+from collections import deque
+from socket import SOL_SOCKET, SO_RCVBUF
+
+import congestion
+from connection_table import DEFAULT_SEGMENT_SIZE, IDLE_TIMEOUT
+from packet import (ACK, DATA, FIN, MAX_SEGMENT_SIZE, SACK, SYN, encode_mss, encode_packet, encode_sack, parse_mss,
+                    parse_packet, parse_sack, sack_blocks)
+from rto import RtoEstimator
+from send_window import SendWindow
+from timer_wheel import TimerWheel
+
+RTO = 1.0               # initial retransmission timeout in seconds, until RTTs are measured
+DUPE_ACK_THRESH = 3
+SEGMENT_SIZE = 20       # payload bytes per DATA packet a sender offers in its SYN, the receiver may lower it
+SEND_BUFFER = 256       # segments send() queues before it waits for ACKs
+RECV_BUFFER = 64        # packets a receiver holds for its reader, advertised as rwnd
+ACK_EVERY = 2           # in-order packets per cumulative ACK
+ACK_DELAY = 0.01        # seconds an in-order packet may wait for its ACK
+ACK_GAPS = 2            # ...and at most this many of the stream's gaps between DATA packets
+QUICK_ACKS = 16         # in-order packets ACKed at once after the handshake and after a loss
+SYN_RETRIES = 5
+FIN_RETRIES = 5
+SOCKET_BUFFER = 1 << 20 # SO_RCVBUF bytes, capped by net.core.rmem_max
+HANDSHAKE_TIMEOUT = 5.0 # seconds a receiver waits for the handshake ACK, also how long a closed
+                        # receiver stays around to re-ACK a duplicate FIN
+
+# Connection states
+SYN_SENT = 1
+SYN_RECEIVED = 2
+ESTABLISHED = 3
+CLOSED = 4
+
+class ReliableEndpoint(asyncio.DatagramProtocol):
+    def __init__(self, mode='sr', cc='reno', rto=RTO, buffer_size=RECV_BUFFER, ack_every=ACK_EVERY,
+                 ack_delay=ACK_DELAY, segment_size=SEGMENT_SIZE, max_segment_size=MAX_SEGMENT_SIZE, idle_timeout=IDLE_TIMEOUT,
+                 loss_rate=0.0):
+        self.loop = asyncio.get_running_loop()
+        self.wheel = TimerWheel(self.loop)
+        self.transport = None
+        self.mode = mode
+        self.cc = cc
+        self.rto = rto
+        self.buffer_size = buffer_size
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.segment_size = segment_size
+        self.max_segment_size = max_segment_size    # largest DATA payload a receiver accepts, offered in its SYN-ACK
+        self.idle_timeout = idle_timeout    # seconds without a packet before an established receiver is evicted
+        self.loss_rate = loss_rate      # fraction of received datagrams to drop, for testing
+        self.streams = {}               # (addr, conn_id) -> SendStream or ReceiveStream
+        self.accepting = False
+        self.accepted = asyncio.Queue()
+
+        # Stats
+        self.datagrams_received = 0
+        self.datagrams_sent = 0
+        self.corrupted = 0
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # Many connections share this socket, give bursts of them room
+        transport.get_extra_info('socket').setsockopt(SOL_SOCKET, SO_RCVBUF, SOCKET_BUFFER)
+
+    def datagram_received(self, data, addr):
+        self.datagrams_received += 1
+        if self.loss_rate and random.random() < self.loss_rate:
+            self.dropped += 1
+            return
+        try:
+            pkt = parse_packet(data)
+        except ValueError:
+            self.corrupted += 1
+            return
+
+        stream = self.streams.get((addr, pkt.conn_id))
+        if stream is None:
+            if not (self.accepting and pkt.flags == SYN):
+                return
+            # Segment size: the sender's if it announced one, a conservative default if not,
+            # up to what this receiver accepts, as pipeline_server.py negotiates it
+            segment_size = min(parse_mss(pkt.payload) or DEFAULT_SEGMENT_SIZE, self.max_segment_size)
+            stream = ReceiveStream(self, addr, pkt.conn_id, pkt.seq + 1, segment_size)
+            self.streams[(addr, pkt.conn_id)] = stream
+        stream.packet_received(pkt)
+
+    def error_received(self, exc):
+        pass    # ICMP errors for earlier sends, retransmission takes care of them
+
+    def sendto(self, packet, addr):
+        self.transport.sendto(packet, addr)
+        self.datagrams_sent += 1
+
+    async def connect(self, addr):
+        conn_id = random.getrandbits(32)
+        while (addr, conn_id) in self.streams:
+            conn_id = random.getrandbits(32)
+        stream = SendStream(self, addr, conn_id)
+        self.streams[(addr, conn_id)] = stream
+        await stream.open()
+        return stream
+
+    async def accept(self):
+        return await self.accepted.get()
+
+    def close(self):
+        self.transport.close()
+
+    def stats(self):
+        return {
+            'streams': len(self.streams),
+            'datagrams_received': self.datagrams_received,
+            'datagrams_sent': self.datagrams_sent,
+            'corrupted': self.corrupted,
+            'dropped': self.dropped,
+            **{f'timers_{key}': value for key, value in self.wheel.stats().items()},
+        }
+
+class SendStream:
+    def __init__(self, endpoint, addr, conn_id):
+        self.endpoint = endpoint
+        self.loop = endpoint.loop
+        self.wheel = endpoint.wheel
+        self.addr = addr
+        self.conn_id = conn_id
+        self.mode = endpoint.mode
+        self.segment_size = endpoint.segment_size
+        self.rtt = RtoEstimator(initial_rto=endpoint.rto)
+        self.cc = congestion.create(endpoint.cc)
+        self.state = SYN_SENT
+        self.established = self.loop.create_future()
+        self.fin_acked = None       # future while close() waits for the FIN's ACK
+
+        # Sliding window, the same ring of in-flight segments and SACKed ranges as client.py
+        self.window = SendWindow(1)
+        self.rwnd = 1
+        self.unsent = deque()       # payloads send() queued that are not in flight yet
+        self.dupe_acks = 0
+        self.timer = None           # the one retransmission / handshake / window probe timer
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.all_acked = asyncio.Event()
+        self.all_acked.set()
+
+        # Stats
+        self.start_time = self.loop.time()
+        self.bytes = 0
+        self.pkts_sent = 0
+        self.pkts_retransmitted = 0
+        self.acks_received = 0
+        self.timeouts = 0
+
+    # helper function to send one packet on this connection
+    def send_packet(self, seq, flags, payload=b''):
+        self.endpoint.sendto(encode_packet(seq, 0, self.rwnd, flags, payload, self.conn_id), self.addr)
+
+    def set_timer(self, delay, callback, *args):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.wheel.call_later(delay, callback, *args)
+
+    def cancel_timer(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    async def open(self):
+        self.send_packet(0, SYN, encode_mss(self.segment_size))
+        self.set_timer(self.rtt.rto, self.syn_timeout, SYN_RETRIES)
+        await self.established
+
+    def syn_timeout(self, retries):
+        if retries == 0:
+            self.state = CLOSED
+            self.endpoint.streams.pop((self.addr, self.conn_id), None)
+            self.established.set_exception(ConnectionError(f'No SYN-ACK from {self.addr[0]}:{self.addr[1]}'))
+            return
+        self.rtt.backoff()
+        self.send_packet(0, SYN, encode_mss(self.segment_size))
+        self.set_timer(self.rtt.rto, self.syn_timeout, retries - 1)
+
+    async def send(self, data):
+        if self.state != ESTABLISHED:
+            raise ConnectionError('send() on a connection that is not established')
+        for i in range(0, len(data), self.segment_size):
+            self.unsent.append(bytes(data[i:i + self.segment_size]))
+        self.bytes += len(data)
+        if self.unsent:
+            self.all_acked.clear()
+        self.pump()
+
+        # Backpressure: wait for ACKs once the send buffer is full
+        while len(self.unsent) > SEND_BUFFER:
+            self.writable.clear()
+            await self.writable.wait()
+
+    async def drain(self):
+        await self.all_acked.wait()
+
+    # Waits until everything sent is ACKed, then sends FIN, returns whether the FIN was ACKed
+    async def close(self):
+        await self.drain()
+        if self.state != ESTABLISHED:
+            return False
+        self.fin_acked = self.loop.create_future()
+        self.send_packet(self.window.next_seq, FIN)
+        self.set_timer(self.rtt.rto, self.fin_timeout, FIN_RETRIES)
+        acked = await self.fin_acked
+        self.state = CLOSED
+        self.cancel_timer()
+        self.endpoint.streams.pop((self.addr, self.conn_id), None)
+        return acked
+
+    def fin_timeout(self, retries):
+        if retries == 0:
+            self.fin_acked.set_result(False)
+            return
+        self.rtt.backoff()
+        self.send_packet(self.window.next_seq, FIN)
+        self.set_timer(self.rtt.rto, self.fin_timeout, retries - 1)
+
+    # Sends queued segments that fit in min(cwnd, rwnd), and keeps the right timer running
+    def pump(self):
+        now = self.loop.time()
+        window = self.window
+        limit = window.base + min(self.cc.window, self.rwnd)
+        while self.unsent and window.next_seq < limit:
+            payload = self.unsent.popleft()
+            self.send_packet(window.push(payload, now), DATA, payload)
+            self.pkts_sent += 1
+
+        if len(self.unsent) <= SEND_BUFFER:
+            self.writable.set()
+
+        if window:
+            # Retransmission timer for send_base
+            self.set_timer(max(0.0, window[window.base].sent_time + self.rtt.rto - now), self.on_timeout)
+        elif self.unsent:
+            # rwnd = 0 with nothing in flight: the window update can be lost, probe after an RTO
+            self.set_timer(self.rtt.rto, self.window_probe)
+        else:
+            self.cancel_timer()
+
+    def retransmit(self, seq):
+        segment = self.window[seq]
+        self.send_packet(seq, DATA, segment.payload)
+        segment.sent_time = self.loop.time()
+        segment.retransmits += 1
+        self.pkts_retransmitted += 1
+
+    def on_timeout(self):
+        self.timer = None
+        now = self.loop.time()
+        self.timeouts += 1
+        self.cc.on_timeout(now)
+        for seq, segment in list(self.window.items()):
+            if self.mode == 'sr' and (now - segment.sent_time < self.rtt.rto or self.window.is_sacked(seq)):
+                continue
+            self.retransmit(seq)
+        self.rtt.backoff()
+        self.dupe_acks = 0
+        self.pump()
+
+    def window_probe(self):
+        self.timer = None
+        self.rtt.backoff()
+        if self.unsent and not self.window:
+            # One segment past the closed window, its ACK brings a fresh rwnd
+            self.rwnd = max(self.rwnd, 1)
+            self.pump()
+
+    def packet_received(self, pkt):
+        if pkt.flags == SYN | ACK:
+            if self.state == SYN_SENT:
+                self.cancel_timer()
+                self.rwnd = pkt.rwnd
+                self.segment_size = min(self.segment_size, parse_mss(pkt.payload) or self.segment_size)
+                self.state = ESTABLISHED
+                self.established.set_result(None)
+            # (Re)send the handshake ACK, a duplicate SYN-ACK means it was lost
+            self.endpoint.sendto(encode_packet(1, pkt.seq + 1, self.rwnd, ACK, b'', self.conn_id), self.addr)
+            return
+
+        if pkt.flags not in (ACK, ACK | SACK) or self.state != ESTABLISHED:
+            return
+        self.acks_received += 1
+        ack_num = pkt.ack
+
+        window = self.window
+        if self.fin_acked is not None:
+            if ack_num > window.next_seq and not self.fin_acked.done():
+                self.fin_acked.set_result(True)
+            return
+        if ack_num > window.next_seq:
+            return      # ACKs something never sent
+
+        now = self.loop.time()
+        self.rwnd = pkt.rwnd
+
+        if self.mode == 'sr' and pkt.flags & SACK:
+            for block_start, block_end in parse_sack(pkt.payload):
+                window.sack(block_start, block_end)
+
+        if ack_num > window.base:
+            acked = window.ack(ack_num)
+            # RTT sample from the newest segment if it was sent once, as client.py (Karn's rule)
+            if acked[-1].retransmits == 0:
+                self.rtt.sample(now - acked[-1].sent_time)
+            else:
+                self.rtt.reset_backoff()
+            self.cc.on_ack(len(acked), ack_num, now, self.rtt.srtt)
+            self.dupe_acks = 0
+
+        elif ack_num == window.base and window:
+            self.dupe_acks += 1
+            self.cc.on_dupack(now)
+            if self.dupe_acks >= DUPE_ACK_THRESH:
+                self.cc.on_loss(now, window.next_seq)
+                highest = window.highest_sacked() if self.mode == 'sr' else None
+                if highest is not None:
+                    # Holes below the highest SACKed packet that were last sent before it
+                    newest_sent = window[highest].sent_time
+                    for seq, segment in list(window.items(end=highest)):
+                        if segment.sent_time <= newest_sent and not window.is_sacked(seq):
+                            self.retransmit(seq)
+                else:
+                    self.retransmit(window.base)
+                self.dupe_acks = 0
+
+        self.pump()
+        if not window and not self.unsent:
+            self.all_acked.set()
+
+    def stats(self):
+        return {
+            'bytes': self.bytes,
+            'elapsed': self.loop.time() - self.start_time,
+            'pkts_sent': self.pkts_sent,
+            'pkts_retransmitted': self.pkts_retransmitted,
+            'acks_received': self.acks_received,
+            'timeouts': self.timeouts,
+            'cc': self.cc.name,
+            'cwnd': self.cc.cwnd,
+            'ssthresh': self.cc.ssthresh,
+            **self.rtt.stats(),
+        }
+
+class ReceiveStream:
+    def __init__(self, endpoint, addr, conn_id, expected_seq, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.endpoint = endpoint
+        self.loop = endpoint.loop
+        self.wheel = endpoint.wheel
+        self.addr = addr
+        self.conn_id = conn_id
+        self.state = SYN_RECEIVED
+        self.expected_seq = expected_seq
+        self.segment_size = segment_size    # agreed at SYN, announced in the SYN-ACK
+        self.out_of_order = {}      # seq -> payload received ahead of expected_seq (selective repeat)
+        self.ready = deque()        # in-order payloads waiting for recv()
+        self.waiter = None          # future recv() is waiting on
+        self.eof = False
+        self.error = None           # raised by recv() once the connection was evicted
+        self.last_seen = self.loop.time()
+        self.unacked = 0
+        self.quick_acks = QUICK_ACKS    # the sender starts in slow start
+        self.last_arrival = None
+        self.arrival_gap = None         # smoothed time between DATA packets
+        self.ack_timer = None
+        self.last_rwnd_sent = None
+        self.timer = self.wheel.call_later(HANDSHAKE_TIMEOUT, self.expire)
+
+        # Stats
+        self.bytes = 0
+        self.acks_sent = 0
+
+    # Packets held out of order count against the buffer too, as in pipeline_server.py
+    def rwnd(self):
+        return max(0, self.endpoint.buffer_size - len(self.ready) - len(self.out_of_order))
+
+    # Handshake never finished, or the closed connection has waited out duplicate FINs
+    def expire(self):
+        self.state = CLOSED
+        self.endpoint.streams.pop((self.addr, self.conn_id), None)
+
+    # Evicts the connection once it has been idle for idle_timeout, as connection_table.py does.
+    # Packets only move last_seen, the timer is rescheduled for what is left when it fires
+    def idle_check(self):
+        idle = self.loop.time() - self.last_seen
+        if idle < self.endpoint.idle_timeout:
+            self.timer = self.wheel.call_later(self.endpoint.idle_timeout - idle, self.idle_check)
+            return
+        self.expire()
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+        self.error = ConnectionError(f'No packets from {self.addr[0]}:{self.addr[1]} for {idle:.1f}s')
+        self.wake()
+
+    def send_ack(self):
+        rwnd = self.rwnd()
+        if self.out_of_order:
+            payload = encode_sack(sack_blocks(self.out_of_order))
+            packet = encode_packet(0, self.expected_seq, rwnd, ACK | SACK, payload, self.conn_id)
+        else:
+            packet = encode_packet(0, self.expected_seq, rwnd, ACK, b'', self.conn_id)
+        self.endpoint.sendto(packet, self.addr)
+        self.acks_sent += 1
+        self.last_rwnd_sent = rwnd
+        self.unacked = 0
+        if self.ack_timer is not None:
+            self.ack_timer.cancel()
+            self.ack_timer = None
+
+    def delayed_ack(self):
+        self.ack_timer = None
+        self.send_ack()
+
+    def establish(self):
+        self.state = ESTABLISHED
+        self.timer.cancel()
+        self.timer = self.wheel.call_later(self.endpoint.idle_timeout, self.idle_check)
+        self.endpoint.accepted.put_nowait(self)
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def packet_received(self, pkt):
+        self.last_seen = self.loop.time()
+        if pkt.flags == SYN:
+            if self.state == SYN_RECEIVED:
+                self.endpoint.sendto(encode_packet(0, self.expected_seq, self.rwnd(), SYN | ACK,
+                                                   encode_mss(self.segment_size), self.conn_id), self.addr)
+            return
+
+        if self.state == SYN_RECEIVED:
+            if pkt.flags == ACK and pkt.ack == self.expected_seq:
+                self.expected_seq = pkt.seq
+                self.establish()
+                return
+            if pkt.flags != DATA or pkt.seq != self.expected_seq:
+                return
+            self.establish()    # The handshake ACK was lost, the first data packet completes the handshake
+
+        if pkt.flags == DATA and self.state == ESTABLISHED:
+            self.data_received(pkt)
+        elif pkt.flags == FIN:
+            if pkt.seq == self.expected_seq and self.state == ESTABLISHED:
+                self.expected_seq += 1
+                self.eof = True
+                self.state = CLOSED
+                self.timer.cancel()
+                self.timer = self.wheel.call_later(HANDSHAKE_TIMEOUT, self.expire)
+                self.wake()
+            self.send_ack()
+
+    def data_received(self, pkt):
+        now = self.last_seen
+        if self.last_arrival is not None:
+            gap = now - self.last_arrival
+            self.arrival_gap = gap if self.arrival_gap is None else self.arrival_gap + (gap - self.arrival_gap) / 8
+        self.last_arrival = now
+
+        free = self.endpoint.buffer_size - len(self.ready)
+        if free <= 0 or pkt.seq != self.expected_seq:
+            # Selective repeat: keep packets whose place in the stream fits in the free buffer
+            if self.endpoint.mode == 'sr' and self.expected_seq < pkt.seq < self.expected_seq + free:
+                self.out_of_order.setdefault(pkt.seq, bytes(pkt.payload))
+            self.quick_acks = QUICK_ACKS    # the sender is recovering
+            self.send_ack()     # Duplicate ACK at once, for fast retransmit
+            return
+
+        filled_gap = bool(self.out_of_order)
+        self.deliver(bytes(pkt.payload))
+        while self.expected_seq in self.out_of_order:
+            self.deliver(self.out_of_order.pop(self.expected_seq))
+        self.unacked += 1
+
+        # As pipeline_server.py: ACK at once in slow start and recovery, otherwise hold the ACK
+        # for a couple of inter-arrival gaps at most
+        quick = self.quick_acks > 0
+        if quick:
+            self.quick_acks -= 1
+        if self.unacked >= self.endpoint.ack_every or self.endpoint.ack_delay <= 0 or filled_gap or quick:
+            self.send_ack()
+        elif self.ack_timer is None:
+            delay = self.endpoint.ack_delay
+            if self.arrival_gap is not None:
+                delay = min(delay, ACK_GAPS * self.arrival_gap)
+            self.ack_timer = self.wheel.call_later(delay, self.delayed_ack)
+
+    def deliver(self, payload):
+        self.ready.append(payload)
+        self.expected_seq += 1
+        self.bytes += len(payload)
+        self.wake()
+
+    # Next in-order payload, b'' once the sender closed and everything was read
+    async def recv(self):
+        while not self.ready:
+            if self.eof:
+                return b''
+            if self.error is not None:
+                raise self.error
+            self.waiter = self.loop.create_future()
+            await self.waiter
+        payload = self.ready.popleft()
+
+        # The reader made room in a closed window, tell the sender
+        if self.last_rwnd_sent == 0:
+            self.send_ack()
+        return payload
+
+    # Everything up to EOF
+    async def read(self):
+        chunks = []
+        while True:
+            payload = await self.recv()
+            if not payload:
+                return b''.join(chunks)
+            chunks.append(payload)
+
+async def open_endpoint(local_addr=('0.0.0.0', 0), **kwargs):
+    loop = asyncio.get_running_loop()
+    _, endpoint = await loop.create_datagram_endpoint(lambda: ReliableEndpoint(**kwargs), local_addr=local_addr)
+    return endpoint
+
+async def serve(host, port, **kwargs):
+    endpoint = await open_endpoint((host, port), **kwargs)
+    endpoint.accepting = True
+    return endpoint
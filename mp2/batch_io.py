@@ -0,0 +1,133 @@
+# Batched datagram I/O for the reliable-UDP endpoints
+#
+# A BatchSocket puts a UDP socket in non-blocking mode and waits for it with a
+# selector, so one wakeup drains every datagram already queued (up to
+# batch_size) instead of one blocking recvfrom per packet. Datagrams are read
+# with recvfrom_into into a fixed pool of buffers, and the memoryviews handed
+# out stay valid until the next batch is read, so callers must copy any
+# payload they keep.
+#
+# Outgoing packets can be queued and sent together with flush(), so a
+# receiver sends a batch's ACKs in one burst after processing it and a sender
+# sends a window's packets back to back. Python has no recvmmsg/sendmmsg, so
+# each datagram is still its own syscall, but the poll a socket timeout does
+# before every recvfrom is replaced by one select per batch.
+#
+# wakeup() may be called from any thread to end a recv_batch wait early (a
+# self-pipe), so another thread can hand the socket loop work without sharing
+# the socket or a lock with it.
+import selectors
+from socket import socketpair, timeout
+
+BATCH_SIZE = 64             # datagrams read per wakeup at most
+RECV_BUFFER_SIZE = 2048     # bytes per receive buffer, larger than any packet
+
+class BatchSocket:
+    def __init__(self, sock, batch_size=BATCH_SIZE, buffer_size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.old_timeout = sock.gettimeout()
+        sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(sock, selectors.EVENT_READ)
+        self.waker, self.wake_sender = socketpair()
+        self.waker.setblocking(False)
+        self.wake_sender.setblocking(False)
+        self.selector.register(self.waker, selectors.EVENT_READ)
+        self.buffers = [bytearray(buffer_size) for _ in range(batch_size)]
+        self.views = [memoryview(buf) for buf in self.buffers]
+        self.ready = []     # (view, addr) from the last batch not yet returned by recvfrom
+        self.pending = []   # (packet, addr) waiting for flush
+
+        # Stats
+        self.wakeups = 0
+        self.datagrams = 0
+        self.sent = 0
+        self.send_drops = 0
+
+    # Waits up to `wait` seconds (None blocks, 0 polls) for datagrams and returns
+    # every one queued, as (memoryview, addr) pairs
+    def recv_batch(self, wait=None):
+        events = self.selector.select(wait)
+        if not events:
+            return []
+        self.wakeups += 1
+        for key, _ in events:
+            if key.fileobj is self.waker:
+                self.drain_waker()
+
+        batch = []
+        for buf, view in zip(self.buffers, self.views):
+            try:
+                size, addr = self.sock.recvfrom_into(buf)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                continue    # ICMP port unreachable for an earlier send (Windows)
+            batch.append((view[:size], addr))
+        self.datagrams += len(batch)
+        return batch
+
+    # Drop-in for socket.recvfrom that reads a whole batch when the last one is used up,
+    # raises socket.timeout if nothing arrives within `wait` seconds
+    def recvfrom(self, wait=None):
+        if not self.ready:
+            self.ready = self.recv_batch(wait)
+            self.ready.reverse()
+            if not self.ready:
+                raise timeout('timed out')
+        return self.ready.pop()
+
+    # Thread safe: makes the current or next recv_batch return at once
+    def wakeup(self):
+        try:
+            self.wake_sender.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass    # a wakeup is already pending, or the socket was closed
+
+    def drain_waker(self):
+        try:
+            while self.waker.recv(512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def queue(self, packet, addr):
+        self.pending.append((packet, addr))
+
+    def flush(self):
+        for packet, addr in self.pending:
+            self.sendto(packet, addr)
+        self.pending.clear()
+
+    def sendto(self, packet, addr):
+        try:
+            self.sock.sendto(packet, addr)
+        except BlockingIOError:
+            # Send buffer full, wait for room once, then drop it like the network would
+            with selectors.DefaultSelector() as selector:
+                selector.register(self.sock, selectors.EVENT_WRITE)
+                if not selector.select(0.1):
+                    self.send_drops += 1
+                    return
+            try:
+                self.sock.sendto(packet, addr)
+            except BlockingIOError:
+                self.send_drops += 1
+                return
+        self.sent += 1
+
+    # Sends anything still queued and gives the socket back in its old blocking mode
+    def close(self):
+        self.flush()
+        self.selector.close()
+        self.waker.close()
+        self.wake_sender.close()
+        self.sock.settimeout(self.old_timeout)
+
+    def stats(self):
+        return {
+            'wakeups': self.wakeups,
+            'datagrams': self.datagrams,
+            'sent': self.sent,
+            'send_drops': self.send_drops,
+        }
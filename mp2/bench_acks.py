@@ -0,0 +1,50 @@
+# ACK traffic, receiver CPU and goodput for delayed-ACK settings
+#
+# Runs the same transfers as bench_goodput.py with the receiver ACKing every
+# in-order packet, then with each --ack-every setting (ACK_DELAY stays at
+# --ack-delay). Reports ACKs the sender got, ACKs per DATA packet, receiver
+# CPU time and goodput, also relative to ACKing every packet at the same loss
+# rate. Each cell is the median of --trials transfers.
+#
+#   python bench_acks.py --ack-every 2 4 8 --loss 0 0.02
+import argparse
+
+import client
+from bench_goodput import BASE_PORT, run_transfer
+from test_data import client_data
+
+def main():
+    parser = argparse.ArgumentParser(description='Delayed ACKs: ACK traffic, receiver CPU and goodput')
+    parser.add_argument('--ack-every', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--ack-delay', type=float, default=10.0, help='ms a held back ACK may wait')
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.02])
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr')
+    parser.add_argument('--repeat', type=int, default=500, help='times to repeat the test data')
+    parser.add_argument('--rto', type=float, default=client.RTO)
+    parser.add_argument('--buffer-size', type=int, default=64, help='receiver buffer in packets')
+    parser.add_argument('--trials', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{len(client_data(args.repeat))} bytes per transfer, {args.mode}, ack delay {args.ack_delay}ms')
+    print(f'{"loss":>6} {"ack every":>9} {"acks":>7} {"acks/pkt":>9} {"cpu s":>7} {"goodput KB/s":>13} {"vs every 1":>11} {"done":>5}')
+    run = 0
+    for loss in args.loss:
+        baseline = None
+        for every in [1] + args.ack_every:
+            server_args = ['--ack-every', str(every), '--ack-delay', str(args.ack_delay if every > 1 else 0)]
+            trials = []
+            for _ in range(args.trials):
+                trials.append(run_transfer(args.mode, loss, BASE_PORT + 200 + run, args, server_args=server_args))
+                run += 1
+            trials.sort(key=lambda stats: (not stats['success'], stats['elapsed']))
+            stats = trials[len(trials) // 2]
+            sent = stats['pkts_sent'] + stats['pkts_retransmitted']
+            goodput = stats['bytes'] / stats['elapsed'] / 1e3 if stats['success'] else 0.0
+            if baseline is None:
+                baseline = goodput
+            relative = goodput / baseline if baseline else 0.0
+            print(f'{loss:>6.2f} {every:>9} {stats["acks_received"]:>7} {stats["acks_received"] / sent:>9.2f} '
+                  f'{stats["receiver_cpu"]:>7.2f} {goodput:>13.1f} {relative:>10.2f}x {"yes" if stats["success"] else "no":>5}')
+
+if __name__ == '__main__':
+    main()
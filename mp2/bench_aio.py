@@ -0,0 +1,72 @@
+# Many concurrent transfers on one asyncio event loop
+#
+# Starts an aio_transport receiver and one sender endpoint in this process, on
+# the same loop, then runs --connections transfers at once for every count
+# given. Reports wall time, aggregate goodput, CPU time, timers started and
+# fired on the sender's wheel, and the CPU used while the endpoints sit idle
+# for a second afterwards (no polling, so it should be about zero).
+#
+#   python bench_aio.py --connections 1 10 100 500
+import argparse
+import asyncio
+import time
+
+from aio_transport import open_endpoint, serve
+from test_data import client_data
+
+HOST = '127.0.0.1'
+PORT = 8500
+
+async def receive_all(server, count):
+    streams = [await server.accept() for _ in range(count)]
+    return await asyncio.gather(*(stream.read() for stream in streams))
+
+async def transfer(endpoint, addr, data):
+    stream = await endpoint.connect(addr)
+    await stream.send(data)
+    await stream.close()
+    return stream.stats()
+
+async def run(count, port, args):
+    server = await serve(HOST, port, mode=args.mode)
+    endpoint = await open_endpoint(mode=args.mode)
+    data = client_data(args.repeat)
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    received, results = await asyncio.gather(
+        receive_all(server, count),
+        asyncio.gather(*(transfer(endpoint, (HOST, port), data) for _ in range(count))),
+    )
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    intact = sum(1 for payload in received if payload == data)
+
+    # Idle with both endpoints open
+    idle_start = time.process_time()
+    await asyncio.sleep(1.0)
+    idle_cpu = time.process_time() - idle_start
+
+    timers = endpoint.wheel.stats()
+    endpoint.close()
+    server.close()
+    total = len(data) * count
+    print(f'{count:>11} {intact:>7} {elapsed:>7.2f} {total / elapsed / 1e3:>13.1f} {cpu:>6.2f} '
+          f'{sum(s["pkts_retransmitted"] for s in results):>6} {timers["started"]:>10} {timers["fired"]:>8} '
+          f'{idle_cpu * 1000:>11.1f}')
+
+async def main_async(args):
+    print(f'{len(client_data(args.repeat))} bytes per transfer, {args.mode}')
+    print(f'{"connections":>11} {"intact":>7} {"time s":>7} {"goodput KB/s":>13} {"cpu s":>6} {"retx":>6} '
+          f'{"timers set":>10} {"fired":>8} {"idle cpu ms":>11}')
+    for run_index, count in enumerate(args.connections):
+        await run(count, PORT + run_index, args)
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent transfers on one asyncio event loop')
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=50, help='times to repeat the test data')
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr')
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Throughput benchmark for checksum.py against the byte-pair loop that
+# client.py and pipeline_server.py used before (copied below as the baseline).
+#
+# Checks first that both give identical results on edge cases and random
+# buffers, then times checksum_calc at several sizes, and verifying a packet
+# in the old text format against verifying one in the binary format.
+#
+#   python bench_checksum.py --seconds 0.5
+import argparse
+import random
+import time
+
+from checksum import checksum_calc
+from packet import DATA, encode_packet, parse_packet
+
+# --- Legacy helpers (baseline) ---
+def legacy_checksum_calc(data: bytes) -> int:
+    checksum = 0
+    for i in range(0, len(data), 2):
+        if i + 1 < len(data):
+            word = (data[i] << 8) + data[i + 1]
+        else:
+            word = data[i] << 8
+        checksum += word
+        checksum = (checksum & 0xFFFF) + (checksum >> 16)
+    checksum = ~checksum & 0xFFFF
+    return checksum
+
+def legacy_verify_checksum(data: bytes, expected_checksum: int) -> bool:
+    parts = data.split(b'|', 5)
+    if len(parts) < 5:
+        return False
+    no_checksum_header = b'|'.join(parts[:4]) + b'|0|'
+    if len(parts) > 5:
+        no_checksum_pkt = no_checksum_header + parts[5]
+    else:
+        no_checksum_pkt = no_checksum_header
+    return legacy_checksum_calc(no_checksum_pkt) == expected_checksum
+
+def make_text_packet(seq, payload):
+    header = f"{seq}|0|32|DATA|0|".encode()
+    checksum = legacy_checksum_calc(header + payload)
+    return f"{seq}|0|32|DATA|{checksum}|".encode() + payload, checksum
+
+SIZES = [20, 64, 512, 1400, 8192, 65000]
+
+def self_check(rng):
+    cases = [b'', b'\x00', b'\x00' * 7, b'\xff', b'\xff' * 2, b'\xff' * 9, b'\x01',
+             b'\xff\xfe', b'\x00\x01' * 3]
+    for length in list(range(1, 40)) + SIZES:
+        cases.append(rng.randbytes(length))
+    for data in cases:
+        assert checksum_calc(data) == legacy_checksum_calc(data), data
+
+    for length in (0, 1, 19, 20, 1400):
+        payload = rng.randbytes(length)
+        packet, checksum = make_text_packet(rng.randrange(10 ** 6), payload)
+        assert legacy_verify_checksum(packet, checksum)
+        binary = encode_packet(rng.randrange(10 ** 6), 0, 32, DATA, payload)
+        assert parse_packet(binary).payload == payload
+        corrupt = bytearray(binary)
+        corrupt[-1] ^= 0xFF
+        try:
+            parse_packet(corrupt)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('corrupted packet passed the checksum')
+    print(f'self check: {len(cases)} buffers identical, corrupted packets rejected')
+
+# Runs fn(arg) repeatedly for about `seconds`, returns calls per second
+def rate(fn, arg, seconds):
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        for _ in range(50):
+            fn(*arg)
+        calls += 50
+        now = time.perf_counter()
+        if now >= deadline:
+            return calls / (now - start)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the packet checksum')
+    parser.add_argument('--seconds', type=float, default=0.5, help='time per measurement')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    self_check(rng)
+
+    print(f'\n{"payload":>7} {"":<8} {"legacy MB/s":>12} {"new MB/s":>10} {"speedup":>8}')
+    for size in SIZES:
+        data = rng.randbytes(size)
+        packet, checksum = make_text_packet(1234, data)
+        binary = bytes(encode_packet(1234, 0, 32, DATA, data))
+        for label, legacy, new, legacy_arg, new_arg in (
+            ('calc', legacy_checksum_calc, checksum_calc, (data,), (data,)),
+            ('verify', legacy_verify_checksum, parse_packet, (packet, checksum), (binary,)),
+        ):
+            legacy_rate = rate(legacy, legacy_arg, args.seconds)
+            new_rate = rate(new, new_arg, args.seconds)
+            print(f'{size:>7} {label:<8} {legacy_rate * size / 1e6:>12.1f} {new_rate * size / 1e6:>10.1f} '
+                  f'{new_rate / legacy_rate:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
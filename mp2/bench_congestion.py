@@ -0,0 +1,52 @@
+# Congestion control comparison: ramp-up time and steady-state window
+#
+# Runs a selective-repeat transfer per controller (congestion.py) and loss
+# rate with a CwndTrace attached, using bench_goodput's receiver setup. The
+# receiver buffer is large so the congestion window, not rwnd, limits the
+# sender. Reports goodput, the time until cwnd first reached --target
+# packets, the mean cwnd over the second half of the transfer, and how often
+# each loss reaction fired.
+#
+#   python bench_congestion.py --loss 0 0.01 0.02 --repeat 400
+import argparse
+
+import client
+from bench_goodput import BASE_PORT, run_transfer
+from test_data import client_data
+from congestion import CONTROLLERS, CwndTrace
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare congestion control ramp-up and steady state')
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.01, 0.02])
+    parser.add_argument('--cc', nargs='+', choices=list(CONTROLLERS), default=list(CONTROLLERS))
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr')
+    parser.add_argument('--repeat', type=int, default=400, help='times to repeat the test data')
+    parser.add_argument('--rto', type=float, default=client.RTO, help='sender initial retransmission timeout')
+    parser.add_argument('--buffer-size', type=int, default=4096, help='receiver buffer in packets')
+    parser.add_argument('--target', type=int, default=64, help='cwnd that counts as ramped up, in packets')
+    parser.add_argument('--trace-dir', help='write each run\'s cwnd trace as CSV into this directory')
+    args = parser.parse_args()
+
+    print(f'{len(client_data(args.repeat))} bytes per transfer, {args.mode}, receiver buffer {args.buffer_size}')
+    print(f'{"loss":>6} {"cc":<6} {"goodput KB/s":>13} {"time s":>8} {"ramp-up ms":>11} {"steady cwnd":>12} '
+          f'{"peak cwnd":>10} {"fast retx":>10} {"timeouts":>9}')
+    run = 0
+    for loss in args.loss:
+        for name in args.cc:
+            trace = CwndTrace()
+            stats = run_transfer(args.mode, loss, BASE_PORT + 50 + run, args, name, trace)
+            run += 1
+
+            goodput = stats['bytes'] / stats['elapsed'] / 1e3 if stats['success'] else 0.0
+            ramp_up = trace.ramp_up_time(args.target)
+            ramp_up = f'{ramp_up * 1000:.1f}' if ramp_up is not None else 'never'
+            half = trace.samples[-1][0] / 2 if trace.samples else 0.0
+            peak = max((sample[1] for sample in trace.samples), default=0.0)
+            print(f'{loss:>6.2f} {name:<6} {goodput:>13.1f} {stats["elapsed"]:>8.2f} {ramp_up:>11} '
+                  f'{trace.mean_cwnd(half):>12.1f} {peak:>10.1f} {trace.count("fast_retransmit"):>10} '
+                  f'{trace.count("timeout"):>9}')
+            if args.trace_dir:
+                trace.write_csv(f'{args.trace_dir}/cwnd_{name}_loss{loss:g}.csv')
+
+if __name__ == '__main__':
+    main()
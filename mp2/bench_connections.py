@@ -0,0 +1,121 @@
+# Many concurrent connections against one pipeline_server.py socket
+#
+# Opens --connections connections from a single client socket, each with its
+# own conn_id, then sends --packets DATA packets on every connection,
+# interleaved round-robin so the receiver switches connection on every packet.
+# Packets go out in batches and are resent until the receiver replies.
+# The receiver runs at its default segment sizes, so the SYNs, which announce
+# none, get the default. Reports handshake and transfer time, packets per
+# second, and the receiver's resident memory per connection, both half-open
+# (SYN answered, no receive buffer yet) and after the transfer.
+#
+#   python bench_connections.py --connections 2000 --packets 5
+import argparse
+import random
+import subprocess
+import sys
+import time
+from socket import socket, timeout, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF
+
+from packet import ACK, DATA, SACK, SYN, encode_packet, parse_packet
+
+HOST = '127.0.0.1'
+PORT = 8200
+PAYLOAD = b'x' * 64
+
+# helper function to read a process's resident set size in KB
+def rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+# helper function to collect replies until none arrive for `quiet` seconds,
+# returns {conn_id: highest ack} for packets with the wanted flags
+def collect(sock, flags, quiet=0.5):
+    acks = {}
+    sock.settimeout(quiet)
+    while True:
+        try:
+            data, _ = sock.recvfrom(2048)
+        except timeout:
+            return acks
+        try:
+            pkt = parse_packet(data)
+        except ValueError:
+            continue
+        if pkt.flags & ~SACK == flags:     # SACK blocks don't matter here
+            acks[pkt.conn_id] = max(acks.get(pkt.conn_id, 0), pkt.ack)
+
+# helper function to send one packet per connection in batches of `batch`,
+# resending to connections that got no reply, until each has a reply with the
+# wanted flags and an ack of at least `min_ack`. Returns {conn_id: ack}
+def send_rounds(sock, addr, conn_ids, flags, make, batch, stats, min_ack=0):
+    replies = {}
+    pending = list(conn_ids)
+    while pending:
+        for conn_id in pending[:batch]:
+            sock.sendto(make(conn_id), addr)
+            stats['sent'] += 1
+        for conn_id, ack in collect(sock, flags, 0.05).items():
+            if ack >= min_ack:
+                replies[conn_id] = ack
+        pending = [conn_id for conn_id in pending if conn_id not in replies]
+    return replies
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent connections on one receiver socket')
+    parser.add_argument('--connections', type=int, default=2000)
+    parser.add_argument('--packets', type=int, default=5, help='DATA packets per connection')
+    parser.add_argument('--batch', type=int, default=200, help='packets sent before waiting for replies')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [sys.executable, 'pipeline_server.py', '--port', str(args.port), '--process-delay', '0',
+         '--buffer-size', str(args.packets),
+         '--max-connections', str(args.connections)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.setsockopt(SOL_SOCKET, SO_RCVBUF, 1 << 22)   # replies arrive in bursts
+    addr = (HOST, args.port)
+    try:
+        time.sleep(0.5)     # let the receiver bind
+        rss_before = rss_kb(server.pid)
+        conn_ids = random.sample(range(1, 1 << 32), args.connections)
+        stats = {'sent': 0}
+
+        # Handshakes, SYNs in batches so the receiver's socket buffer doesn't overflow
+        start = time.perf_counter()
+        syn_acks = send_rounds(sock, addr, conn_ids, SYN | ACK, lambda conn_id: encode_packet(0, 0, 32, SYN, b'', conn_id),
+                               args.batch, stats)
+        rss_half_open = rss_kb(server.pid)
+        for conn_id in conn_ids:
+            sock.sendto(encode_packet(1, syn_acks[conn_id], 32, ACK, b'', conn_id), addr)
+        handshake_time = time.perf_counter() - start
+
+        # Data, round-robin across connections, one packet per connection per round
+        start = time.perf_counter()
+        for seq in range(1, args.packets + 1):
+            send_rounds(sock, addr, conn_ids, ACK, lambda conn_id: encode_packet(seq, 0, 32, DATA, PAYLOAD, conn_id),
+                        args.batch, stats, seq + 1)
+        transfer_time = time.perf_counter() - start
+        rss_after = rss_kb(server.pid)
+    finally:
+        sock.close()
+        server.terminate()
+        server.wait()
+
+    total = args.connections * args.packets
+    print(f'{args.connections} connections, {args.packets} packets each')
+    print(f'handshakes:   {handshake_time:.2f}s ({args.connections / handshake_time:.0f}/s)')
+    print(f'transfer:     {transfer_time:.2f}s ({total / transfer_time:.0f} packets/s)')
+    print(f'sent:         {stats["sent"]} packets for {args.connections * (args.packets + 1)} needed')
+    print(f'receiver RSS: {rss_before} KB -> {rss_half_open} KB half-open '
+          f'({(rss_half_open - rss_before) * 1024 / args.connections:.0f} bytes per connection) -> '
+          f'{rss_after} KB established ({(rss_after - rss_before) * 1024 / args.connections:.0f} bytes per connection)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# Goodput against loss rate for Go-Back-N and selective repeat
+#
+# For every mode and loss rate, starts pipeline_server.py on its own port
+# (packets consumed on arrival, no simulated corruption), then sends the test
+# data from client.py in-process. The same loss rate drops DATA packets at
+# the receiver and ACKs at the sender. Goodput is application bytes delivered
+# per second of transfer. Each cell is the median of --trials transfers.
+#
+#   python bench_goodput.py --loss 0 0.02 0.05 0.1 --repeat 200
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+from socket import socket, AF_INET, SOCK_DGRAM
+
+import client
+from test_data import client_data
+
+HOST = '127.0.0.1'
+BASE_PORT = 8100    # Each run gets its own port, the receiver serves a single connection
+
+def run_transfer(mode, loss, port, args, cc='reno', trace=None, server_args=()):
+    server = subprocess.Popen(
+        [sys.executable, 'pipeline_server.py', '--port', str(port), '--mode', mode,
+         '--buffer-size', str(args.buffer_size), '--process-delay', '0',
+         '--loss-rate', str(loss), *server_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    sock = socket(AF_INET, SOCK_DGRAM)
+    try:
+        time.sleep(0.5)     # let the receiver bind before the SYN goes out
+        cpu_start = cpu_seconds(server.pid)
+        client.SIMULATE_LOSS, client.LOSS_RATE = loss > 0, loss
+
+        app_data = client_data(args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            next_seq = client.perform_handshake(sock, (HOST, port))
+            stats = client.send_data(sock, (HOST, port), app_data, next_seq, mode, args.rto, cc, trace)
+        stats['receiver_cpu'] = cpu_seconds(server.pid) - cpu_start
+        return stats
+    finally:
+        sock.close()
+        server.terminate()
+        server.wait()
+
+# helper function to read a process's user + system CPU time from /proc
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def main():
+    parser = argparse.ArgumentParser(description='Goodput against loss rate, Go-Back-N vs selective repeat')
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.0, 0.02, 0.05, 0.1, 0.2])
+    parser.add_argument('--modes', nargs='+', choices=['gbn', 'sr'], default=['gbn', 'sr'])
+    parser.add_argument('--repeat', type=int, default=100, help='times to repeat the test data')
+    parser.add_argument('--rto', type=float, default=client.RTO,
+                        help='sender initial retransmission timeout in seconds (default: %(default)s)')
+    parser.add_argument('--buffer-size', type=int, default=64, help='receiver buffer in packets')
+    parser.add_argument('--trials', type=int, default=3, help='transfers per mode and loss rate')
+    parser.add_argument('--cc', choices=['aimd', 'reno', 'cubic'], default='reno', help='sender congestion control')
+    args = parser.parse_args()
+
+    print(f'{len(client_data(args.repeat))} bytes per transfer, initial rto {args.rto}s, receiver buffer {args.buffer_size}')
+    print(f'{"loss":>6} {"mode":<5} {"goodput KB/s":>13} {"time s":>8} {"sent":>7} {"retx":>7} {"timeouts":>9} '
+          f'{"srtt ms":>8} {"rto ms":>7} {"done":>5}')
+    run = 0
+    for loss in args.loss:
+        for mode in args.modes:
+            trials = []
+            for _ in range(args.trials):
+                trials.append(run_transfer(mode, loss, BASE_PORT + run, args, args.cc))
+                run += 1
+            # Median by transfer time, a failed transfer counts as slowest
+            trials.sort(key=lambda stats: (not stats['success'], stats['elapsed']))
+            stats = trials[len(trials) // 2]
+            goodput = stats['bytes'] / stats['elapsed'] / 1e3 if stats['success'] else 0.0
+            srtt_ms = (stats['srtt'] or 0.0) * 1000
+            print(f'{loss:>6.2f} {mode:<5} {goodput:>13.1f} {stats["elapsed"]:>8.2f} {stats["pkts_sent"]:>7} '
+                  f'{stats["pkts_retransmitted"]:>7} {stats["timeouts"]:>9} {srtt_ms:>8.2f} {stats["rto"] * 1000:>7.1f} '
+                  f'{"yes" if stats["success"] else "no":>5}')
+
+if __name__ == '__main__':
+    main()
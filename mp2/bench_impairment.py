@@ -0,0 +1,148 @@
+# Goodput and completion time across network impairment profiles
+#
+# For every profile and mode, starts pipeline_server.py on its own port and an
+# impairment.py relay in front of it, then runs client.py against the relay,
+# sending the same --size KB of random bytes each time. The relay is seeded
+# with --seed, so every mode faces the same loss, corruption and reordering
+# draws. The receiver runs the sha256 consumer and a run only counts as done
+# if the digest it prints matches what was sent. A run still going after
+# --time-limit seconds is stopped and reported as such.
+#
+# Goodput is bytes delivered per second of transfer (client.py's own timing,
+# from the first DATA packet to the last ACK). Completion time is the
+# client.py process from start to exit, handshake and FIN included.
+#
+#   python bench_impairment.py --profiles clean lossy wan narrow hostile --modes gbn sr --seed 1 --csv results.csv
+import argparse
+import csv
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from impairment import PROFILES
+
+HOST = '127.0.0.1'
+BASE_PORT = 8700    # Each run gets a port for its receiver and the next one for its relay
+
+# client.py's [STATS] lines -> (key, pattern, type)
+CLIENT_STATS = [
+    ('bytes', r'Bytes: (\d+) in', int),
+    ('elapsed', r'Bytes: \d+ in ([\d.]+)s', float),
+    ('sha256', r'SHA-256: (\w+)', str),
+    ('pkts_sent', r'Packets sent: (\d+)', int),
+    ('pkts_retransmitted', r'Packets retransmitted: (\d+)', int),
+    ('timeouts', r'Timeouts: (\d+)', int),
+    ('srtt_ms', r'srtt=([\d.]+)ms', float),
+]
+
+def run(profile, mode, port, path, args):
+    server_log = tempfile.TemporaryFile('w+')
+    relay_log = tempfile.TemporaryFile('w+')
+    server = subprocess.Popen(
+        [sys.executable, 'pipeline_server.py', '--port', str(port), '--mode', mode,
+         '--buffer-size', str(args.buffer_size), '--process-delay', '0', '--log-level', 'info'],
+        stdout=server_log, stderr=subprocess.STDOUT,
+    )
+    relay = subprocess.Popen(
+        [sys.executable, 'impairment.py', '--listen', str(port + 1), '--target', f'{HOST}:{port}',
+         '--profile', profile, '--seed', str(args.seed)],
+        stdout=relay_log, stderr=subprocess.STDOUT,
+    )
+    stats = {'completed': False}
+    try:
+        time.sleep(0.5)     # let the receiver and the relay bind before the SYN goes out
+        start = time.time()
+        try:
+            sender = subprocess.run(
+                [sys.executable, 'client.py', '--port', str(port + 1), '--mode', mode, '--file', path,
+                 '--segment-size', str(args.segment_size), '--rto', str(args.rto), '--cc', args.cc,
+                 '--log-level', 'info'],
+                capture_output=True, text=True, timeout=args.time_limit,
+            )
+            stats['completed'] = True
+            for key, pattern, kind in CLIENT_STATS:
+                match = re.search(pattern, sender.stdout)
+                stats[key] = kind(match.group(1)) if match else None
+        except subprocess.TimeoutExpired:
+            pass
+        stats['completion'] = time.time() - start
+    finally:
+        time.sleep(0.2)     # let the receiver print the digest
+        for process in (relay, server):
+            process.terminate()
+            process.wait()
+
+    server_log.seek(0)
+    digests = re.findall(r'\[DELIVER\] (\d+) bytes .* sha256 (\w+)', server_log.read())
+    relay_log.seek(0)
+    relayed = dict(re.findall(r'\[RELAY\] (\w+): (.*)', relay_log.read()))
+    server_log.close()
+    relay_log.close()
+    stats['delivered'] = digests[-1] if digests else None
+    stats['relay_up'] = relayed.get('up', '')
+    stats['relay_down'] = relayed.get('down', '')
+    return stats
+
+# helper function to format a number that may be missing
+def show(value, width, spec=''):
+    return f'{"-" if value is None else format(value, spec):>{width}}'
+
+def main():
+    parser = argparse.ArgumentParser(description='Goodput and completion time across impairment profiles')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--modes', nargs='+', choices=['gbn', 'sr'], default=['gbn', 'sr'])
+    parser.add_argument('--size', type=int, default=256, help='KB of random data per transfer')
+    parser.add_argument('--segment-size', type=int, default=1400, help='payload bytes per DATA packet')
+    parser.add_argument('--buffer-size', type=int, default=64, help='receiver buffer in segments')
+    parser.add_argument('--rto', type=float, default=1.0, help='sender initial retransmission timeout')
+    parser.add_argument('--cc', default='reno', help='sender congestion control')
+    parser.add_argument('--seed', type=int, default=1, help='relay seed, the same for every run')
+    parser.add_argument('--time-limit', type=float, default=60.0, help='seconds before a run is stopped')
+    parser.add_argument('--csv', metavar='PATH', help='also write every run to this CSV file')
+    args = parser.parse_args()
+
+    data = os.urandom(args.size * 1000)
+    digest = hashlib.sha256(data).hexdigest()
+    source = tempfile.NamedTemporaryFile(suffix='.bin', delete=False)
+    source.write(data)
+    source.close()
+
+    print(f'{len(data)} bytes per transfer in {args.segment_size} byte segments, receiver buffer '
+          f'{args.buffer_size}, seed {args.seed}')
+    print(f'{"profile":<10} {"mode":<5} {"goodput KB/s":>13} {"time s":>7} {"done s":>7} {"sent":>6} {"retx":>6} '
+          f'{"timeouts":>9} {"srtt ms":>8}  delivered')
+    rows = []
+    try:
+        for run_index, (profile, mode) in enumerate((p, m) for p in args.profiles for m in args.modes):
+            stats = run(profile, mode, BASE_PORT + 2 * run_index, source.name, args)
+            delivered = stats['delivered']
+            intact = delivered is not None and int(delivered[0]) == len(data) and delivered[1] == digest
+            goodput = len(data) / stats['elapsed'] / 1e3 if intact and stats.get('elapsed') else 0.0
+            outcome = 'intact' if intact else 'NO' if stats['completed'] else 'time limit'
+            print(f'{profile:<10} {mode:<5} {goodput:>13.1f} {show(stats.get("elapsed"), 7, ".3f")} '
+                  f'{stats["completion"]:>7.2f} {show(stats.get("pkts_sent"), 6)} '
+                  f'{show(stats.get("pkts_retransmitted"), 6)} {show(stats.get("timeouts"), 9)} '
+                  f'{show(stats.get("srtt_ms"), 8, ".2f")}  {outcome}')
+            rows.append({
+                'profile': profile, 'mode': mode, 'seed': args.seed, 'bytes': len(data),
+                'segment_size': args.segment_size, 'outcome': outcome, 'goodput_kbps': round(goodput, 1),
+                'transfer_s': stats.get('elapsed'), 'completion_s': round(stats['completion'], 3),
+                'pkts_sent': stats.get('pkts_sent'), 'pkts_retransmitted': stats.get('pkts_retransmitted'),
+                'timeouts': stats.get('timeouts'), 'srtt_ms': stats.get('srtt_ms'),
+                'relay_up': stats['relay_up'], 'relay_down': stats['relay_down'],
+            })
+    finally:
+        os.unlink(source.name)
+
+    if args.csv and rows:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Receiver packets per second with per-packet and batched socket I/O
+#
+# Fills the receiver's socket buffer with --burst DATA packets and a FIN, then
+# times how fast the receiver drains them, parsing every packet and ACKing it
+# back like pipeline_server.py (--no-ack leaves the ACKs out). Filling first
+# keeps the sender from competing with the receiver for the CPU, so only the
+# receive path is measured:
+#
+#   single    the old loop: socket timeout, one recvfrom(2048) and one sendto per packet
+#   batched   BatchSocket: one selector wakeup drains every queued datagram into
+#             reused buffers, the batch's ACKs go out together from flush()
+#
+#   python bench_io.py --packets 200000
+import argparse
+import time
+from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF
+
+from batch_io import BatchSocket
+from packet import ACK, DATA, FIN, encode_packet, parse_packet
+
+HOST = '127.0.0.1'
+PORT = 8300
+RCVBUF = 1 << 23    # capped by net.core.rmem_max, --burst must fit in it
+
+# helper function to build the cumulative ACK for a packet
+def ack_for(pkt):
+    return encode_packet(0, pkt.seq + 1, 32, ACK, b'', pkt.conn_id)
+
+def receive_single(sock, ack=True):
+    sock.settimeout(0.5)
+    received = 0
+    while True:
+        data, addr = sock.recvfrom(2048)
+        pkt = parse_packet(data)
+        if pkt.flags == FIN:
+            return received
+        received += 1
+        if ack:
+            sock.sendto(ack_for(pkt), addr)
+
+def receive_batched(sock, ack=True):
+    io = BatchSocket(sock)
+    received = 0
+    while True:
+        for data, addr in io.recv_batch(0.5):
+            pkt = parse_packet(data)
+            if pkt.flags == FIN:
+                io.close()
+                return received
+            received += 1
+            if ack:
+                io.queue(ack_for(pkt), addr)
+        io.flush()
+
+RECEIVERS = {'single': receive_single, 'batched': receive_batched}
+
+def run(name, args):
+    receiver = socket(AF_INET, SOCK_DGRAM)
+    receiver.setsockopt(SOL_SOCKET, SO_RCVBUF, RCVBUF)
+    receiver.bind((HOST, args.port))
+    sender = socket(AF_INET, SOCK_DGRAM)
+    addr = (HOST, args.port)
+    payload = b'x' * args.payload
+    data = [encode_packet(seq, 0, 32, DATA, payload, 1) for seq in range(1, args.burst + 1)]
+    fin = encode_packet(args.burst + 1, 0, 32, FIN, b'', 1)
+
+    received = 0
+    elapsed = 0.0
+    try:
+        for _ in range(max(1, args.packets // args.burst)):
+            for pkt in data:
+                sender.sendto(pkt, addr)
+            sender.sendto(fin, addr)
+
+            start = time.perf_counter()
+            received += RECEIVERS[name](receiver, not args.no_ack)
+            elapsed += time.perf_counter() - start
+    finally:
+        sender.close()
+        receiver.close()
+    return received, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Receiver packets per second, per-packet vs batched I/O')
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--burst', type=int, default=5000, help='packets queued before each drain')
+    parser.add_argument('--payload', type=int, default=20, help='payload bytes per packet')
+    parser.add_argument('--modes', nargs='+', choices=list(RECEIVERS), default=list(RECEIVERS))
+    parser.add_argument('--no-ack', action='store_true', help='measure the receive path alone, without ACKs')
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args()
+
+    print(f'{args.packets} packets in bursts of {args.burst}, {args.payload} byte payloads')
+    print(f'{"mode":<8} {"received":>9} {"time s":>7} {"pps":>10}')
+    for name in args.modes:
+        received, elapsed = run(name, args)
+        print(f'{name:<8} {received:>9} {elapsed:>7.2f} {received / elapsed:>10,.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Microbenchmark for packet.py against the pipe-delimited text packets
+# client.py and pipeline_server.py used before (copied below as the baseline).
+#
+# Both sides use the same checksum (checksum.py), so the difference is the
+# header format alone: formatting and encoding the text header twice and
+# splitting it back into ints, against one struct pack/unpack and a checksum
+# written in place.
+#
+#   python bench_packet.py --packets 200000
+import argparse
+import time
+
+from checksum import checksum_parts
+from packet import ACK, DATA, encode_packet, parse_packet
+
+# --- Legacy helpers (baseline) ---
+def legacy_verify_checksum(data, expected_checksum):
+    end = -1
+    for _ in range(4):
+        end = data.find(b'|', end + 1)
+    field_end = data.find(b'|', end + 1)
+    view = memoryview(data)
+    return checksum_parts(view[:end + 1], b'0', view[field_end:]) == expected_checksum
+
+def legacy_make_packet(seq, ack, rwnd, flags, payload: bytes) -> bytes:
+    header = f"{seq}|{ack}|{rwnd}|{flags}|0|".encode()
+    checksum = checksum_parts(header, payload)
+    header = f"{seq}|{ack}|{rwnd}|{flags}|{checksum}|".encode()
+    return header + payload
+
+def legacy_parse_packet(packet: bytes) -> dict:
+    parts = packet.split(b'|', 5)
+    if len(parts) < 5:
+        raise ValueError("Malformed packet: not enough fields")
+    seq = int(parts[0])
+    ack = int(parts[1])
+    rwnd = int(parts[2])
+    flags = parts[3].decode()
+    checksum = int(parts[4])
+    payload = parts[5] if len(parts) > 5 else b''
+    if not legacy_verify_checksum(packet, checksum):
+        raise ValueError("[ERROR] Checksum verification failed")
+    return {'seq': seq, 'ack': ack, 'rwnd': rwnd, 'flags': flags, 'checksum': checksum, 'payload': payload}
+
+def bench(fn, count):
+    start = time.perf_counter()
+    fn(count)
+    elapsed = time.perf_counter() - start
+    return count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark packet encode/decode')
+    parser.add_argument('--packets', type=int, default=200000)
+    args = parser.parse_args()
+
+    # A mid-transfer data packet and the ACK that answers it
+    seq = 123456
+    cases = [
+        ('ACK', 0, seq + 1, 5, 'ACK', ACK, b''),
+        ('DATA 20B', seq, 0, 32, 'DATA', DATA, b'x' * 20),
+        ('DATA 1400B', seq, 0, 32, 'DATA', DATA, b'x' * 1400),
+    ]
+
+    print(f'{"packet":<11} {"text B":>7} {"binary B":>9} {"encode text/s":>14} {"binary/s":>10} '
+          f'{"decode text/s":>14} {"binary/s":>10}')
+    for label, pseq, ack, rwnd, text_flags, flags, payload in cases:
+        text = legacy_make_packet(pseq, ack, rwnd, text_flags, payload)
+        binary = bytes(encode_packet(pseq, ack, rwnd, flags, payload))
+        decoded = parse_packet(binary)
+        assert (decoded.seq, decoded.ack, decoded.rwnd, decoded.flags, bytes(decoded.payload)) == \
+            (pseq, ack, rwnd, flags, payload)
+
+        def text_encode(count):
+            for _ in range(count):
+                legacy_make_packet(pseq, ack, rwnd, text_flags, payload)
+
+        def binary_encode(count):
+            for _ in range(count):
+                encode_packet(pseq, ack, rwnd, flags, payload)
+
+        def text_decode(count):
+            for _ in range(count):
+                legacy_parse_packet(text)
+
+        def binary_decode(count):
+            for _ in range(count):
+                parse_packet(binary)
+
+        print(f'{label:<11} {len(text):>7} {len(binary):>9} {bench(text_encode, args.packets):>14,.0f} '
+              f'{bench(binary_encode, args.packets):>10,.0f} {bench(text_decode, args.packets):>14,.0f} '
+              f'{bench(binary_decode, args.packets):>10,.0f}')
+
+if __name__ == '__main__':
+    main()
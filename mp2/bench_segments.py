@@ -0,0 +1,88 @@
+# Throughput of one large transfer against segment size
+#
+# Sends --size MB of random bytes, or --file mapped with mmap, from
+# client.send_data to pipeline_server.py once per --segment-sizes entry (0 is
+# the path MTU size client.py picks by default). Segments are memoryview
+# slices of the one source buffer. The receiver runs the sha256 consumer, and each run checks the digest it prints
+# against the source, so only data that was actually delivered counts.
+#
+#   python bench_segments.py --size 100 --segment-sizes 1400 8192 32768 0
+import argparse
+import contextlib
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_SNDBUF
+
+import client
+from bench_goodput import cpu_seconds
+
+HOST = '127.0.0.1'
+BASE_PORT = 8600
+
+def run(segment_size, port, data, args):
+    log = tempfile.TemporaryFile('w+')
+    server = subprocess.Popen(
+        [sys.executable, 'pipeline_server.py', '--port', str(port), '--mode', args.mode,
+         '--buffer-size', str(args.buffer_size), '--process-delay', '0'],
+        stdout=log, stderr=subprocess.STDOUT,
+    )
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.setsockopt(SOL_SOCKET, SO_SNDBUF, client.SOCKET_BUFFER)
+    try:
+        time.sleep(0.5)     # let the receiver bind before the SYN goes out
+        cpu_start = cpu_seconds(server.pid)
+        client.SIMULATE_LOSS = False
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            next_seq = client.perform_handshake(sock, (HOST, port), segment_size)
+            stats = client.send_data(sock, (HOST, port), data, next_seq, args.mode, args.rto, args.cc)
+            client.close_connection(sock, (HOST, port), stats['send_base'], stats['rto'])
+        stats['receiver_cpu'] = cpu_seconds(server.pid) - cpu_start
+    finally:
+        sock.close()
+        time.sleep(0.2)     # let the receiver print the digest
+        server.terminate()
+        server.wait()
+
+    log.seek(0)
+    digests = re.findall(r'\[DELIVER\] (\d+) bytes .* sha256 (\w+)', log.read())
+    log.close()
+    stats['delivered'] = digests[-1] if digests else None
+    return stats
+
+def run_all(data, args):
+    digest = hashlib.sha256(data).hexdigest()
+    print(f'{len(data)} bytes per transfer, {args.mode}, receiver buffer {args.buffer_size} segments')
+    print(f'{"segment":>8} {"packets":>8} {"time s":>7} {"MB/s":>7} {"retx":>6} {"rx cpu s":>9}  delivered')
+    for run_index, segment_size in enumerate(args.segment_sizes):
+        segment_size = segment_size or client.path_segment_size((HOST, BASE_PORT))
+        stats = run(segment_size, BASE_PORT + run_index, data, args)
+        delivered = stats['delivered']
+        intact = delivered is not None and int(delivered[0]) == len(data) and delivered[1] == digest
+        print(f'{stats["segment_size"]:>8} {stats["pkts_sent"]:>8} {stats["elapsed"]:>7.2f} '
+              f'{len(data) / stats["elapsed"] / 1e6:>7.1f} {stats["pkts_retransmitted"]:>6} '
+              f'{stats["receiver_cpu"]:>9.2f}  {"intact" if intact else "NO"}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of a large transfer against segment size')
+    parser.add_argument('--size', type=float, default=64, help='MB of random data per transfer')
+    parser.add_argument('--file', help='send this file instead of random data')
+    parser.add_argument('--segment-sizes', type=int, nargs='+', default=[1400, 8192, 32768, 0],
+                        help='payload bytes per packet, 0 for the path MTU')
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='sr')
+    parser.add_argument('--buffer-size', type=int, default=64, help='receiver buffer in segments')
+    parser.add_argument('--rto', type=float, default=client.RTO, help='sender initial retransmission timeout')
+    parser.add_argument('--cc', default='reno', help='sender congestion control')
+    args = parser.parse_args()
+
+    source = client.open_source(args.file) if args.file else contextlib.nullcontext(os.urandom(int(args.size * 1e6)))
+    with source as data:
+        run_all(data, args)
+
+if __name__ == '__main__':
+    main()
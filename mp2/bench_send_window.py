@@ -0,0 +1,120 @@
+# Microbenchmark for send_window.py against the dicts and sets client.py's
+# send_data kept its in-flight segments in before (copied below as the baseline).
+#
+# For each window size the window is filled, then ACKed and refilled in
+# steps, timing the sender's work per ACK:
+#   in order  cumulative ACKs covering --step segments each, --step new
+#             segments sent per ACK, so the window stays full
+#   SACK      the oldest segment lost, every ACK a duplicate with a SACK
+#             block up to the newest segment (selective repeat recovery),
+#             and the highest SACKed seq looked up for fast retransmit
+# The old code scanned every in-flight seq on each new ACK and rebuilt the
+# SACK set from each block, so it grows with the window, SendWindow doesn't.
+#
+#   python bench_send_window.py --windows 1000 10000 50000 --acks 2000
+import argparse
+import time
+
+from send_window import SendWindow
+
+PAYLOAD = memoryview(b'x' * 1400)
+
+# --- Legacy helpers (baseline) ---
+class LegacyWindow:
+    def __init__(self, base):
+        self.base = base
+        self.next_seq = base
+        self.sent_times = {}
+        self.retransmitted = set()
+        self.buffered = {}
+        self.sacked = set()
+
+    def push(self, payload, now):
+        self.buffered[self.next_seq] = payload
+        self.sent_times[self.next_seq] = now
+        self.next_seq += 1
+
+    def ack(self, ack_num, now):
+        newest = ack_num - 1
+        rtt = None
+        if newest in self.sent_times and not any(s < ack_num for s in self.retransmitted):
+            rtt = now - self.sent_times[newest]
+        remove_seqs = [s for s in self.buffered.keys() if s < ack_num]
+        for s in remove_seqs:
+            self.buffered.pop(s, None)
+            self.sent_times.pop(s, None)
+            self.retransmitted.discard(s)
+        if self.sacked:
+            self.sacked = {s for s in self.sacked if s >= ack_num}
+        self.base = ack_num
+        return rtt
+
+    def sack(self, ack_num, block_start, block_end):
+        self.sacked.update(range(max(block_start, ack_num), min(block_end, self.next_seq)))
+        return max(self.sacked)
+
+# The same operations on a SendWindow, as client.py's send_data does them
+def window_ack(window, ack_num, now):
+    acked = window.ack(ack_num)
+    if acked and not any(segment.retransmits for segment in acked):
+        return now - acked[-1].sent_time
+    return None
+
+def window_sack(window, ack_num, block_start, block_end):
+    window.sack(block_start, block_end)
+    return window.highest_sacked()
+
+# helper function to fill a window, then time ACKing and refilling it; returns microseconds per ACK
+def bench_in_order(window, ack, size, acks, step):
+    for _ in range(size):
+        window.push(PAYLOAD, 0.0)
+    start = time.perf_counter()
+    for _ in range(acks):
+        ack(window, window.base + step, 1.0)
+        for _ in range(step):
+            window.push(PAYLOAD, 1.0)
+    return (time.perf_counter() - start) / acks * 1e6
+
+# helper function to time duplicate ACKs with a SACK block growing over a full window
+def bench_sack(window, sack, size, acks):
+    for _ in range(size):
+        window.push(PAYLOAD, 0.0)
+    base = window.base
+    start = time.perf_counter()
+    for i in range(acks):
+        # Each new segment is sent, arrives and is SACKed, the hole at base stays
+        window.push(PAYLOAD, 1.0)
+        sack(window, base, base + 1, window.next_seq - (i % 2))
+    return (time.perf_counter() - start) / acks * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sender window bookkeeping per ACK')
+    parser.add_argument('--windows', type=int, nargs='+', default=[100, 1000, 10000, 50000],
+                        help='segments in flight')
+    parser.add_argument('--acks', type=int, default=2000, help='ACKs timed per window size')
+    parser.add_argument('--step', type=int, default=2, help='segments each in-order ACK covers')
+    args = parser.parse_args()
+
+    # Both give the same RTT samples and highest SACKed seq
+    legacy, window = LegacyWindow(1), SendWindow(1)
+    for _ in range(100):
+        legacy.push(PAYLOAD, 0.0)
+        window.push(PAYLOAD, 0.0)
+    assert legacy.ack(10, 1.0) == window_ack(window, 10, 1.0)
+    assert legacy.sack(10, 20, 30) == window_sack(window, 10, 20, 30)
+    assert legacy.sack(10, 25, 60) == window_sack(window, 10, 25, 60)
+    assert legacy.ack(40, 2.0) == window_ack(window, 40, 2.0)
+    assert sorted(legacy.sacked) == [s for s in range(window.base, window.next_seq) if window.is_sacked(s)]
+
+    print(f'{"window":>7} {"in order us/ack":>16} {"SendWindow":>11} {"speedup":>8} '
+          f'{"SACK us/ack":>12} {"SendWindow":>11} {"speedup":>8}')
+    for size in args.windows:
+        legacy_in_order = bench_in_order(LegacyWindow(1), LegacyWindow.ack, size, args.acks, args.step)
+        ring_in_order = bench_in_order(SendWindow(1), window_ack, size, args.acks, args.step)
+        legacy_sack = bench_sack(LegacyWindow(1), LegacyWindow.sack, size, args.acks)
+        ring_sack = bench_sack(SendWindow(1), window_sack, size, args.acks)
+        print(f'{size:>7} {legacy_in_order:>16.2f} {ring_in_order:>11.2f} {legacy_in_order / ring_in_order:>7.1f}x '
+              f'{legacy_sack:>12.2f} {ring_sack:>11.2f} {legacy_sack / ring_sack:>7.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# Internet checksum (16-bit one's complement) for the reliable-UDP packets
+#
+# The byte-pair loop in client.py/pipeline_server.py did one Python iteration
+# and one carry fold per 16-bit word. Here the whole buffer is read as one
+# big-endian integer with int.from_bytes and reduced mod 0xFFFF, which is the
+# same one's complement sum (65536 == 1 mod 0xFFFF, so every word lands in
+# the same residue) computed in C.
+#
+# Results are bit-identical to the old checksum_calc, including its two edge
+# cases: the sum of nonzero data is never 0 after folding (it is 0xFFFF
+# instead), and an odd trailing byte is padded with a zero byte.
+#
+# checksum_parts sums several buffers as if they were concatenated without
+# joining them.
+
+# Partial sum of one buffer: (residue mod 0xFFFF, any nonzero byte)
+def partial_sum(data):
+    value = int.from_bytes(data, 'big')
+    return value % 0xFFFF, value != 0
+
+# helper function to fold a partial sum into the final checksum
+def finish(total, nonzero, length):
+    if length & 1:
+        # Pad odd number of bytes with 0: shift the whole sum up one byte
+        total = (total << 8) % 0xFFFF
+    if total == 0 and nonzero:
+        # End-around carry never folds a nonzero sum down to 0
+        total = 0xFFFF
+    # One's complement
+    return ~total & 0xFFFF
+
+def checksum_calc(data) -> int:
+    # Same steps as partial_sum + finish, inlined since this runs for every packet
+    value = int.from_bytes(data, 'big')
+    total = value % 0xFFFF
+    if len(data) & 1:
+        total = (total << 8) % 0xFFFF
+    if total == 0 and value:
+        total = 0xFFFF
+    return ~total & 0xFFFF
+
+# Checksum of several buffers as if they were one, without joining them.
+# Appending n bytes multiplies the sum so far by 256**n, and 256**n mod 0xFFFF
+# is 1 for even n and 256 for odd n.
+def checksum_parts(*parts) -> int:
+    total = 0
+    nonzero = False
+    length = 0
+    for part in parts:
+        part_total, part_nonzero = partial_sum(part)
+        if len(part) & 1:
+            total <<= 8
+        total = (total + part_total) % 0xFFFF
+        nonzero = nonzero or part_nonzero
+        length += len(part)
+    return finish(total, nonzero, length)
+
+# A packet carrying checksum_calc of itself (computed with the checksum field
+# set to 0) sums to 0xFFFF including that field, so its checksum comes out 0.
+# Verifying is one pass over the packet, nothing is rebuilt.
+def verify_checksum(data) -> bool:
+    return checksum_calc(data) == 0
@@ -1,99 +1,97 @@
 from socket import *
+import argparse
+import contextlib
+import hashlib
+import logging
+import math
+import mmap
+import os
+import sys
 import time
 import random
 
+import congestion
+from batch_io import BatchSocket
+from rto import RtoEstimator
+from send_window import SendWindow
+from telemetry import LEVELS, Telemetry
+from test_data import client_data
+from packet import (ACK, DATA, FIN, HEADER_SIZE, MAX_SEGMENT_SIZE, SACK, SYN, encode_mss, encode_packet,
+                    parse_mss, parse_packet, parse_sack)
+
 HOST = '127.0.0.1'
 PORT = 8080
 
-RTO = 3.0   # timeout for retransmission in seconds
+RTO = 3.0   # initial timeout for retransmission in seconds, until RTTs are measured
 DUPE_ACK_THRESH = 3     # How many duplicate acks before retransmission
-
-# Testing
-# Set to True to simulate packet corruption
-SIMULATE_CORRUPT = True
-CORRUPTION_RATE = 0.1   # 10% of packets corrupted
-
+FIN_RETRIES = 5         # FINs sent before giving up on the receiver's ACK
+SEGMENT_SIZE = 20       # Default payload per DATA packet, main() uses the path MTU instead
+IP_UDP_HEADERS = 28     # IPv4 + UDP header bytes in front of each packet
+DEFAULT_MTU = 1500      # Path MTU when the OS can't tell
+SOCKET_BUFFER = 1 << 22 # SO_SNDBUF, a window of large segments goes out as one burst
+READ_SEGMENTS = 16      # Segments read from a stream at a time
+
+# Linux socket options the socket module doesn't export
+IP_MTU_DISCOVER = 10
+IP_PMTUDISC_DO = 2
+IP_MTU = 14
+MAX_TIME_WITHOUT_PROGRESS = 30.0    # Give up if send_base doesn't move for this long
+
+# Testing (corruption, delay, reordering and the rest are simulated by impairment.py)
+# Set to True to simulate lost ACKs
+SIMULATE_LOSS = False
+LOSS_RATE = 0.1         # 10% of ACKs dropped
+
+log = Telemetry('client')   # Logging, counters and histograms, main() sets it up from the command line
 
 class SenderState:
     CLOSED = 0
     SYN_SENT = 1
     CONNECTED = False
+    conn_id = 0     # Picked at SYN, the receiver tells connections apart by (addr, conn_id)
+    segment_size = SEGMENT_SIZE     # Agreed with the receiver at SYN
 
 # helper function to make custom packet
-def make_packet(seq, ack, rwnd, flags, payload: bytes) -> bytes:
-    # Create header with placeholder checksum = 0
-    header = f"{seq}|{ack}|{rwnd}|{flags}|0|".encode()
-    temp_packet = header + payload
-
-    # Calculate checksum
-    checksum = checksum_calc(temp_packet)
-
-    # Rebuild header with actual checksum
-    header = f"{seq}|{ack}|{rwnd}|{flags}|{checksum}|".encode()
-    final_packet = header + payload
-
-    # Testing checksum functionality by intentionally corrupting packets
-    if SIMULATE_CORRUPT and random.random() < CORRUPTION_RATE:
-        print("[CORRUPT] Simulating packet corruption...")
-
-        # Flip a random bit in payload
-        if len(payload) > 0:
-            header_len = len(header)
-            corrupt_pos = random.randint(header_len, len(final_packet) - 1)
-            packet_list = bytearray(final_packet)
-            packet_list[corrupt_pos] ^= 0xFF    # Flip all bits in one byte
-            final_packet = bytes(packet_list)
-
-    return final_packet
-
-def parse_packet(packet: bytes) -> dict:
-    # Parse packet and verify checksum
-    parts = packet.split(b'|', 5)
-
-    if len(parts) < 5:
-        raise ValueError("Malformed packet: not enough fields")
-    
-    try: 
-        seq = int(parts[0])
-        ack = int(parts[1])
-        rwnd = int(parts[2])
-        flags = parts[3].decode()
-        checksum = int(parts[4])
-        payload = parts[5] if len(parts) > 5 else b''
-    except (ValueError, IndexError) as e:
-        raise ValueError(f"Malformed packet: {e}")
-    
-    # Verify checksum
-    if not verify_checksum(packet, checksum):
-        raise ValueError("[ERROR] Checksum verification failed")
-    
-    return {
-        'seq': seq,
-        'ack': ack,
-        'rwnd': rwnd,
-        'flags': flags,
-        'checksum': checksum,
-        'payload': payload
-    }
-
-def perform_handshake(client, server_addr):
+def make_packet(seq, ack, rwnd, flags, payload: bytes) -> bytearray:
+    return encode_packet(seq, ack, rwnd, flags, payload, SenderState.conn_id)
+
+# helper function to find the largest payload that fits in the path MTU to addr (Linux),
+# DEFAULT_MTU elsewhere
+def path_segment_size(addr):
+    mtu = DEFAULT_MTU
+    if sys.platform.startswith('linux'):
+        probe = socket(AF_INET, SOCK_DGRAM)
+        try:
+            # Don't fragment, so the kernel reports the path MTU rather than fragmenting to fit
+            probe.setsockopt(IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+            probe.connect(addr)
+            mtu = probe.getsockopt(IPPROTO_IP, IP_MTU)
+        except OSError:
+            pass
+        finally:
+            probe.close()
+    return max(1, min(mtu - IP_UDP_HEADERS - HEADER_SIZE, MAX_SEGMENT_SIZE))
+
+def perform_handshake(client, server_addr, segment_size=SEGMENT_SIZE):
     """
     Perform a three-way handshake with the server.
-    1) SYN
-    2) SYN-ACK
+    1) SYN, announcing segment_size
+    2) SYN-ACK, with the segment size the receiver accepts
     3) ACK
+    The agreed size is kept in SenderState.segment_size.
     """
-    print("Performing three-way handshake...")
+    log.info("Performing three-way handshake...")
     client.settimeout(2.0)  # Longer timeout for handshake
     
     # Step 1: Send SYN
+    SenderState.conn_id = random.getrandbits(32)
     syn_seq = 0
     syn_packet = make_packet(
         seq=syn_seq,
         ack=0,
         rwnd=32,
-        flags="SYN",
-        payload=b""
+        flags=SYN,
+        payload=encode_mss(segment_size)
     )
     client.sendto(syn_packet, server_addr)
 
@@ -103,331 +101,502 @@ def perform_handshake(client, server_addr):
         try:
             data, addr = client.recvfrom(2048)
             pkt = parse_packet(data)
-            print("Received packet:", pkt)
-            if pkt['flags'] == "SYN-ACK":
-                print("Received SYN-ACK from server.")
+            log.debug("Received packet: %s", pkt)
+            if pkt.flags == SYN | ACK and pkt.conn_id == SenderState.conn_id:
+                log.info("Received SYN-ACK from server.")
                 break
         except ValueError as e:
-            print(f"[ERROR] Checksum error during handshake: {e}")
+            log.warning("[ERROR] Checksum error during handshake: %s", e)
             continue
         except timeout:
-            print("Timeout waiting for SYN-ACK, retrying...")
+            log.info("Timeout waiting for SYN-ACK, retrying...")
             client.sendto(syn_packet, server_addr)
             continue
+
+    # The receiver may accept less than was announced, a SYN-ACK without a size accepts it as is
+    SenderState.segment_size = min(segment_size, parse_mss(pkt.payload) or segment_size)
+    log.info("Segment size: %d bytes", SenderState.segment_size)
         
     # Step 3: Send ACK
     ack_packet = make_packet(
         seq=syn_seq + 1,
-        ack=pkt['seq'] + 1,
+        ack=pkt.seq + 1,
         rwnd=32,
-        flags="ACK",
+        flags=ACK,
         payload=b""
     )
-    print("Sending ACK to server...", ack_packet)
+    log.debug("Sending ACK to server... %s", ack_packet)
 
     client.sendto(ack_packet, server_addr)
 
     # connection established, ++seq number for next data packet
-    print("Sent ACK to server.")
-    print("Three-way handshake completed. Connection established.")
+    log.debug("Sent ACK to server.")
+    log.info("Three-way handshake completed. Connection established.")
     SenderState.CONNECTED = True
     
     # return the next sequence number
     return syn_seq + 1
 
-def checksum_calc(data: bytes) -> int:
-     # Caculate simple checksum by summing all bytes
-     checksum = 0
-
-     # Process bytes into pairs
-     for i in range(0, len(data), 2):
-          if i + 1 < len(data):
-               # Combine 2 bytes into 16bit word
-               word = (data[i] << 8) + data[i + 1]
-          else:
-               # Pad odd number of bytes with 0
-               word = data[i] << 8
-          
-          checksum += word
-
-          # Carry around addition
-          checksum = (checksum & 0xFFFF) + (checksum >> 16)
-
-     # One's complement
-     checksum = ~checksum & 0xFFFF
-
-     return checksum
-
-def verify_checksum(data: bytes, expected_checksum: int) -> bool:
-     # Verify packet checksum by recreating packet with checksum = 0
-     # calculating checksum and comparing
-     parts = data.split(b'|', 5)
-     if len(parts) < 5:
-          return False
-     
-     # Rebuild packet w/ checksum = 0
-     no_checksum_header = b'|'.join(parts[:4]) + b'|0|'
-     if len(parts) > 5:
-          no_checksum_pkt = no_checksum_header + parts[5]
-     else:
-          no_checksum_pkt = no_checksum_header
-
-     # Calculate checksum
-     calculated_checksum = checksum_calc(no_checksum_pkt)
-
-     # Compare and return
-     return calculated_checksum == expected_checksum
-
-def main():
-    # Client is used to send a packet to the server and receive a response
-    client = socket(AF_INET, SOCK_DGRAM)
-    client.settimeout(0.2)
-
-    server_addr = (HOST, PORT)
-
-    # First, perform three-way handshake to establish connection
+# helper function to cut data into segments as they're needed: memoryview slices of a bytes-like
+# object, or of each chunk an iterable of chunks yields. Each segment is added to digest on the way
+def iter_segments(data, segment_size, digest):
     try:
-        next_seq = perform_handshake(client, server_addr)
-    except Exception as e:
-        print(f"Handshake failed: {e}")
-        return
-    
-    # then simulate sending multiple packets with payload in accordance to rwnd/cwnd
-    if SenderState.CONNECTED == False:
-        print("Handshake failed, cannot send data.")
+        chunks = (memoryview(data),)
+    except TypeError:
+        chunks = data   # a stream, see open_source
+    for chunk in chunks:
+        view = memoryview(chunk).cast('B')
+        for start in range(0, len(view), segment_size):
+            segment = view[start:start + segment_size]
+            digest.update(segment)
+            yield segment
+
+@contextlib.contextmanager
+def open_source(path, segment_size=SEGMENT_SIZE):
+    """
+    Data for send_data from path: the file mapped into memory, so segments are
+    views of its pages, or for "-" stdin read READ_SEGMENTS segments at a time.
+    """
+    if path == "-":
+        yield iter(lambda: sys.stdin.buffer.read(segment_size * READ_SEGMENTS), b"")
         return
-
-    # Once connection is established, send data packets
-    app_data = b"""_4&@=EFyR=R,?Q:3q&ir7rV22$7yE(
-                #uFJ]H*Kjk57*21K=CAQ/t6)S?Ff4L
-                JrU}E/md[(,Aq6d/DhQD3/3{3XRa]r
-                """ * 20
-    MAX_PAYLOAD_SIZE = 20  # max payload size per packet
-
-    segments = [
-        app_data[i:i + MAX_PAYLOAD_SIZE]
-        for i in range(0, len(app_data), MAX_PAYLOAD_SIZE)
-    ]
-    print("Data to send segmented into packets:", len(segments))
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""   # an empty file can't be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+def send_data(client, server_addr, app_data, next_seq, mode="gbn", rto=RTO, cc="reno", trace=None,
+              segment_size=None):
+    """
+    Send app_data over an established connection and wait until all of it is ACKed.
+    app_data is a bytes-like object (e.g. a mapped file) or an iterable of bytes chunks (a stream),
+    either is only read as the window allows.
+    Each DATA packet carries up to segment_size bytes, by default the size agreed at the handshake.
+    mode "gbn" resends every unACKed packet on timeout (Go-Back-N),
+    mode "sr" resends only the packets the receiver has not SACKed (selective repeat).
+    rto is the initial retransmission timeout, later ones come from measured RTTs.
+    cc names the congestion control (see congestion.py), trace is an optional congestion.CwndTrace.
+    Returns a dict of stats.
+    """
+    start_time = time.time()
+    io = BatchSocket(client)
+    rtt = RtoEstimator(initial_rto=rto)
+    segment_size = segment_size or SenderState.segment_size
+
+    # Segments are memoryview slices of app_data, cut when they are first sent, nothing is copied up front.
+    # One segment is cut ahead, so the end of the data is known as soon as the last one is sent
+    digest = hashlib.sha256()
+    segments = iter_segments(app_data, segment_size, digest)
+    payload = next(segments, None)
+    bytes_sent = 0
+    log.info("Data to send segmented into packets of up to %d bytes", segment_size)
 
     # Sliding window variables
     send_base = next_seq    # First unAcked Packet
     next_seq_num = next_seq # next packet that can be sent
-    total_segments = len(segments)
-    final_seq = next_seq + total_segments
+    final_seq = next_seq if payload is None else math.inf  # known once the last segment is cut
 
-    cwnd = 1
+    cc = congestion.create(cc, trace)
     rwnd = 32
-    sent_times = {}     # To track send time
-    buffered = {}       # seq -> payload
+    window = SendWindow(send_base)  # unACKed segments with their send times and retransmit counts
+    rto_deadline = None     # one retransmission timer for the oldest unACKed segment, None when nothing is in flight
     dupe_ack_count = 0
     last_ack = send_base
 
-    print(f"Total segments to send: {total_segments} (seq will range from {send_base} to {final_seq - 1})")
+    log.debug("First seq to send: %d", send_base)
 
-    i = 0   # index for next unsent segment
-    iterations_without_progress = 0
-    MAX_ITER_WITHOUT_PROGRESS = 50
+    last_progress = time.time()
+    last_ack_time = time.time()
 
     # Stats
     pkts_sent = 0
     pkts_retransmitted = 0
     corrupted_acks = 0
     acks_received = 0
+    timeouts = 0
+
+    # helper function to resend one unACKed segment
+    def retransmit(seq):
+        nonlocal pkts_retransmitted
+        segment = window[seq]
+        pkt = make_packet(
+            seq = seq,
+            ack = 0,
+            rwnd = rwnd,
+            flags = DATA,
+            payload = segment.payload
+        )
+        io.sendto(pkt, server_addr)
+        segment.sent_time = time.time()
+        segment.retransmits += 1    # no RTT samples from it anymore (Karn's rule)
+        pkts_retransmitted += 1
+        log.debug("[RETRANSMIT] Retransmitted seq = %d", seq)
 
     # Loop until all ACKs have been received for all segments
     while send_base < final_seq:
-        # print(f"============================ DATA PACKET {send_base } of {total_segments} ============================")
-        print("\n" + "="*70)
-        print(f"LOOP: send_base={send_base}, next_seq_num={next_seq_num}, cwnd={cwnd}, rwnd={rwnd}")
-        print(f"Buffered packets: {list(buffered.keys())}")
-        print("="*70)
+        log.debug("LOOP: send_base=%d, next_seq_num=%d, cwnd=%.2f, ssthresh=%.2f, rwnd=%d, rto=%.3f, in flight: %d",
+                  send_base, next_seq_num, cc.cwnd, cc.ssthresh, rwnd, rtt.rto, len(window))
 
         # Check if done
         if send_base >= final_seq:
-            print("[INFO] All packets ACKed! Exiting...")
+            log.info("[INFO] All packets ACKed! Exiting...")
             break
         
         # Track progress
         old_send_base = send_base
         
         # Send up to min(cwnd, rwnd) 
-        effective_window = min(cwnd, rwnd)
+        effective_window = min(cc.window, rwnd)
         window_limit = send_base + effective_window
 
-        print(f"[WINDOW] Effective window = min(cwnd={cwnd}, rwnd={rwnd}) = {effective_window}")
-        print(f"[WINDOW] Can send up to seq {window_limit - 1}")
+        log.debug("[WINDOW] Effective window = min(cwnd=%d, rwnd=%d) = %d", cc.window, rwnd, effective_window)
+        log.debug("[WINDOW] Can send up to seq %d", window_limit - 1)
+
+        # Zero window probe: the receiver's window update can be lost, so once an RTO passes
+        # with nothing in flight, send one packet anyway to get a fresh rwnd back
+        if effective_window == 0 and not window and time.time() - last_ack_time > rtt.rto:
+            log.info("[FLOW CONTROL] rwnd = 0 for a full RTO, sending a window probe")
+            log.count('window_probes')
+            window_limit = send_base + 1
+            last_ack_time = time.time()
 
         # Send packets within window limit
         pkts_sent_this_round = 0
-        while i < total_segments and next_seq_num < window_limit:
+        now = time.time()
+        while payload is not None and next_seq_num < window_limit:
             
-            payload = segments[i]
             pkt = make_packet(
                 seq = next_seq_num,
                 ack = 0,
                 rwnd = rwnd,
-                flags = "DATA",
+                flags = DATA,
                 payload = payload
             )
 
-            client.sendto(pkt, server_addr)
+            io.queue(pkt, server_addr)
             pkts_sent += 1
-            print(f"[SEND] Sent DATA seq = {next_seq_num}")
+            log.debug("[SEND] Sent DATA seq = %d", next_seq_num)
 
-            buffered[next_seq_num] = payload
-            sent_times[next_seq_num] = time.time()
+            window.push(payload, now)
+            bytes_sent += len(payload)
+            if rto_deadline is None:
+                rto_deadline = now + rtt.rto
             
             # Move to next item
             next_seq_num += 1
-            i += 1
             pkts_sent_this_round += 1
-
-        if pkts_sent_this_round == 0:
-            if effective_window == 0:
-                print("[FLOW CONTROL] Effective Window is 0, waiting for receiver to process data...")
-            elif i >= total_segments:
-                print("[INFO] All packets sent, waiting for final ACKs...")
-            else:
-                print("[INFO] No packets to send (all data sent, waiting for ACKs)")
+            payload = next(segments, None)
+            if payload is None:
+                final_seq = next_seq_num
+                log.info("Total segments to send: %d (seq range from %d to %d)", final_seq - next_seq, next_seq, final_seq - 1)
+
+        # Send the new packets as one burst
+        io.flush()
+
+        if pkts_sent_this_round:
+            log.observe('burst', pkts_sent_this_round)
+        elif effective_window == 0:
+            log.debug("[FLOW CONTROL] Effective Window is 0, waiting for receiver to process data...")
+        elif payload is None:
+            log.debug("[INFO] All packets sent, waiting for final ACKs...")
+        else:
+            log.debug("[INFO] No packets to send (all data sent, waiting for ACKs)")
         
         # Handle Timeouts
-        if send_base in sent_times:
-            if time.time() - sent_times[send_base] > RTO:
-                print(f"[TIMEOUT] Timeout for send_base={send_base}. Retransmitting all unACKed packets...")
-
-                # Multiplicative Decrease  (AIMD)
-                cwnd = max(1, cwnd // 2)
-                print(f"[AIMD] cwnd decreased to {cwnd}")
-
-                # Retransmit all segment from send base to next_seq_num - 1
-                for seq in range(send_base, next_seq_num):
-                    if seq in buffered:
-                        pkt = make_packet(
-                            seq = seq,
-                            ack = 0,
-                            rwnd = rwnd,
-                            flags = "DATA",
-                            payload = buffered[seq]
-                        )
-                        client.sendto(pkt, server_addr)
-                        sent_times[seq] = time.time()   # reset timers for each packet
-                        pkts_retransmitted += 1
-                        print(f"[RETRANSMIT] Retransmitted seq = {seq}")
+        if rto_deadline is not None:
+            if time.time() >= rto_deadline:
+                # Back to slow start
+                cc.on_timeout(time.time())
+                timeouts += 1
+                log.observe('cwnd', cc.cwnd)
+
+                if mode == "sr":
+                    log.info("[TIMEOUT] Timeout for send_base=%d. Retransmitting timed out packets not SACKed...", send_base)
+                    log.info("[CC] cwnd decreased to %.2f, ssthresh=%.2f", cc.cwnd, cc.ssthresh)
+
+                    # Retransmit only the segments whose own timer expired and that the receiver doesn't hold
+                    now = time.time()
+                    for seq, segment in list(window.items()):
+                        if now - segment.sent_time >= rtt.rto and not window.is_sacked(seq):
+                            retransmit(seq)
+                else:
+                    log.info("[TIMEOUT] Timeout for send_base=%d. Retransmitting all unACKed packets...", send_base)
+                    log.info("[CC] cwnd decreased to %.2f, ssthresh=%.2f", cc.cwnd, cc.ssthresh)
+
+                    # Retransmit all segment from send base to next_seq_num - 1
+                    for seq in range(send_base, next_seq_num):
+                        retransmit(seq)
+
+                # Exponential backoff until a new RTT sample arrives
+                rtt.backoff()
+                rto_deadline = time.time() + rtt.rto
+                log.info("[RTO] Backed off to %.3fs", rtt.rto)
 
                 dupe_ack_count = 0  # Reset dupe ACK count after time out
                 continue
        
-        # Receiving ACKs
+        # Receiving ACKs, waiting no longer than until the retransmission timer fires
+        if rto_deadline is not None:
+            wait = max(0.001, rto_deadline - time.time())
+        else:
+            wait = rtt.rto
         try:
-            data, addr = client.recvfrom(2048)
+            # ACKs already queued are read together, later calls return them without a syscall
+            data, addr = io.recvfrom(wait)
+
+            # Testing retransmission by intentionally dropping ACKs
+            if SIMULATE_LOSS and random.random() < LOSS_RATE:
+                log.debug("[LOSS] Simulating lost ACK...")
+                continue
             
             try:
                 received = parse_packet(data)
                 acks_received += 1
             except ValueError as e:
-                print(f"[ERROR] {e} - ignoring corrupted ACK")
+                log.debug("[ERROR] %s - ignoring corrupted ACK", e)
                 corrupted_acks += 1
                 continue 
             
         except timeout:
             # No ACK received, continue loop
             # Dont force new packets when receiver buffer is full
-            if rwnd == 0 and len(buffered) > 0:
-                print("[FLOW CONTROL] rwnd = 0, waiting for receiver to process...")
+            if rwnd == 0 and window:
+                log.debug("[FLOW CONTROL] rwnd = 0, waiting for receiver to process...")
             continue
 
         if received:
-            print(f"[RECV] Received packet: {received}")
-            rwnd = max(0, received['rwnd'])     # update rwnd
-            print(f"[FLOW CONTROL] Updated rwnd = {rwnd}")
+            log.debug("[RECV] Received packet: %s", received)
+            last_ack_time = time.time()
+            rwnd = max(0, received.rwnd)     # update rwnd
+            log.debug("[FLOW CONTROL] Updated rwnd = %d", rwnd)
+            log.observe('rwnd', rwnd)
+            log.observe('in_flight', len(window))
 
             # Handle cumulative ACK
-            if received['flags'] == "ACK":
-                ack_num = received['ack']
+            if received.flags in (ACK, ACK | SACK):
+                ack_num = received.ack
+
+                # Remember which packets above the cumulative ACK the receiver already holds
+                if mode == "sr" and received.flags & SACK:
+                    for block_start, block_end in parse_sack(received.payload):
+                        window.sack(block_start, block_end)
 
                 # If ACK acknowledges new data
                 if ack_num > send_base:
-                    print(f"[ACK] New ACK {ack_num} (was send_base={send_base})")
-
-                    # remove buffered segments that are acked
-                    remove_seqs = [s for s in buffered.keys() if s < ack_num]
-                    for s in remove_seqs:
-                        buffered.pop(s, None)
-                        sent_times.pop(s, None)
-                    print(f"[ACK] Removed {len(remove_seqs)} ACKed packets from buffer")
+                    log.debug("[ACK] New ACK %d (was send_base=%d)", ack_num, send_base)
+
+                    # remove the segments that are acked
+                    acked = window.ack(ack_num)
+                    log.debug("[ACK] Removed %d ACKed packets from the window", len(acked))
+
+                    # RTT sample from the newest segment this ACK covers, if that segment was sent once (Karn's
+                    # rule): the ACK left the receiver when it arrived. Go-Back-N resends everything in flight
+                    # on a timeout, so older retransmitted segments can't be allowed to block the sample
+                    if acked[-1].retransmits == 0:
+                        rtt.sample(time.time() - acked[-1].sent_time)
+                        log.debug("[RTT] sample=%.2fms srtt=%.2fms rto=%.3fs", rtt.last_rtt * 1000, rtt.srtt * 1000, rtt.rto)
+                        log.observe('rtt', rtt.last_rtt)
+                    else:
+                        # New data got through, so the path delivers again: drop the backoff
+                        rtt.reset_backoff()
+
+                    # The timer now runs for the new oldest segment, from when it was last sent
+                    rto_deadline = window[ack_num].sent_time + rtt.rto if ack_num in window else None
+
+                    # Grow the window (slow start / congestion avoidance) or leave fast recovery
+                    cc.on_ack(ack_num - send_base, ack_num, time.time(), rtt.srtt)
+                    log.debug("[CC] cwnd = %.2f, ssthresh=%.2f", cc.cwnd, cc.ssthresh)
+                    log.observe('cwnd', cc.cwnd)
 
                     # slide window
                     send_base = ack_num
                     dupe_ack_count = 0
                     last_ack = ack_num
 
-                    # Additive Increase (AIMD)
-                    cwnd += 1
-                    print(f"[AIMD] cwnd increased to {cwnd}")
-
                     # Check if done after ACK
                     if send_base >= final_seq:
-                        print(f"[SUCCESS] send_base({send_base}) reached final_seq ({final_seq})")
+                        log.info("[SUCCESS] send_base(%d) reached final_seq (%d)", send_base, final_seq)
                         break
                     
                 # Handling dupe ACKs
                 elif ack_num == last_ack:
                     dupe_ack_count += 1
-                    print(f"[ACK] Duplicate ACK #{dupe_ack_count} for {ack_num}")
+                    log.debug("[ACK] Duplicate ACK #%d for %d", dupe_ack_count, ack_num)
+                    log.count('dupe_acks')
+                    cc.on_dupack(time.time())
                     
                     if dupe_ack_count >= DUPE_ACK_THRESH:
-                        print(f"\n[FAST RETRANSMIT] {DUPE_ACK_THRESH} duplicate ACKs detected: retransmitting send_base = {send_base}")
-
-                        # Multiplicative Decrease (AIMD)
-                        cwnd = max(1, cwnd // 2)
-                        print(f"[AIMD] cwnd decreased to {cwnd}")
+                        log.info("[FAST RETRANSMIT] %d duplicate ACKs detected: retransmitting send_base = %d", DUPE_ACK_THRESH, send_base)
+                        log.count('fast_retransmits')
+
+                        # Enter fast recovery, the window is cut once until everything sent so far is ACKed
+                        cc.on_loss(time.time(), next_seq_num)
+                        log.info("[CC] cwnd = %.2f, ssthresh=%.2f", cc.cwnd, cc.ssthresh)
+                        log.observe('cwnd', cc.cwnd)
+
+                        highest_sacked = window.highest_sacked() if mode == "sr" else None
+                        if highest_sacked is not None:
+                            # Retransmit the holes below the highest SACKed packet that were last sent
+                            # before it, a packet sent after them got through so they were lost
+                            newest_sent = window[highest_sacked].sent_time
+                            for seq, segment in list(window.items(end=highest_sacked)):
+                                if segment.sent_time <= newest_sent and not window.is_sacked(seq):
+                                    retransmit(seq)
 
                         # Retransmit base segment
-                        if send_base in buffered:
-                            pkt = make_packet(
-                                seq = send_base,
-                                ack = 0,
-                                rwnd = rwnd,
-                                flags = "DATA",
-                                payload = buffered[send_base]
-                            )
-                            client.sendto(pkt, server_addr)
-                            sent_times[send_base] = time.time()     # Reset time for send_base segment
-                            pkts_retransmitted += 1
-                            print(f"[RETRANSMIT] Retransmitted seq = {send_base}")
+                        elif send_base in window:
+                            retransmit(send_base)
+                        rto_deadline = window[send_base].sent_time + rtt.rto if send_base in window else None
 
                         dupe_ack_count = 0  # Reset dupe ACK count
 
         # Checking progress
-        if send_base == old_send_base:
-            iterations_without_progress += 1
-            if iterations_without_progress >= MAX_ITER_WITHOUT_PROGRESS:
-                print("[ERROR] No progress for 50 iterations")
-                print(f"[ERROR] send_base={send_base}, buffered packets={list(buffered.keys())}")
-                print(f"[ERROR] rwnd={rwnd}, cwnd={cwnd}")
-                print("[ERROR] Possible deadlock, exiting...")
-                break
-        else:
-            iterations_without_progress = 0
+        if send_base != old_send_base:
+            last_progress = time.time()
+        elif time.time() - last_progress > MAX_TIME_WITHOUT_PROGRESS:
+            log.error("[ERROR] No progress for %s seconds", MAX_TIME_WITHOUT_PROGRESS)
+            log.error("[ERROR] send_base=%d, %d packets in flight", send_base, len(window))
+            log.error("[ERROR] rwnd=%d, cwnd=%.2f", rwnd, cc.cwnd)
+            log.error("[ERROR] Possible deadlock, exiting...")
+            break
+
+    io.close()
+    return {
+        'success': send_base >= final_seq,
+        'expected_send_base': final_seq,
+        'send_base': send_base,
+        'bytes': bytes_sent,
+        'sha256': digest.hexdigest(),
+        'segment_size': segment_size,
+        'elapsed': time.time() - start_time,
+        'pkts_sent': pkts_sent,
+        'pkts_retransmitted': pkts_retransmitted,
+        'corrupted_acks': corrupted_acks,
+        'acks_received': acks_received,
+        'timeouts': timeouts,
+        'cc': cc.name,
+        'cwnd': cc.cwnd,
+        'ssthresh': cc.ssthresh,
+        **rtt.stats(),
+    }
+
+def close_connection(client, server_addr, seq, rto=RTO):
+    """
+    Send FIN with the next seq once all data is ACKed, so the receiver knows the
+    stream is complete, and resend it until it is ACKed.
+    Returns whether the FIN was ACKed.
+    """
+    fin_packet = encode_packet(seq, 0, 32, FIN, b"", SenderState.conn_id)
+    client.settimeout(rto)
+    for _ in range(FIN_RETRIES):
+        client.sendto(fin_packet, server_addr)
+        try:
+            while True:
+                data, addr = client.recvfrom(2048)
+                try:
+                    pkt = parse_packet(data)
+                except ValueError:
+                    continue
+                if pkt.flags & ACK and pkt.conn_id == SenderState.conn_id and pkt.ack > seq:
+                    log.info("FIN ACKed, connection closed.")
+                    return True
+        except timeout:
+            log.info("Timeout waiting for the FIN's ACK, retrying...")
+    return False
+
+def main():
+    global SIMULATE_LOSS, LOSS_RATE, log
+
+    parser = argparse.ArgumentParser(description='Reliable UDP sender')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--mode', choices=['gbn', 'sr'], default='gbn',
+                        help='gbn: Go-Back-N, sr: selective repeat with SACK (default: %(default)s)')
+    parser.add_argument('--rto', type=float, default=RTO,
+                        help='initial retransmission timeout in seconds, before RTTs are measured')
+    parser.add_argument('--cc', choices=list(congestion.CONTROLLERS), default='reno',
+                        help='congestion control (default: %(default)s)')
+    parser.add_argument('--cwnd-trace', metavar='CSV', help='write every cwnd change to this CSV file')
+    parser.add_argument('--repeat', type=int, default=20, help='times to repeat the test data')
+    parser.add_argument('--file', metavar='PATH', help='send this file instead of the test data, - for stdin')
+    parser.add_argument('--loss-rate', type=float, default=LOSS_RATE if SIMULATE_LOSS else 0.0,
+                        help='fraction of received ACKs to drop')
+    parser.add_argument('--segment-size', type=int, default=0,
+                        help='payload bytes per DATA packet, 0 to fit the path MTU (default)')
+    parser.add_argument('--log-level', choices=list(LEVELS), default='info',
+                        help='debug logs every packet (default: %(default)s)')
+    parser.add_argument('--histograms', action='store_true',
+                        help='keep histograms of RTT, cwnd, rwnd, packets in flight and burst sizes, and log them at exit')
+    parser.add_argument('--trace', metavar='CSV',
+                        help='write RTT, cwnd, rwnd, packets in flight and burst sizes over time to this CSV file')
+    parser.add_argument('--trace-sample', type=int, default=1, metavar='N',
+                        help='keep every Nth value of each series in the trace (default: %(default)s)')
+    args = parser.parse_args()
+
+    SIMULATE_LOSS, LOSS_RATE = args.loss_rate > 0, args.loss_rate
+    logging.basicConfig(level=LEVELS[args.log_level], format='%(message)s', stream=sys.stdout)
+    log = Telemetry('client', histograms=args.histograms, trace=bool(args.trace), sample_every=args.trace_sample)
+
+    # Client is used to send a packet to the server and receive a response
+    client = socket(AF_INET, SOCK_DGRAM)
+    client.setsockopt(SOL_SOCKET, SO_SNDBUF, SOCKET_BUFFER)
+    client.settimeout(0.2)
+
+    server_addr = (args.host, args.port)
+    segment_size = args.segment_size or path_segment_size(server_addr)
+
+    # First, perform three-way handshake to establish connection
+    try:
+        next_seq = perform_handshake(client, server_addr, segment_size)
+    except Exception as e:
+        log.error("Handshake failed: %s", e)
+        return
+    
+    # then simulate sending multiple packets with payload in accordance to rwnd/cwnd
+    if SenderState.CONNECTED == False:
+        log.error("Handshake failed, cannot send data.")
+        return
+
+    # Once connection is established, send data packets: the file, or the test data
+    test_data = client_data(args.repeat)
+    source = open_source(args.file, SenderState.segment_size) if args.file else contextlib.nullcontext(test_data)
+
+    trace = congestion.CwndTrace() if args.cwnd_trace else None
+    with source as app_data:
+        stats = send_data(client, server_addr, app_data, next_seq, args.mode, args.rto, args.cc, trace)
+    if trace is not None:
+        trace.write_csv(args.cwnd_trace)
 
     # Final Stats
-    if send_base >= final_seq:
-        print("\n" + "="*70)
-        print("[SUCCESS] All data packets send and ACKed")
-        print("="*70)
+    if stats['success']:
+        close_connection(client, server_addr, stats['send_base'], stats['rto'])
+        log.info("\n" + "="*70)
+        log.info("[SUCCESS] All data packets send and ACKed")
+        log.info("="*70)
     else:
-        print("\n" + "="*70)
-        print("[ERROR] Not all packets ACKed")
-        print(f"Expected final send_base: {next_seq + total_segments} Actual send_base: {send_base}")
-        print("="*70)
-
-    print(f"\n[STATS]")
-    print(f"    Packets sent: {pkts_sent}")
-    print(f"    Packets retransmitted: {pkts_retransmitted}")
-    print(f"    Corrupted ACKs detected: {corrupted_acks}")
-    print(f"    ACKs received: {acks_received}")
-    print("="*70)
+        log.error("\n" + "="*70)
+        log.error("[ERROR] Not all packets ACKed")
+        log.error("Expected final send_base: %d Actual send_base: %d", stats['expected_send_base'], stats['send_base'])
+        log.error("="*70)
+
+    log.info("\n[STATS]")
+    log.info("    Mode: %s, congestion control: %s (final cwnd=%.2f, ssthresh=%.2f)", args.mode, stats['cc'], stats['cwnd'], stats['ssthresh'])
+    log.info("    Bytes: %d in %.3fs (%.2f KB/s)", stats['bytes'], stats['elapsed'], stats['bytes'] / stats['elapsed'] / 1e3)
+    log.info("    SHA-256: %s", stats['sha256'])
+    log.info("    Packets sent: %d of up to %d bytes", stats['pkts_sent'], stats['segment_size'])
+    log.info("    Packets retransmitted: %d", stats['pkts_retransmitted'])
+    log.info("    Corrupted ACKs detected: %d", stats['corrupted_acks'])
+    log.info("    ACKs received: %d", stats['acks_received'])
+    log.info("    Timeouts: %d", stats['timeouts'])
+    if stats['srtt'] is not None:
+        log.info("    RTT: srtt=%.2fms rttvar=%.2fms (%d samples), final rto=%.3fs",
+                 stats['srtt'] * 1000, stats['rttvar'] * 1000, stats['rtt_samples'], stats['rto'])
+    log.info("="*70)
+    log.report()
+    if args.trace:
+        log.write_csv(args.trace)
 
 
     # seg_index = 0
@@ -0,0 +1,219 @@
+# Congestion control for the reliable-UDP sender
+#
+# client.py drives a controller through four events and sends up to
+# min(controller.window, rwnd) packets past send_base:
+#
+#   on_ack(acked, ack_num, now, srtt)   new cumulative ACK covering `acked` packets
+#   on_dupack(now)                      duplicate ACK
+#   on_loss(now, recover)               fast retransmit, `recover` is the next unsent seq
+#   on_timeout(now)                     retransmission timeout
+#
+# Windows are in packets. Controllers:
+#
+#   aimd    the sender's original logic: +1 per new ACK, halve on any loss
+#   reno    slow start, congestion avoidance (+1 per RTT), fast recovery with
+#           NewReno partial ACKs: recovery lasts until everything sent before the
+#           loss is ACKed, and the window is cut only once per loss event
+#   cubic   Reno's slow start and recovery, with the window in congestion
+#           avoidance following W(t) = C (t - K)^3 + W_max (RFC 8312)
+#
+# A CwndTrace attached to a controller records every window change, so runs can
+# be compared on ramp-up time and steady-state window, or written to CSV.
+import csv
+
+INITIAL_CWND = 1
+INITIAL_SSTHRESH = 64       # packets, slow start exits here if no loss comes first
+MIN_SSTHRESH = 2
+DUPE_ACK_THRESH = 3         # Duplicate ACKs that triggered the fast retransmit
+
+class CwndTrace:
+    def __init__(self):
+        self.start = None
+        self.samples = []   # (seconds since first sample, cwnd, ssthresh, event)
+
+    def record(self, now, cwnd, ssthresh, event):
+        if self.start is None:
+            self.start = now
+        self.samples.append((now - self.start, cwnd, ssthresh, event))
+
+    # Seconds until cwnd first reached `target` packets, None if it never did
+    def ramp_up_time(self, target):
+        for elapsed, cwnd, _, _ in self.samples:
+            if cwnd >= target:
+                return elapsed
+        return None
+
+    # Time-weighted mean cwnd from `since` seconds to the end of the trace
+    def mean_cwnd(self, since=0.0):
+        total = 0.0
+        weighted = 0.0
+        for (elapsed, cwnd, _, _), (next_elapsed, _, _, _) in zip(self.samples, self.samples[1:]):
+            if next_elapsed <= since:
+                continue
+            span = next_elapsed - max(elapsed, since)
+            weighted += cwnd * span
+            total += span
+        if total == 0:
+            return self.samples[-1][1] if self.samples else 0.0
+        return weighted / total
+
+    def count(self, event):
+        return sum(1 for sample in self.samples if sample[3] == event)
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'cwnd', 'ssthresh', 'event'])
+            for elapsed, cwnd, ssthresh, event in self.samples:
+                writer.writerow([f'{elapsed:.6f}', f'{cwnd:.3f}', f'{ssthresh:.3f}', event])
+
+class CongestionControl:
+    name = 'base'
+
+    def __init__(self, trace=None, initial_cwnd=INITIAL_CWND, ssthresh=INITIAL_SSTHRESH):
+        self.cwnd = float(initial_cwnd)
+        self.ssthresh = float(ssthresh)
+        self.in_recovery = False
+        self.recover = 0
+        self.trace = trace
+
+    # Packets that may be in flight
+    @property
+    def window(self):
+        return max(1, int(self.cwnd))
+
+    def record(self, now, event):
+        if self.trace is not None:
+            self.trace.record(now, self.cwnd, self.ssthresh, event)
+
+    def on_ack(self, acked, ack_num, now, srtt):
+        if self.in_recovery:
+            if ack_num >= self.recover:
+                # Everything sent before the loss is ACKed, deflate to ssthresh
+                self.in_recovery = False
+                self.cwnd = self.ssthresh
+                self.record(now, 'recovered')
+            else:
+                # Partial ACK: another hole, stay in recovery and take back the inflation it covers
+                self.cwnd = max(self.ssthresh, self.cwnd - acked + 1)
+                self.record(now, 'partial_ack')
+            return
+
+        if self.cwnd < self.ssthresh:
+            # Slow start: one more packet per packet ACKed, doubling every RTT
+            self.cwnd = min(self.cwnd + acked, self.ssthresh)
+            self.record(now, 'slow_start')
+        else:
+            self.congestion_avoidance(acked, now, srtt)
+            self.record(now, 'avoidance')
+
+    def on_dupack(self, now):
+        if self.in_recovery:
+            # Each duplicate ACK means a packet left the network, let one more in
+            self.cwnd += 1
+            self.record(now, 'inflate')
+
+    def on_loss(self, now, recover):
+        if self.in_recovery:
+            return      # Same loss event, the window was already cut
+        self.reduce(now)
+        self.cwnd = self.ssthresh + DUPE_ACK_THRESH
+        self.in_recovery = True
+        self.recover = recover
+        self.record(now, 'fast_retransmit')
+
+    def on_timeout(self, now):
+        self.reduce(now)
+        self.cwnd = float(INITIAL_CWND)
+        self.in_recovery = False
+        self.record(now, 'timeout')
+
+    # Sets ssthresh for a loss at the current window
+    def reduce(self, now):
+        raise NotImplementedError
+
+    def congestion_avoidance(self, acked, now, srtt):
+        raise NotImplementedError
+
+class Aimd(CongestionControl):
+    name = 'aimd'
+
+    def __init__(self, trace=None):
+        super().__init__(trace, ssthresh=0)     # No slow start
+
+    def on_ack(self, acked, ack_num, now, srtt):
+        self.cwnd += 1
+        self.record(now, 'avoidance')
+
+    def on_dupack(self, now):
+        pass
+
+    def on_loss(self, now, recover):
+        self.cwnd = max(1, self.cwnd // 2)
+        self.record(now, 'fast_retransmit')
+
+    def on_timeout(self, now):
+        self.cwnd = max(1, self.cwnd // 2)
+        self.record(now, 'timeout')
+
+class Reno(CongestionControl):
+    name = 'reno'
+
+    def reduce(self, now):
+        self.ssthresh = max(self.cwnd / 2, MIN_SSTHRESH)
+
+    def congestion_avoidance(self, acked, now, srtt):
+        # About one packet per RTT
+        self.cwnd += acked / self.cwnd
+
+class Cubic(CongestionControl):
+    name = 'cubic'
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, trace=None, **kwargs):
+        super().__init__(trace, **kwargs)
+        self.w_max = 0.0
+        self.epoch_start = None
+        self.k = 0.0
+        self.w_est = 0.0
+
+    def reduce(self, now):
+        # Fast convergence: give up more room when losses come before reaching the last W_max
+        if self.cwnd < self.w_max:
+            self.w_max = self.cwnd * (1 + self.BETA) / 2
+        else:
+            self.w_max = self.cwnd
+        self.ssthresh = max(self.cwnd * self.BETA, MIN_SSTHRESH)
+        self.epoch_start = None
+
+    def congestion_avoidance(self, acked, now, srtt):
+        rtt = srtt or 0.001
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if self.cwnd < self.w_max:
+                self.k = ((self.w_max - self.cwnd) / self.C) ** (1 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = self.cwnd
+            self.w_est = self.cwnd
+
+        t = now - self.epoch_start
+        target = self.C * (t + rtt - self.k) ** 3 + self.w_max
+
+        # TCP-friendly region: never grow slower than Reno would
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * acked / self.cwnd
+        target = max(target, self.w_est)
+
+        if target > self.cwnd:
+            self.cwnd += (target - self.cwnd) / self.cwnd * acked
+        else:
+            self.cwnd += 0.01 * acked / self.cwnd
+
+CONTROLLERS = {cls.name: cls for cls in (Aimd, Reno, Cubic)}
+
+def create(name, trace=None):
+    try:
+        return CONTROLLERS[name](trace)
+    except KeyError:
+        raise ValueError(f'Unknown congestion control {name!r}, expected one of {", ".join(CONTROLLERS)}')
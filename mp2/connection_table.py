@@ -0,0 +1,132 @@
+# Per-connection receiver state for pipeline_server.py
+#
+# Every sender picks a conn_id at SYN, and the receiver keys its connections on
+# (addr, conn_id), so any number of senders can share one socket (and one
+# sender address can run several transfers). A Connection holds only that
+# connection's sequence and window state, in __slots__ to keep thousands of
+# them small. Once the handshake completes it also gets a RingBuffer of
+# buffer_segments segments of the connection's segment size, which holds the
+# in-order bytes until the consumer reads them. Half-open connections have no
+# buffer, so a flood of SYNs costs a few hundred bytes each whatever the
+# segment size.
+#
+# sweep() removes connections whose handshake never completed within
+# HANDSHAKE_TIMEOUT and established ones idle for IDLE_TIMEOUT, marks them
+# EVICTED and passes each to on_evict, so whatever holds state for the
+# connection outside the table can release it.
+import time
+
+from ring_buffer import RingBuffer
+
+HANDSHAKE_TIMEOUT = 5.0     # seconds for SYN-ACK -> ACK
+IDLE_TIMEOUT = 30.0         # seconds without a packet before an established connection is evicted
+MAX_CONNECTIONS = 10000     # new SYNs are refused beyond this
+BUFFER_SEGMENTS = 5         # receive buffer per connection, in segments
+DEFAULT_SEGMENT_SIZE = 536  # segment size of senders that announce none at SYN, TCP's default MSS
+
+# Connection states
+SYN_RECEIVED = 1
+ESTABLISHED = 2
+EVICTED = 3
+
+class Connection:
+    __slots__ = ('addr', 'conn_id', 'state', 'expected_seq', 'buffer', 'out_of_order', 'out_of_order_bytes',
+                 'last_rwnd_sent', 'unacked', 'last_active', 'fin_received', 'eof_delivered', 'segment_size',
+                 'quick_acks', 'last_arrival', 'arrival_gap')
+
+    def __init__(self, addr, conn_id, expected_seq, now, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.addr = addr
+        self.conn_id = conn_id
+        self.state = SYN_RECEIVED
+        self.expected_seq = expected_seq
+        self.segment_size = segment_size
+        self.buffer = None              # In-order bytes accepted but not yet consumed, from establish() on
+        self.out_of_order = {}          # seq -> payload received ahead of expected_seq (selective repeat)
+        self.out_of_order_bytes = 0     # Payload bytes held in out_of_order, reserved out of the buffer's free space
+        self.last_rwnd_sent = None      # Track last advertised window
+        self.unacked = 0                # In-order packets accepted since the last ACK (delayed ACK)
+        self.quick_acks = 0             # In-order packets still ACKed at once (slow start, loss recovery)
+        self.last_arrival = None        # When the last DATA packet arrived
+        self.arrival_gap = None         # Smoothed time between DATA packets
+        self.last_active = now
+        self.fin_received = False       # FIN accepted, the stream ends once the buffer is read
+        self.eof_delivered = False      # The consumer has been told the stream ended
+
+    def __repr__(self):
+        state = {SYN_RECEIVED: 'SYN_RECEIVED', ESTABLISHED: 'ESTABLISHED', EVICTED: 'EVICTED'}[self.state]
+        return f'Connection({self.addr[0]}:{self.addr[1]}#{self.conn_id}, {state}, expected_seq={self.expected_seq})'
+
+class ConnectionTable:
+    def __init__(self, max_connections=MAX_CONNECTIONS, handshake_timeout=HANDSHAKE_TIMEOUT,
+                 idle_timeout=IDLE_TIMEOUT, buffer_segments=BUFFER_SEGMENTS, on_evict=None):
+        self.connections = {}   # (addr, conn_id) -> Connection
+        self.on_evict = on_evict    # Called with each connection sweep() removes
+        self.buffer_segments = buffer_segments
+        self.max_connections = max_connections
+        self.handshake_timeout = handshake_timeout
+        self.idle_timeout = idle_timeout
+
+        # Stats
+        self.opened = 0
+        self.established = 0
+        self.refused = 0
+        self.handshake_timeouts = 0
+        self.idle_evictions = 0
+
+    def get(self, addr, conn_id):
+        return self.connections.get((addr, conn_id))
+
+    # Creates the connection for a new SYN, or returns None if the table is full
+    def open(self, addr, conn_id, expected_seq, now=None, segment_size=DEFAULT_SEGMENT_SIZE):
+        if len(self.connections) >= self.max_connections:
+            self.refused += 1
+            return None
+        conn = Connection(addr, conn_id, expected_seq, now if now is not None else time.monotonic(),
+                          segment_size)
+        self.connections[(addr, conn_id)] = conn
+        self.opened += 1
+        return conn
+
+    # Marks conn established and gives it its receive buffer
+    def establish(self, conn):
+        conn.state = ESTABLISHED
+        conn.buffer = RingBuffer(conn.segment_size * self.buffer_segments)
+        self.established += 1
+
+    def remove(self, conn):
+        self.connections.pop((conn.addr, conn.conn_id), None)
+
+    # Evicts stalled handshakes and idle connections, returns how many were removed
+    def sweep(self, now=None):
+        now = now if now is not None else time.monotonic()
+        expired = []
+        for conn in self.connections.values():
+            idle = now - conn.last_active
+            if conn.state == SYN_RECEIVED and idle > self.handshake_timeout:
+                self.handshake_timeouts += 1
+                expired.append(conn)
+            elif conn.state == ESTABLISHED and idle > self.idle_timeout:
+                self.idle_evictions += 1
+                expired.append(conn)
+        for conn in expired:
+            self.remove(conn)
+            conn.state = EVICTED
+            if self.on_evict is not None:
+                self.on_evict(conn)
+        return len(expired)
+
+    def __len__(self):
+        return len(self.connections)
+
+    def __iter__(self):
+        return iter(list(self.connections.values()))
+
+    def stats(self):
+        return {
+            'active': len(self.connections),
+            'opened': self.opened,
+            'established': self.established,
+            'refused': self.refused,
+            'handshake_timeouts': self.handshake_timeouts,
+            'idle_evictions': self.idle_evictions,
+        }
@@ -0,0 +1,261 @@
+# Seedable network impairment: a UDP relay between the sender and the receiver
+#
+# Replaces the corruption client.py and pipeline_server.py used to do inside
+# make_packet, which only flipped bytes and couldn't be repeated. The relay
+# listens for senders, forwards their datagrams to the receiver from a socket
+# of its own per sender, and relays the replies back, impairing both ways:
+#
+#   python pipeline_server.py --port 8080
+#   python impairment.py --listen 9080 --target 127.0.0.1:8080 --profile lossy --seed 1
+#   python client.py --port 9080
+#
+# Each direction is a Link with its own random.Random, seeded from --seed.
+# Every datagram draws the same six numbers whatever the profile, so the nth
+# datagram in a direction meets the same fate on every run with the same
+# seed, and turning one impairment on doesn't change which packets another
+# one hits. When the endpoints send is still up to the OS scheduler, so runs
+# are repeatable in what happens to each packet, not to the microsecond.
+#
+# Per datagram, in this order:
+#   loss        dropped with probability `loss`
+#   duplicate   sent twice with probability `duplicate`
+#   corrupt     one byte flipped with probability `corrupt`, the checksum must catch it
+#   rate        sent onto a link of `rate` bytes/s (0 is unlimited) behind a
+#               drop-tail queue of `queue` packets
+#   latency     delivered `latency` seconds after it leaves the link, plus up to
+#               `jitter` more (uniform), so jitter alone can reorder packets
+#   reorder     with probability `reorder`, held back `reorder_delay` seconds more
+#               so packets sent after it overtake it
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import signal
+import sys
+import time
+from collections import deque
+from socket import socket, AF_INET, SOCK_DGRAM, SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+
+HOST = '127.0.0.1'
+QUEUE_PACKETS = 100     # Packets the rate-limited link queues before dropping
+REORDER_DELAY = 0.01    # Seconds a reordered packet is held back
+SOCKET_BUFFER = 1 << 22     # A window of large segments arrives as one burst
+MAX_DATAGRAM = 65535
+
+class Profile:
+    FIELDS = ('loss', 'latency', 'jitter', 'rate', 'queue', 'reorder', 'reorder_delay', 'duplicate', 'corrupt')
+
+    def __init__(self, loss=0.0, latency=0.0, jitter=0.0, rate=0, queue=QUEUE_PACKETS, reorder=0.0,
+                 reorder_delay=REORDER_DELAY, duplicate=0.0, corrupt=0.0):
+        self.loss = loss
+        self.latency = latency
+        self.jitter = jitter
+        self.rate = rate
+        self.queue = queue
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.duplicate = duplicate
+        self.corrupt = corrupt
+
+    # Copy with some fields changed, None leaves a field as it is
+    def replace(self, **changes):
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields.update((name, value) for name, value in changes.items() if value is not None)
+        return Profile(**fields)
+
+    def __str__(self):
+        default = Profile()
+        changed = [f'{name}={getattr(self, name)}' for name in self.FIELDS
+                   if getattr(self, name) != getattr(default, name)]
+        return ' '.join(changed) or 'clean'
+
+# Named profiles, the same impairments both ways. latency is one way, so the RTT is twice it
+PROFILES = {
+    'clean': Profile(),
+    'lossy': Profile(loss=0.02),
+    'wan': Profile(latency=0.02, jitter=0.002),
+    'jitter': Profile(latency=0.005, jitter=0.01),
+    'reorder': Profile(latency=0.002, reorder=0.05),
+    'narrow': Profile(latency=0.005, rate=1.25e6, queue=64),    # 10 Mbit/s
+    'duplicate': Profile(duplicate=0.05),
+    'corrupt': Profile(corrupt=0.05),
+    'hostile': Profile(loss=0.02, latency=0.01, jitter=0.005, rate=2.5e6, reorder=0.02, duplicate=0.01, corrupt=0.02),
+}
+
+class Link:
+    # One direction of the relay
+    def __init__(self, profile, seed=None):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.free_at = 0.0      # when the rate-limited link has sent everything queued
+        self.queued = deque()   # times the queued packets leave the link
+        self.stats = dict.fromkeys(('packets', 'dropped', 'queue_drops', 'duplicated', 'corrupted', 'reordered'), 0)
+
+    # Returns [(due time, datagram)] for a datagram that arrived at `now`, empty if it's lost
+    def process(self, data, now):
+        profile, rng, stats = self.profile, self.rng, self.stats
+        lose, duplicate, corrupt, position, jitter, reorder = (
+            rng.random(), rng.random(), rng.random(), rng.random(), rng.random(), rng.random())
+        stats['packets'] += 1
+
+        if lose < profile.loss:
+            stats['dropped'] += 1
+            return []
+        if corrupt < profile.corrupt and data:
+            data = bytearray(data)
+            data[int(position * len(data))] ^= 0xFF
+            stats['corrupted'] += 1
+        delay = profile.latency + jitter * profile.jitter
+        if reorder < profile.reorder:
+            delay += profile.reorder_delay
+            stats['reordered'] += 1
+        copies = 1
+        if duplicate < profile.duplicate:
+            copies = 2
+            stats['duplicated'] += 1
+
+        due = []
+        for _ in range(copies):
+            departure = self.depart(len(data), now)
+            if departure is None:
+                stats['queue_drops'] += 1
+                continue
+            due.append((departure + delay, bytes(data)))
+        return due
+
+    # helper function to find when a packet of `size` bytes has left the rate-limited link,
+    # None if the queue is full
+    def depart(self, size, now):
+        profile = self.profile
+        if not profile.rate:
+            return now
+        while self.queued and self.queued[0] <= now:
+            self.queued.popleft()
+        if len(self.queued) >= profile.queue:
+            return None
+        self.free_at = max(self.free_at, now) + size / profile.rate
+        self.queued.append(self.free_at)
+        return self.free_at
+
+class Relay:
+    def __init__(self, listen, target, up, down):
+        self.target = target
+        self.up = up        # Link from the senders to the receiver
+        self.down = down    # Link from the receiver back to the senders
+        self.selector = selectors.DefaultSelector()
+        self.sock = self.open_socket()
+        self.sock.bind(listen)
+        self.upstream = {}  # sender address -> socket that relays it to the target
+        self.senders = {}   # that socket -> sender address
+        self.pending = []   # heap of (due time, arrival order, socket, datagram, address or None)
+        self.order = itertools.count()
+
+    # helper function to make a non-blocking UDP socket watched by the selector
+    def open_socket(self):
+        sock = socket(AF_INET, SOCK_DGRAM)
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, SOCKET_BUFFER)
+        sock.setsockopt(SOL_SOCKET, SO_SNDBUF, SOCKET_BUFFER)
+        sock.setblocking(False)
+        self.selector.register(sock, selectors.EVENT_READ)
+        return sock
+
+    # helper function to find the socket that relays a sender's datagrams, so the receiver
+    # sees each sender at its own address
+    def upstream_for(self, addr):
+        sock = self.upstream.get(addr)
+        if sock is None:
+            sock = self.upstream[addr] = self.open_socket()
+            sock.connect(self.target)
+            self.senders[sock] = addr
+        return sock
+
+    def serve_forever(self):
+        while True:
+            timeout = None
+            if self.pending:
+                timeout = max(0.0, self.pending[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                self.receive(key.fileobj)
+            self.send_due(time.monotonic())
+
+    # Reads every datagram queued on sock and schedules what survives its link
+    def receive(self, sock):
+        while True:
+            try:
+                data, addr = sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, ConnectionRefusedError):
+                return
+            now = time.monotonic()
+            if sock is self.sock:
+                link, out, dest = self.up, self.upstream_for(addr), None
+            else:
+                link, out, dest = self.down, self.sock, self.senders[sock]
+            for due, datagram in link.process(data, now):
+                heapq.heappush(self.pending, (due, next(self.order), out, datagram, dest))
+
+    def send_due(self, now):
+        while self.pending and self.pending[0][0] <= now:
+            _, _, sock, datagram, dest = heapq.heappop(self.pending)
+            try:
+                if dest is None:
+                    sock.send(datagram)
+                else:
+                    sock.sendto(datagram, dest)
+            except OSError:
+                pass    # receiver not up yet, or the socket buffer is full: the packet is lost
+
+    def report(self):
+        for name, link in (('up', self.up), ('down', self.down)):
+            print(f'[RELAY] {name}: ' + ' '.join(f'{key}={value}' for key, value in link.stats.items()))
+
+    def close(self):
+        for key in list(self.selector.get_map().values()):
+            key.fileobj.close()
+        self.selector.close()
+
+# helper function to parse HOST:PORT
+def parse_addr(text):
+    host, _, port = text.rpartition(':')
+    return host or HOST, int(port)
+
+def main():
+    parser = argparse.ArgumentParser(description='UDP relay that impairs traffic between sender and receiver')
+    parser.add_argument('--listen', type=int, required=True, help='port senders send to')
+    parser.add_argument('--target', type=parse_addr, required=True, help='receiver as HOST:PORT')
+    parser.add_argument('--profile', choices=list(PROFILES), default='clean',
+                        help='impairments both ways, the options below override them (default: %(default)s)')
+    parser.add_argument('--down-profile', choices=list(PROFILES),
+                        help='impairments from the receiver back to the senders (default: --profile)')
+    parser.add_argument('--seed', type=int, help='seed for repeatable runs')
+    parser.add_argument('--loss', type=float, help='fraction of datagrams dropped')
+    parser.add_argument('--latency', type=float, help='one way delay in seconds')
+    parser.add_argument('--jitter', type=float, help='up to this many seconds of extra delay, uniform')
+    parser.add_argument('--rate', type=float, help='link rate in bytes/s, 0 for unlimited')
+    parser.add_argument('--queue', type=int, help='packets queued at the rate-limited link before dropping')
+    parser.add_argument('--reorder', type=float, help='fraction of datagrams held back')
+    parser.add_argument('--reorder-delay', type=float, help='seconds a reordered datagram is held back')
+    parser.add_argument('--duplicate', type=float, help='fraction of datagrams sent twice')
+    parser.add_argument('--corrupt', type=float, help='fraction of datagrams with a byte flipped')
+    args = parser.parse_args()
+
+    overrides = {name: getattr(args, name) for name in Profile.FIELDS}
+    up = PROFILES[args.profile].replace(**overrides)
+    down = PROFILES[args.down_profile or args.profile].replace(**overrides)
+    seeds = (None, None) if args.seed is None else (2 * args.seed, 2 * args.seed + 1)
+    relay = Relay((HOST, args.listen), args.target, Link(up, seeds[0]), Link(down, seeds[1]))
+    print(f'Relaying port {args.listen} to {args.target[0]}:{args.target[1]}, up: {up}, down: {down}, seed {args.seed}',
+          flush=True)
+
+    # Report what was done to the traffic on Ctrl-C or kill
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        relay.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        relay.report()
+        relay.close()
+
+if __name__ == '__main__':
+    main()
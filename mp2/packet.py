@@ -0,0 +1,140 @@
+# Binary packet format for the reliable-UDP endpoints
+#
+# Replaces the pipe-delimited text header ("seq|ack|rwnd|flags|checksum|").
+# Every packet starts with a fixed 20-byte header in network byte order:
+#
+#   offset  size  field
+#        0     1  version    PROTOCOL_VERSION, packets with another version are rejected
+#        1     1  flags      SYN / ACK / DATA / FIN / SACK bits, e.g. SYN | ACK for a SYN-ACK
+#        2     2  checksum   Internet checksum of the whole packet, computed with this field = 0
+#        4     4  conn_id    picked by the sender at SYN, the receiver keys connections on (addr, conn_id)
+#        8     4  seq
+#       12     4  ack
+#       16     4  rwnd
+#       20     -  payload
+#
+# Version 1 had no conn_id field (16-byte header).
+#
+# A SYN may carry the sender's segment size (largest DATA payload it will
+# send) as a 16-bit payload, like TCP's MSS option, and the SYN-ACK carries
+# the size the receiver accepts, at most the sender's. A SYN without one is
+# from a sender that doesn't announce its size.
+#
+# An ACK with the SACK flag carries up to MAX_SACK_BLOCKS (start, end) pairs
+# of 32-bit seqs as its payload: ranges above the cumulative ACK the receiver
+# has buffered, end exclusive.
+#
+# The checksum is written in place into the packet's bytearray once the rest
+# is filled in. Because the checksum field is part of the summed data, a packet
+# is valid when the checksum over all of it comes out 0, so nothing needs to be
+# rebuilt to verify it.
+import struct
+
+from checksum import checksum_calc, verify_checksum
+
+PROTOCOL_VERSION = 2
+
+HEADER = struct.Struct('!BBHIIII')
+HEADER_SIZE = HEADER.size
+CHECKSUM = struct.Struct('!H')
+CHECKSUM_OFFSET = 2
+
+# Flag bits
+SYN = 0x01
+ACK = 0x02
+DATA = 0x04
+FIN = 0x08
+SACK = 0x10
+
+FLAG_NAMES = ((SYN, 'SYN'), (ACK, 'ACK'), (DATA, 'DATA'), (FIN, 'FIN'), (SACK, 'SACK'))
+
+SACK_BLOCK = struct.Struct('!II')
+MAX_SACK_BLOCKS = 4
+
+MSS = struct.Struct('!H')
+MAX_SEGMENT_SIZE = 65507 - HEADER_SIZE  # largest payload that fits in one UDP datagram over IPv4
+
+# helper function to turn flag bits into the old names, e.g. SYN | ACK -> 'SYN-ACK'
+def flag_names(flags):
+    return '-'.join(name for bit, name in FLAG_NAMES if flags & bit) or 'NONE'
+
+class Packet:
+    __slots__ = ('flags', 'checksum', 'conn_id', 'seq', 'ack', 'rwnd', 'payload')
+
+    def __init__(self, flags, checksum, conn_id, seq, ack, rwnd, payload):
+        self.flags = flags
+        self.checksum = checksum
+        self.conn_id = conn_id
+        self.seq = seq
+        self.ack = ack
+        self.rwnd = rwnd
+        self.payload = payload      # memoryview into the received datagram
+
+    def __repr__(self):
+        return (f'Packet(conn_id={self.conn_id}, seq={self.seq}, ack={self.ack}, rwnd={self.rwnd}, flags={flag_names(self.flags)}, '
+                f'checksum={self.checksum}, payload={len(self.payload)} bytes)')
+
+# Writes a packet into buf (a bytearray at least HEADER_SIZE + len(payload) long)
+# and returns its length
+def encode_into(buf, seq, ack, rwnd, flags, payload=b'', conn_id=0) -> int:
+    size = HEADER_SIZE + len(payload)
+    if size > len(buf):
+        raise ValueError(f'Packet of {size} bytes does not fit in a {len(buf)} byte buffer')
+
+    # Header with placeholder checksum = 0
+    HEADER.pack_into(buf, 0, PROTOCOL_VERSION, flags, 0, conn_id, seq, ack, rwnd)
+    buf[HEADER_SIZE:size] = payload
+
+    # Fill in the checksum of the entire packet
+    CHECKSUM.pack_into(buf, CHECKSUM_OFFSET, checksum_calc(memoryview(buf)[:size]))
+    return size
+
+def encode_packet(seq, ack, rwnd, flags, payload=b'', conn_id=0) -> bytearray:
+    # Header with placeholder checksum = 0, then the payload
+    packet = bytearray(HEADER.pack(PROTOCOL_VERSION, flags, 0, conn_id, seq, ack, rwnd))
+    packet += payload
+    CHECKSUM.pack_into(packet, CHECKSUM_OFFSET, checksum_calc(packet))
+    return packet
+
+def parse_packet(data) -> Packet:
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f'Malformed packet: {len(data)} bytes is shorter than the header')
+
+    version, flags, checksum, conn_id, seq, ack, rwnd = HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f'Malformed packet: unsupported version {version}')
+
+    # Verify checksum
+    if not verify_checksum(data):
+        raise ValueError('Checksum verification failed - packet corrupted')
+
+    return Packet(flags, checksum, conn_id, seq, ack, rwnd, memoryview(data)[HEADER_SIZE:])
+
+# helper function to turn buffered out-of-order seqs into SACK blocks,
+# lowest first since those are the holes the sender should fill next
+def sack_blocks(seqs, limit=MAX_SACK_BLOCKS):
+    blocks = []
+    for seq in sorted(seqs):
+        if blocks and blocks[-1][1] == seq:
+            blocks[-1][1] = seq + 1
+        elif len(blocks) == limit:
+            break
+        else:
+            blocks.append([seq, seq + 1])
+    return blocks
+
+def encode_sack(blocks) -> bytes:
+    return b''.join(SACK_BLOCK.pack(start, end) for start, end in blocks)
+
+def parse_sack(payload):
+    return [SACK_BLOCK.unpack_from(payload, offset)
+            for offset in range(0, len(payload) - SACK_BLOCK.size + 1, SACK_BLOCK.size)]
+
+def encode_mss(segment_size) -> bytes:
+    return MSS.pack(segment_size)
+
+# Segment size from a SYN or SYN-ACK payload, None if it doesn't carry one
+def parse_mss(payload):
+    if len(payload) < MSS.size:
+        return None
+    return MSS.unpack_from(payload)[0]
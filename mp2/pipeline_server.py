@@ -1,297 +1,560 @@
 from socket import *
+import argparse
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import queue
 import random
+import signal
+import sys
 import threading
 import time
 
+from batch_io import BatchSocket
+from connection_table import (DEFAULT_SEGMENT_SIZE, ESTABLISHED, EVICTED, IDLE_TIMEOUT, MAX_CONNECTIONS,
+                              ConnectionTable)
+from packet import (ACK, DATA, FIN, HEADER_SIZE, MAX_SEGMENT_SIZE, SACK, SYN, encode_mss, encode_packet,
+                    encode_sack, parse_mss, parse_packet, sack_blocks)
+from telemetry import LEVELS, Telemetry
+
 HOST = '127.0.0.1'
 PORT = 8080
 
-# Testing
-# Set to True to simulate packet corruption
-SIMULATE_CORRUPT = True
-CORRUPTION_RATE = 0.1   # 10% of packets corrupted
+# Testing (corruption, delay, reordering and the rest are simulated by impairment.py)
+# Set to True to simulate lost DATA packets
+SIMULATE_LOSS = False
+LOSS_RATE = 0.1         # 10% of DATA packets dropped
+
+log = Telemetry('receiver')   # Logging, counters and histograms, main() sets it up from the command line
 
 class ReceiverState:
-     CONNECTED = False
-     EXPECTED_SEQ = None
-     BUFFER_SIZE = 5    # Receiver advertised window (for flow control)
-     USED_BUFFER = 0     # How much data is stored
-     lock = threading.Lock()  # Locks buffer access for thread safety
-     client_addr = None  # Store client addr for sending updates
-     socket = None  # Socket reference
-     last_rwnd_sent = None    # Track last advertised window
+     BUFFER_SIZE = 5    # Receive buffer per connection, in full segments (for flow control)
+     SEGMENT_SIZE = MAX_SEGMENT_SIZE    # Largest DATA payload accepted
+     socket = None  # BatchSocket reference
+     MODE = "gbn"   # "gbn": drop out of order packets, "sr": buffer them and send SACK blocks
+     PROCESS_DELAY = 0.3     # Seconds the consumer takes per segment, 0 delivers every batch as it's read
+     consumer = None    # consumer(conn, data) gets each connection's stream in order, then b"" at its end
+     ready = queue.SimpleQueue()     # Connections with new bytes for the consumer thread
+     zero_window = set()     # Connections last told rwnd = 0, waiting for a window update
+     connections = ConnectionTable()     # (addr, conn_id) -> Connection
+     ACK_EVERY = 2      # In-order packets per cumulative ACK
+     ACK_DELAY = 0.01   # Seconds an in-order packet may wait for its ACK, 0 ACKs every packet
+     ACK_GAPS = 2       # ...and at most this many of the connection's gaps between DATA packets
+     QUICK_ACKS = 16    # In-order packets ACKed at once after the handshake and after a loss
+     delayed_acks = {}  # Connection -> deadline of its held back ACK
+     ack_deadlines = []     # Heap of (deadline, order, Connection), entries no longer in delayed_acks are skipped
+     ack_order = itertools.count()
+
+SWEEP_INTERVAL = 1.0    # Seconds between sweeps for stalled handshakes and idle connections
+SOCKET_BUFFER = 1 << 22     # SO_RCVBUF, a window of large segments arrives as one burst
 
 # helper function to make custom packet
-def make_packet(seq, ack, rwnd, flags, payload: bytes) -> bytes:
-     # Header with placeholder checksum = 0
-     header = f"{seq}|{ack}|{rwnd}|{flags}|0|".encode()
-     temp_packet = header + payload
-
-     # Calculate checksum of entire packet
-     checksum = checksum_calc(temp_packet)
-
-     # Rebuild header with actual checksum
-     header = f"{seq}|{ack}|{rwnd}|{flags}|{checksum}|".encode()
-     final_packet = header + payload
-
-     # Testing checksum functionality by intentionally corrupting packets
-     if SIMULATE_CORRUPT and random.random() < CORRUPTION_RATE:
-          print("[CORRUPT] Simulating packet corruption...")
-
-          # Flip a random bit in payload
-          if len(payload) > 0:
-               header_len = len(header)
-               corrupt_pos = random.randint(header_len, len(final_packet) - 1)
-               packet_list = bytearray(final_packet)
-               packet_list[corrupt_pos] ^= 0xFF    # Flip all bits in one byte
-               final_packet = bytes(packet_list)
+def make_packet(seq, ack, rwnd, flags, payload: bytes, conn_id=0) -> bytearray:
+     return encode_packet(seq, ack, rwnd, flags, payload, conn_id)
+
+def handle_handshake(io, conn, pkt, addr):
+     if pkt.flags == SYN:
+          log.debug("Received SYN from %s (conn %d)", addr, pkt.conn_id)
+          log.count('syns')
+          if conn is None:
+               # Segment size: the sender's if it announced one, a conservative default if not,
+               # up to what this receiver accepts
+               segment_size = min(parse_mss(pkt.payload) or DEFAULT_SEGMENT_SIZE, ReceiverState.SEGMENT_SIZE)
+               conn = ReceiverState.connections.open(addr, pkt.conn_id, pkt.seq + 1, segment_size=segment_size)
+               if conn is None:
+                    log.warning("[CONN] Connection table full, ignoring SYN from %s", addr)
+                    log.count('syns_refused')
+                    return
+               conn.quick_acks = ReceiverState.QUICK_ACKS     # the sender starts in slow start
+          elif conn.state == ESTABLISHED:
+               # Late duplicate SYN, the connection is already up
+               return
 
-     return final_packet
-
-
-def parse_packet(packet: bytes) -> dict:
-     # Parse packet and verify checksum
-     parts = packet.split(b'|', 5)
-
-     if len(parts) < 5:
-         raise ValueError("Malformed packet: not enough fields")
-    
-     try:
-          seq = int(parts[0])
-          ack = int(parts[1])
-          rwnd = int(parts[2])
-          flags = parts[3].decode()
-          checksum = int(parts[4])
-          payload = parts[5] if len(parts) > 5 else b''
-     except (ValueError, IndexError) as e:
-          raise ValueError(f"Malformed packet: {e}")
-     
-     # Verify checksum
-     if not verify_checksum(packet, checksum):
-          raise ValueError("[ERROR] Checksum verification failed - packet corrupted")
-     
-     return {
-          'seq': seq,
-          'ack': ack,
-          'rwnd': rwnd,
-          'flags': flags,
-          'checksum': checksum,
-          'payload': payload
-     }
-
-def handle_handshake(socket, pkt, addr):
-     if pkt['flags'] == "SYN":
-          print(f"Received SYN from {addr}")
      # send SYN-ACK
-          ReceiverState.EXPECTED_SEQ = pkt['seq'] + 1
           syn_ack_packet = make_packet(
                seq=0,
-               ack=ReceiverState.EXPECTED_SEQ,
-               rwnd= ReceiverState.BUFFER_SIZE,
-               flags="SYN-ACK",
-               payload=b""
+               ack=conn.expected_seq,
+               rwnd=receive_window(conn),
+               flags=SYN | ACK,
+               payload=encode_mss(conn.segment_size),
+               conn_id=conn.conn_id
           )
-          socket.sendto(syn_ack_packet, addr)
-          print(f"Sent SYN-ACK to {addr}")
+          io.queue(syn_ack_packet, addr)
+          log.debug("Sent SYN-ACK to %s (segment size %d)", addr, conn.segment_size)
      
      # wait for ACK to establish connection
-     if pkt['flags'] == "ACK" and pkt['ack'] == ReceiverState.EXPECTED_SEQ:
-          print(f"Received ACK from {addr}, connection established!!")
-          ReceiverState.CONNECTED = True
-          ReceiverState.EXPECTED_SEQ = pkt['seq']
-
-def send_window_update():
-     # Send window update to client with current rwnd
-     # Called whenever buffer space is available
-     if ReceiverState.client_addr and ReceiverState.socket and ReceiverState.EXPECTED_SEQ is not None:
-          with ReceiverState.lock:
-               avail_window = max(0, ReceiverState.BUFFER_SIZE - ReceiverState.USED_BUFFER)
-
-               # Only send if window space become available
-               if ReceiverState.last_rwnd_sent == 0 and avail_window > 0:
-                    # Send packet with updated rwnd
-                    update_window = make_packet(
-                         seq = 0,
-                         ack = ReceiverState.EXPECTED_SEQ,
-                         rwnd = avail_window,
-                         flags = "ACK", 
-                         payload = b""
-                    )
-
-                    ReceiverState.socket.sendto(update_window, ReceiverState.client_addr)
-                    ReceiverState.last_rwnd_sent = avail_window
-                    print(f"[WINDOW UPDATE] Sent ACK with rwnd = {avail_window}")
-
-def buffer_process():
-     # Background thread that processes buffered data continuously.
-     # Basically simulates consuming of data
-     while True:
-          time.sleep(0.3)     # Simulate time passing for data to be processed
-
-          with ReceiverState.lock:
-               # Simulate prcoessing of a packet
-               if ReceiverState.USED_BUFFER > 0:
-                    old_buffer = ReceiverState.USED_BUFFER
-                    ReceiverState.USED_BUFFER -= 1
-                    print(f"[BACKGROUND] Processed 1 packet. Current Buffer: {ReceiverState.USED_BUFFER}/{ReceiverState.BUFFER_SIZE}")
-
-                    if old_buffer == ReceiverState.BUFFER_SIZE:
-                         print(f"[BACKGROUND] Buffer was full but now has space, Sending window update...")
-
-                         # Release lock before send to avoid deadlock
-                         threading.Thread(target=send_window_update, daemon=True).start()
-
-def checksum_calc(data: bytes) -> int:
-     # Caculate simple checksum by summing all bytes
-     checksum = 0
-
-     # Process bytes into pairs
-     for i in range(0, len(data), 2):
-          if i + 1 < len(data):
-               # Combine 2 bytes into 16bit word
-               word = (data[i] << 8) + data[i + 1]
-          else:
-               # Pad odd number of bytes with 0
-               word = data[i] << 8
-          
-          checksum += word
-
-          # Carry around addition
-          checksum = (checksum & 0xFFFF) + (checksum >> 16)
-
-     # One's complement
-     checksum = ~checksum & 0xFFFF
-
-     return checksum
-
-def verify_checksum(data: bytes, expected_checksum: int) -> bool:
-     # Verify packet checksum by recreating packet with checksum = 0
-     # calculating checksum and comparing
-     parts = data.split(b'|', 5)
-     if len(parts) < 5:
-          return False
-     
-     # Rebuild packet w/ checksum = 0
-     no_checksum_header = b'|'.join(parts[:4]) + b'|0|'
-     if len(parts) > 5:
-          no_checksum_pkt = no_checksum_header + parts[5]
+     elif conn is not None and pkt.flags == ACK and pkt.ack == conn.expected_seq:
+          log.debug("Received ACK from %s, connection established!!", addr)
+          ReceiverState.connections.establish(conn)
+          conn.expected_seq = pkt.seq
+
+# helper function to make a cumulative ACK, with SACK blocks for any out of order packets held
+def make_ack(conn, rwnd):
+     if conn.out_of_order:
+          blocks = sack_blocks(conn.out_of_order)
+          return make_packet(seq=0, ack=conn.expected_seq, rwnd=rwnd, flags=ACK | SACK,
+                             payload=encode_sack(blocks), conn_id=conn.conn_id)
+     return make_packet(seq=0, ack=conn.expected_seq, rwnd=rwnd, flags=ACK, payload=b"", conn_id=conn.conn_id)
+
+# helper function to work out the window to advertise from the free bytes in conn's buffer
+# Out of order packets held for selective repeat count against the free space, so the window
+# covers only memory that isn't spoken for yet
+def receive_window(conn):
+     if conn.buffer is None:
+          return ReceiverState.connections.buffer_segments     # handshake not done, the whole buffer will be free
+     return max(0, conn.buffer.free() - conn.out_of_order_bytes) // conn.segment_size
+
+# helper function to note that conn's receiver state was just ACKed
+def acked(conn, rwnd):
+     log.count('acks_sent')
+     log.observe('rwnd', rwnd)
+     conn.last_rwnd_sent = rwnd
+     conn.unacked = 0
+     ReceiverState.delayed_acks.pop(conn, None)
+     if rwnd == 0:
+          ReceiverState.zero_window.add(conn)
      else:
-          no_checksum_pkt = no_checksum_header
+          ReceiverState.zero_window.discard(conn)
 
-     # Calculate checksum
-     calculated_checksum = checksum_calc(no_checksum_pkt)
+# Queues a window update for every connection told rwnd = 0 whose consumer has made room since
+def send_window_updates(io):
+     for conn in list(ReceiverState.zero_window):
+          if ReceiverState.connections.get(conn.addr, conn.conn_id) is not conn:
+               ReceiverState.zero_window.discard(conn)    # evicted
+               continue
+          avail_window = receive_window(conn)
+          if avail_window > 0:
+               # Send packet with updated rwnd, it also carries any delayed ACK
+               io.queue(make_ack(conn, avail_window), conn.addr)
+               acked(conn, avail_window)
+               log.debug("[WINDOW UPDATE] Sent ACK with rwnd = %d to %s", avail_window, conn.addr)
+               log.count('window_updates')
+
+# Consumers, called as consumer(conn, data) with each piece of a connection's stream in order,
+# then once with b"" when the stream ends. Consumers that keep per-stream state also have
+# close(conn), called instead of the end of the stream when the connection is evicted
+
+def print_consumer(conn, data):
+     if data:
+          log.info("[DELIVER] %d bytes from %s conn %d: %r", len(data), conn.addr, conn.conn_id, data)
+     else:
+          log.info("[DELIVER] End of stream from %s conn %d", conn.addr, conn.conn_id)
+
+def discard_consumer(conn, data):
+     pass
+
+class DigestConsumer:
+     # Hashes each stream and logs its length, rate and sha256 when it ends
+     def __init__(self):
+          self.streams = {}   # Connection -> [bytes so far, sha256, time of the first byte]
+
+     def __call__(self, conn, data):
+          stream = self.streams.get(conn)
+          if stream is None:
+               stream = self.streams[conn] = [0, hashlib.sha256(), time.monotonic()]
+          if data:
+               stream[0] += len(data)
+               stream[1].update(data)
+          else:
+               del self.streams[conn]
+               elapsed = max(time.monotonic() - stream[2], 1e-6)
+               log.info("[DELIVER] %d bytes from %s conn %d in %.2fs (%.2f MB/s), sha256 %s", stream[0],
+                        conn.addr, conn.conn_id, elapsed, stream[0] / elapsed / 1e6, stream[1].hexdigest())
+
+     # Drops the state of a stream that will never end
+     def close(self, conn):
+          stream = self.streams.pop(conn, None)
+          if stream is not None:
+               log.warning("[DELIVER] Stream from %s conn %d evicted after %d bytes", conn.addr, conn.conn_id, stream[0])
+
+# helper function to write all of data into fd at offset
+def write_at(fd, data, offset):
+     view = memoryview(data)
+     while view:
+          if hasattr(os, "pwrite"):
+               written = os.pwrite(fd, view, offset)
+          else:
+               os.lseek(fd, offset, os.SEEK_SET)     # no positional writes on Windows
+               written = os.write(fd, view)
+          view = view[written:]
+          offset += written
+
+class FileConsumer(DigestConsumer):
+     # Also writes each stream to its own file in directory, each piece at its offset in the stream
+     def __init__(self, directory):
+          super().__init__()
+          self.directory = directory
+          self.files = {}     # Connection -> file descriptor
+
+     def __call__(self, conn, data):
+          if conn not in self.files:
+               path = os.path.join(self.directory, f"{conn.addr[0]}_{conn.addr[1]}_{conn.conn_id}.bin")
+               self.files[conn] = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+               log.info("[DELIVER] Writing stream from %s conn %d to %s", conn.addr, conn.conn_id, path)
+          if data:
+               offset = self.streams[conn][0] if conn in self.streams else 0
+               write_at(self.files[conn], data, offset)
+          else:
+               os.close(self.files.pop(conn))
+          super().__call__(conn, data)
+
+     # Closes the file of an evicted stream, what arrived so far stays in it
+     def close(self, conn):
+          fd = self.files.pop(conn, None)
+          if fd is not None:
+               os.close(fd)
+          super().close(conn)
+
+CONSUMERS = {
+     'print': lambda args: print_consumer,
+     'sha256': lambda args: DigestConsumer(),
+     'file': lambda args: FileConsumer(args.output_dir),
+     'discard': lambda args: discard_consumer,
+}
+
+# Reader side of conn's buffer: hands up to `size` bytes (all if None) to the consumer, and the
+# end of the stream once the FIN's arrived and everything before it has been read
+def deliver(conn, size=None):
+     if conn.state == EVICTED:
+          # The stream will never end, the consumer releases whatever it holds for it
+          if not conn.eof_delivered:
+               conn.eof_delivered = True
+               close = getattr(ReceiverState.consumer, "close", None)
+               if close is not None:
+                    close(conn)
+          return
+     data = conn.buffer.read(size)
+     if data:
+          ReceiverState.consumer(conn, data)
+          if conn in ReceiverState.zero_window:
+               ReceiverState.socket.wakeup()     # room for a window update
+     # fin_received first: it is only set after the last byte went into the buffer
+     if conn.fin_received and not len(conn.buffer) and not conn.eof_delivered:
+          conn.eof_delivered = True
+          ReceiverState.consumer(conn, b"")
+
+def consumer_loop():
+     # Background thread that reads the buffers like a slow application would,
+     # one segment per connection every PROCESS_DELAY seconds. It only reads
+     # the buffers, the socket loop sends the window updates
+     active = {}     # Connections with unread bytes, in arrival order
+     while True:
+          if not active:
+               active[ReceiverState.ready.get()] = None     # Block until there is something to read
+          while not ReceiverState.ready.empty():
+               active[ReceiverState.ready.get()] = None
+
+          time.sleep(ReceiverState.PROCESS_DELAY)     # Simulate time passing for data to be processed
+
+          for conn in list(active):
+               deliver(conn, conn.segment_size)
+               if conn.state == EVICTED:
+                    del active[conn]
+                    continue
+               log.debug("[BACKGROUND] Processed 1 segment for %s. Current Buffer: %d/%d bytes",
+                         conn.addr, len(conn.buffer), conn.buffer.capacity)
+               if not len(conn.buffer):
+                    del active[conn]
+
+# Called by the connection table for each connection it evicts. Only established connections
+# reached the consumer, which is told in the thread that delivers to it
+def evicted(conn):
+     ReceiverState.delayed_acks.pop(conn, None)
+     ReceiverState.zero_window.discard(conn)
+     if conn.buffer is None:
+          return
+     if ReceiverState.PROCESS_DELAY > 0:
+          ReceiverState.ready.put(conn)
+     else:
+          deliver(conn)
+
+# Queues the delayed ACKs whose deadline has passed, returns seconds until the next one is due
+def send_delayed_acks(io, now):
+     delayed = ReceiverState.delayed_acks
+     heap = ReceiverState.ack_deadlines
+     while heap:
+          deadline, _, conn = heap[0]
+          if delayed.get(conn) != deadline:
+               heapq.heappop(heap)     # ACKed early, or evicted
+               continue
+          if deadline > now:
+               return deadline - now
+          heapq.heappop(heap)
+          avail_window = receive_window(conn)
+          io.queue(make_ack(conn, avail_window), conn.addr)
+          acked(conn, avail_window)
+          log.debug("[DELAYED ACK] Sent ACK %d to %s", conn.expected_seq, conn.addr)
+          log.count('delayed_acks')
+     return None
+
+# Queues the reply to one DATA packet on io, sent when the batch is flushed.
+# Returns whether new in-order bytes went into conn's buffer
+def handle_data(io, conn, pkt, addr):
+     now = time.monotonic()
+     if conn.last_arrival is not None:
+          gap = now - conn.last_arrival
+          conn.arrival_gap = gap if conn.arrival_gap is None else conn.arrival_gap + (gap - conn.arrival_gap) / 8
+     conn.last_arrival = now
+
+     # Flow Control: drop packet if receiver buffer can't hold it
+     if pkt.seq == conn.expected_seq and len(pkt.payload) > conn.buffer.free():
+          avail_window = receive_window(conn)
+          log.debug("[FLOW CONTROL] Receiver buffer full (%d/%d bytes)", len(conn.buffer), conn.buffer.capacity)
+          log.debug("[FLOW CONTROL] Sending duplicate ACK with rwnd=%d", avail_window)
+          log.count('buffer_full')
+          conn.quick_acks = ReceiverState.QUICK_ACKS
+          dupe_ack = make_ack(conn, avail_window)
+          io.queue(dupe_ack, addr)
+          acked(conn, avail_window)
+          return False
 
-     # Compare and return
-     return calculated_checksum == expected_checksum
+     # Go-Back-N / selective repeat in order delivery
+     if pkt.seq != conn.expected_seq:
+          log.debug("Out of order packet from %s. Expected seq %d, got %d. Sending duplicate ACK.",
+                    addr, conn.expected_seq, pkt.seq)
+          log.count('out_of_order')
+
+          # Selective repeat: keep packets whose place in the stream fits in the buffer's free space,
+          # so everything held can move into the buffer once the gap is filled. Any window this
+          # receiver advertised since ends below that
+          if (ReceiverState.MODE == "sr" and pkt.seq not in conn.out_of_order and
+                    conn.expected_seq < pkt.seq < conn.expected_seq + conn.buffer.free() // conn.segment_size):
+               conn.out_of_order[pkt.seq] = bytes(pkt.payload)
+               conn.out_of_order_bytes += len(pkt.payload)
+               log.debug("[SR] Buffered out of order packet seq %d (%d held)", pkt.seq, len(conn.out_of_order))
+               log.observe('out_of_order_held', len(conn.out_of_order))
+
+          # Calculate available window, less what the held packets take
+          avail_window = receive_window(conn)
+
+          # send dupe ACKs for fast retransmit w/o waiting for a timeout, and ACK at once
+          # while the sender recovers
+          conn.quick_acks = ReceiverState.QUICK_ACKS
+          dupe_ack = make_ack(conn, avail_window)
+          io.queue(dupe_ack, addr)
+          acked(conn, avail_window)
+          return False
 
+     # Accept packet
+     conn.buffer.write(pkt.payload)
+     log.debug("Accepted in order packet seq %d", pkt.seq)
+     log.debug("BUFFER USED = %d / %d", len(conn.buffer), conn.buffer.capacity)
+
+     # update expected seq
+     conn.expected_seq += 1
+     conn.unacked += 1
+     filled_gap = bool(conn.out_of_order)
+
+     # Selective repeat: buffered packets that are now in order are accepted too, while they fit
+     while conn.expected_seq in conn.out_of_order and conn.buffer.write(conn.out_of_order[conn.expected_seq]):
+          conn.out_of_order_bytes -= len(conn.out_of_order.pop(conn.expected_seq))
+          log.debug("[SR] Accepted buffered packet seq %d", conn.expected_seq)
+          conn.expected_seq += 1
+
+     # Calculate available window
+     avail_window = receive_window(conn)
+
+     # Delayed ACK: hold the cumulative ACK until ACK_EVERY packets arrived, or for a couple of
+     # the gaps between this sender's packets (at most ACK_DELAY), so the last packet of a flight
+     # isn't held back long. ACK at once while the sender is in slow start or recovering from a
+     # loss, its window grows with every ACK, and when this packet filled a gap
+     quick = conn.quick_acks > 0
+     if quick:
+          conn.quick_acks -= 1
+     if conn.unacked < ReceiverState.ACK_EVERY and ReceiverState.ACK_DELAY > 0 and not filled_gap and not quick:
+          if conn not in ReceiverState.delayed_acks:
+               delay = ReceiverState.ACK_DELAY
+               if conn.arrival_gap is not None:
+                    delay = min(delay, ReceiverState.ACK_GAPS * conn.arrival_gap)
+               ReceiverState.delayed_acks[conn] = deadline = now + delay
+               heapq.heappush(ReceiverState.ack_deadlines, (deadline, next(ReceiverState.ack_order), conn))
+          return True
+
+     # send cumulative ACK
+     ack_packet = make_ack(conn, avail_window)
+     io.queue(ack_packet, addr)
+     acked(conn, avail_window)
+     log.debug("(2) Sent ACK for seq %d to %s", pkt.seq, addr)
+     return True
+
+# Queues the ACK for a FIN, which ends conn's stream once everything before it has arrived.
+# Returns whether the FIN was new
+def handle_fin(io, conn, pkt, addr):
+     accepted = pkt.seq == conn.expected_seq
+     if accepted:
+          conn.expected_seq += 1
+          conn.fin_received = True
+          log.debug("Received FIN from %s, end of stream", addr)
+          log.count('fins')
+
+     # ACK at once, duplicates too: the sender is waiting to close
+     avail_window = receive_window(conn)
+     io.queue(make_ack(conn, avail_window), addr)
+     acked(conn, avail_window)
+     return accepted
 
 def main():
+     global SIMULATE_LOSS, LOSS_RATE, log
+
+     parser = argparse.ArgumentParser(description='Reliable UDP receiver')
+     parser.add_argument('--host', default=HOST)
+     parser.add_argument('--port', type=int, default=PORT)
+     parser.add_argument('--mode', choices=['gbn', 'sr'], default=ReceiverState.MODE,
+                         help='gbn: Go-Back-N, sr: selective repeat with SACK (default: %(default)s)')
+     parser.add_argument('--buffer-size', type=int, default=ReceiverState.BUFFER_SIZE,
+                         help='receive buffer in full segments (default: %(default)s)')
+     parser.add_argument('--segment-size', type=int, default=ReceiverState.SEGMENT_SIZE,
+                         help="largest DATA payload accepted in bytes, senders that don't announce theirs "
+                              f"are assumed to use {DEFAULT_SEGMENT_SIZE} (default: %(default)s)")
+     parser.add_argument('--process-delay', type=float, default=ReceiverState.PROCESS_DELAY,
+                         help='seconds the consumer takes per segment, 0 to deliver data as it arrives')
+     parser.add_argument('--consumer', choices=list(CONSUMERS), default='sha256',
+                         help='what to do with each delivered stream (default: %(default)s)')
+     parser.add_argument('--output-dir', default='.',
+                         help='directory the file consumer writes streams to (default: %(default)s)')
+     parser.add_argument('--loss-rate', type=float, default=LOSS_RATE if SIMULATE_LOSS else 0.0,
+                         help='fraction of received DATA packets to drop')
+     parser.add_argument('--ack-every', type=int, default=ReceiverState.ACK_EVERY,
+                         help='in-order packets per cumulative ACK (default: %(default)s)')
+     parser.add_argument('--ack-delay', type=float, default=ReceiverState.ACK_DELAY * 1000,
+                         help='ms an in-order packet may wait for its ACK, 0 ACKs every packet (default: %(default)s)')
+     parser.add_argument('--max-connections', type=int, default=MAX_CONNECTIONS,
+                         help='concurrent connections before new SYNs are refused (default: %(default)s)')
+     parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                         help='seconds before an idle connection is evicted (default: %(default)s)')
+     parser.add_argument('--log-level', choices=list(LEVELS), default='info',
+                         help='debug logs every packet (default: %(default)s)')
+     parser.add_argument('--histograms', action='store_true',
+                         help='keep histograms of advertised rwnd, batch sizes and out of order packets held, '
+                              'and log them when the receiver stops')
+     parser.add_argument('--trace', metavar='CSV',
+                         help='write advertised rwnd, batch sizes and out of order packets held over time '
+                              'to this CSV file when the receiver stops')
+     parser.add_argument('--trace-sample', type=int, default=1, metavar='N',
+                         help='keep every Nth value of each series in the trace (default: %(default)s)')
+     args = parser.parse_args()
+
+     SIMULATE_LOSS, LOSS_RATE = args.loss_rate > 0, args.loss_rate
+     logging.basicConfig(level=LEVELS[args.log_level], format='%(message)s', stream=sys.stdout)
+     log = Telemetry('receiver', histograms=args.histograms, trace=bool(args.trace), sample_every=args.trace_sample)
+     ReceiverState.MODE = args.mode
+     ReceiverState.BUFFER_SIZE = args.buffer_size
+     ReceiverState.SEGMENT_SIZE = args.segment_size
+     ReceiverState.PROCESS_DELAY = args.process_delay
+     ReceiverState.ACK_EVERY = args.ack_every
+     ReceiverState.ACK_DELAY = args.ack_delay / 1000
+     ReceiverState.consumer = CONSUMERS[args.consumer](args)
+     ReceiverState.connections = ConnectionTable(args.max_connections, idle_timeout=args.idle_timeout,
+                                                 buffer_segments=args.buffer_size, on_evict=evicted)
+
      serverSocket = socket(AF_INET, SOCK_DGRAM)
-     serverSocket.bind((HOST, PORT))
-     serverSocket.settimeout(0.5)
-     print('Server ready')
+     serverSocket.setsockopt(SOL_SOCKET, SO_RCVBUF, SOCKET_BUFFER)
+     serverSocket.bind((args.host, args.port))
+     io = BatchSocket(serverSocket, buffer_size=HEADER_SIZE + ReceiverState.SEGMENT_SIZE)
+     log.info('Server ready (%s)', args.mode)
 
      # Store socket in state for window updates
-     ReceiverState.socket = serverSocket
+     ReceiverState.socket = io
      
-     # Background thread for buffer processing
-     processor_thread = threading.Thread(target=buffer_process, daemon = True)
-     processor_thread.start()
-     print("[BACKGROUND] Buffer processor started")
-
-     # Stats
-     pkts_received = 0
-     pkts_corrupted = 0
-
+     # Background thread that consumes the buffers, otherwise the socket loop delivers each batch itself
+     if ReceiverState.PROCESS_DELAY > 0:
+          consumer_thread = threading.Thread(target=consumer_loop, daemon = True)
+          consumer_thread.start()
+          log.info("[BACKGROUND] Consumer started")
+
+     # Report the counters and write the trace on Ctrl-C or kill
+     signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+     try:
+          serve(io)
+     except KeyboardInterrupt:
+          pass
+     finally:
+          log.report()
+          if args.trace:
+               log.write_csv(args.trace)
+
+# The socket loop
+def serve(io):
+     last_sweep = time.monotonic()
+
+     wait = 0.5
      while True:
-          try:
-               data, addr = serverSocket.recvfrom(2048)  # receive packet + client address
-          except timeout:
-               # No packets received continue
-               continue
+          # Wait for packets (or the next delayed ACK), then read every one already queued in a single wakeup
+          batch = io.recv_batch(wait)
+
+          # Drop stalled handshakes and idle connections
+          now = time.monotonic()
+          if now - last_sweep >= SWEEP_INTERVAL:
+               last_sweep = now
+               if ReceiverState.connections.sweep(now):
+                    log.info("[CONN] %s", ReceiverState.connections.stats())
+
+          if batch:
+               log.count('packets_received', len(batch))
+               log.observe('batch', len(batch))
+
+          ready = {}     # Connections that got new in-order bytes (or their FIN) in this batch
+          for data, addr in batch:
+               try:
+                    pkt = parse_packet(data)
+               except ValueError as e:
+                    log.count('corrupted')
+                    log.debug("Malformed packet, ignoring: %s", e)
+                    log.debug("[CHECKSUM] Invalid - dropping packet")
+                    continue
           
-          ReceiverState.client_addr = addr
-          pkts_received += 1
-
-          try:
-               pkt = parse_packet(data)
-          except ValueError as e:
-               pkts_corrupted += 1
-               print("Malformed packet, ignoring:", e)
-               print(f"[CHECKSUM] Invalid - dropping packet")
-               continue
-          
-          print("===================================================================")
-          print("(1) Received packet:", pkt)
-
-          # receive 3 way handshake to establish connection
-          if not ReceiverState.CONNECTED:
-              handle_handshake(serverSocket, pkt, addr)
-              continue
-          
-          # After connection established, process data packets, send ACKs back
-          if pkt['flags'] == "DATA" and ReceiverState.CONNECTED:
-               with ReceiverState.lock:
-                    # Flow Control: drop packet if receiver buffer is full
-                    if ReceiverState.USED_BUFFER >= ReceiverState.BUFFER_SIZE:
-                         print(f"[FLOW CONTROL] Receiver buffer full ({ReceiverState.USED_BUFFER}/{ReceiverState.BUFFER_SIZE})")
-                         print("[FLOW CONTROL] Sending duplicate ACK with rwnd=0")
-                         dupe_ack = make_packet(
-                              seq = 0,
-                              ack = ReceiverState.EXPECTED_SEQ,
-                              rwnd = 0,      # Receiver is full so advertise rwnd as 0
-                              flags = "ACK",
-                              payload = b""
-                         )
-                         serverSocket.sendto(dupe_ack, addr)
-                         ReceiverState.last_rwnd_sent = 0
-                         continue
-                    
-                    # Go-Back-N in order delivery
-                    if pkt['seq'] != ReceiverState.EXPECTED_SEQ:
-                         print(f"""Out of order packet from {addr}. Expected seq {ReceiverState.EXPECTED_SEQ}, 
-                              got {pkt['seq']}. Sending duplicate ACK.""")
-                         
-                         # send dupe ACKs for fast retransmit w/o waiting for a timeout
-                         # Calculate available window
-                         avail_window = max(0, ReceiverState.BUFFER_SIZE - ReceiverState.USED_BUFFER)
-                         dupe_ack = make_packet(
-                              seq = 0,
-                              ack = ReceiverState.EXPECTED_SEQ,
-                              rwnd = avail_window,
-                              flags = "ACK",
-                              payload = b""
-                         )
-                         serverSocket.sendto(dupe_ack, addr)
-                         ReceiverState.last_rwnd_sent = avail_window
-                         continue
-                    
-                    # Accept packet
-                    ReceiverState.USED_BUFFER += 1
-                    print(f"Accepted in order packet seq {pkt['seq']}")
-                    print("BUFFER USED = ", ReceiverState.USED_BUFFER, "/", ReceiverState.BUFFER_SIZE)
-
-
-                    # update expected seq
-                    ReceiverState.EXPECTED_SEQ += 1
-
-                    # Calculate available window
-                    avail_window = max(0, ReceiverState.BUFFER_SIZE - ReceiverState.USED_BUFFER)
-
-                    # send cumulative ACK
-                    ack_packet = make_packet(
-                         seq=0,
-                         ack=ReceiverState.EXPECTED_SEQ,
-                         rwnd= avail_window,
-                         flags="ACK",
-                         payload=b""
-                    )
-                    serverSocket.sendto(ack_packet, addr)
-                    ReceiverState.last_rwnd_sent = avail_window
-                    print(f"(2) Sent ACK for seq {pkt['seq']} to {addr}")
-               # end of loop
+               # Testing retransmission by intentionally dropping DATA packets
+               if SIMULATE_LOSS and pkt.flags == DATA and random.random() < LOSS_RATE:
+                    log.debug("[LOSS] Simulating lost packet seq %d", pkt.seq)
+                    log.count('dropped')
+                    continue
+
+               log.debug("(1) Received packet: %s", pkt)
+
+               conn = ReceiverState.connections.get(addr, pkt.conn_id)
+               if conn is not None:
+                    conn.last_active = now
+
+               # receive 3 way handshake to establish connection
+               if pkt.flags & SYN or (conn is not None and conn.state != ESTABLISHED and pkt.flags == ACK):
+                    handle_handshake(io, conn, pkt, addr)
+                    continue
+
+               if conn is None:
+                    log.count('unknown_connection')
+                    log.debug("[CONN] No connection for %s conn %d, ignoring", addr, pkt.conn_id)
+                    continue
+
+               # After connection established, process data packets, send ACKs back
+               if pkt.flags == DATA:
+                    if conn.state != ESTABLISHED:
+                         # The handshake ACK was lost, the first data packet completes the handshake
+                         if pkt.seq != conn.expected_seq:
+                              continue
+                         log.debug("Received DATA from %s before the handshake ACK, connection established!!", addr)
+                         ReceiverState.connections.establish(conn)
+                    if handle_data(io, conn, pkt, addr):
+                         ready[conn] = None
+               elif pkt.flags == FIN and conn.state == ESTABLISHED:
+                    if handle_fin(io, conn, pkt, addr):
+                         ready[conn] = None
+
+          # Hand the new bytes to the consumer thread, or straight to the consumer
+          for conn in ready:
+               if ReceiverState.PROCESS_DELAY > 0:
+                    ReceiverState.ready.put(conn)
+               else:
+                    deliver(conn)
+
+          # Send the batch's replies, window updates and any delayed ACKs that are due in one burst
+          send_window_updates(io)
+          next_ack = send_delayed_acks(io, time.monotonic())
+          wait = 0.5 if next_ack is None else min(0.5, next_ack)
+          io.flush()
+          # end of loop
 
 
 if __name__ == "__main__":
     main()
-
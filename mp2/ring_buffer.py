@@ -0,0 +1,56 @@
+# Bounded byte ring buffer for the receiver's in-order stream
+#
+# pipeline_server.py writes each connection's in-order payload bytes into a
+# RingBuffer, and the consumer reads them back out as one continuous stream.
+# There is exactly one writer (the socket loop) and one reader (the consumer),
+# so no lock is needed: head only ever moves forward in the reader and tail
+# only in the writer, each side reads the other's counter, and both are plain
+# ints that CPython updates atomically. The writer copies the bytes in before
+# it moves tail and the reader copies them out before it moves head, so
+# neither side ever sees a half-written region.
+#
+# free() is what the receiver advertises: rwnd is derived from it.
+
+class RingBuffer:
+    __slots__ = ('capacity', 'buf', 'head', 'tail')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buf = bytearray(capacity)
+        self.head = 0   # bytes read so far, only the reader moves it
+        self.tail = 0   # bytes written so far, only the writer moves it
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def free(self):
+        return self.capacity - (self.tail - self.head)
+
+    # Writer side: copies all of data in and returns True, or returns False if it doesn't fit
+    def write(self, data):
+        size = len(data)
+        if size > self.free():
+            return False
+        start = self.tail % self.capacity
+        first = min(size, self.capacity - start)
+        data = memoryview(data)
+        self.buf[start:start + first] = data[:first]
+        if first < size:
+            # Wraps around the end
+            self.buf[:size - first] = data[first:]
+        self.tail += size
+        return True
+
+    # Reader side: removes and returns up to `size` bytes (all of them if size is None)
+    def read(self, size=None):
+        available = self.tail - self.head
+        size = available if size is None else min(size, available)
+        start = self.head % self.capacity
+        first = min(size, self.capacity - start)
+        with memoryview(self.buf) as view:
+            data = view[start:start + first].tobytes()
+            if first < size:
+                # Wraps around the end
+                data += view[:size - first].tobytes()
+        self.head += size
+        return data
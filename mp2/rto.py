@@ -0,0 +1,69 @@
+# Retransmission timeout from measured round-trip times (Jacobson/Karels, RFC 6298)
+#
+#   first sample:  SRTT = R, RTTVAR = R / 2
+#   later samples: RTTVAR = 3/4 RTTVAR + 1/4 |SRTT - R|
+#                  SRTT   = 7/8 SRTT   + 1/8 R
+#   RTO = SRTT + max(G, 4 * RTTVAR), clamped to [min_rto, max_rto]
+#
+# The caller applies Karn's rule: only segments that were sent once give a
+# sample, since an ACK for a retransmitted segment can't be matched to a send
+# time. Every timeout doubles the RTO (exponential backoff) until the next
+# valid sample, or until an ACK for new data shows the path delivers again
+# (reset_backoff), so a Go-Back-N sender that resends everything doesn't keep
+# a backed-off RTO for the rest of the transfer.
+
+MIN_RTO = 0.05              # RFC 6298 says 1s, this stack runs on loopback/LAN paths
+MAX_RTO = 60.0
+CLOCK_GRANULARITY = 0.001   # G, resolution of the send timestamps
+
+ALPHA = 1 / 8   # SRTT gain
+BETA = 1 / 4    # RTTVAR gain
+K = 4
+
+class RtoEstimator:
+    def __init__(self, initial_rto=1.0, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.rto = min(max_rto, max(min_rto, initial_rto))
+        self.srtt = None
+        self.rttvar = None
+        self.last_rtt = None
+
+        # Stats
+        self.samples = 0
+        self.backoffs = 0
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.last_rtt = rtt
+        self.samples += 1
+
+        # A fresh sample also ends any backoff
+        self.reset_backoff()
+
+    # Back to the RTO the samples so far give, called when an ACK for new data arrives
+    def reset_backoff(self):
+        if self.srtt is None:
+            return
+        rto = self.srtt + max(CLOCK_GRANULARITY, K * self.rttvar)
+        self.rto = min(self.max_rto, max(self.min_rto, rto))
+
+    # Called on every retransmission timeout
+    def backoff(self):
+        self.rto = min(self.max_rto, self.rto * 2)
+        self.backoffs += 1
+
+    def stats(self):
+        return {
+            'srtt': self.srtt,
+            'rttvar': self.rttvar,
+            'last_rtt': self.last_rtt,
+            'rto': self.rto,
+            'rtt_samples': self.samples,
+            'rto_backoffs': self.backoffs,
+        }
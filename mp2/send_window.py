@@ -0,0 +1,111 @@
+# The sender's in-flight segments, in a ring indexed by seq
+#
+# client.py used to keep a dict of payloads and a parallel dict of send times
+# keyed by seq, and scanned the whole dict for the seqs below every new
+# cumulative ACK. A SendWindow keeps one Segment per seq in flight, holding
+# the payload view, its last send time and how often it was retransmitted,
+# in a ring of slots (slot = seq & mask). The seqs in flight are always the
+# contiguous range [base, next_seq), so sending appends at next_seq and an
+# ACK pops from base: O(1) per segment sent and O(acked) per ACK, whatever
+# the window size. The ring doubles when the window outgrows it.
+#
+# SACKed seqs are kept as a sorted list of disjoint [start, end) ranges
+# rather than one flag per segment, since every SACK ACK repeats blocks that
+# can cover most of the window. Merging a block costs O(ranges), and a
+# lookup is a bisect.
+from bisect import bisect_left, bisect_right
+
+CAPACITY = 64   # initial ring size, a power of two
+
+class Segment:
+    __slots__ = ('payload', 'sent_time', 'retransmits')
+
+    def __init__(self, payload, sent_time):
+        self.payload = payload          # view into the data being sent
+        self.sent_time = sent_time      # time of the last (re)transmission
+        self.retransmits = 0
+
+class SendWindow:
+    def __init__(self, base, capacity=CAPACITY):
+        self.base = base            # first unACKed seq
+        self.next_seq = base        # seq of the next new segment
+        self.slots = [None] * capacity
+        self.mask = capacity - 1
+        self.sack_starts = []       # SACKed ranges above base, sorted and disjoint
+        self.sack_ends = []
+
+    def __len__(self):
+        return self.next_seq - self.base
+
+    def __contains__(self, seq):
+        return self.base <= seq < self.next_seq
+
+    def __getitem__(self, seq):
+        if not self.base <= seq < self.next_seq:
+            raise KeyError(seq)
+        return self.slots[seq & self.mask]
+
+    # Adds the next new segment and returns its seq
+    def push(self, payload, now):
+        if self.next_seq - self.base > self.mask:
+            self.grow()
+        seq = self.next_seq
+        self.slots[seq & self.mask] = Segment(payload, now)
+        self.next_seq = seq + 1
+        return seq
+
+    def grow(self):
+        in_flight = [self.slots[seq & self.mask] for seq in range(self.base, self.next_seq)]
+        self.slots = [None] * (2 * len(self.slots))
+        self.mask = len(self.slots) - 1
+        for seq, segment in zip(range(self.base, self.next_seq), in_flight):
+            self.slots[seq & self.mask] = segment
+
+    # Removes the segments a cumulative ACK covers and returns them, oldest first
+    def ack(self, ack_num):
+        slots, mask = self.slots, self.mask
+        acked = []
+        for seq in range(self.base, min(ack_num, self.next_seq)):
+            acked.append(slots[seq & mask])
+            slots[seq & mask] = None
+        self.base += len(acked)
+
+        # Drop the SACKed ranges the ACK passed
+        done = bisect_right(self.sack_ends, self.base)
+        del self.sack_starts[:done], self.sack_ends[:done]
+        if self.sack_starts and self.sack_starts[0] < self.base:
+            self.sack_starts[0] = self.base
+        return acked
+
+    # Records a SACK block [start, end), clipped to the window
+    def sack(self, start, end):
+        start = max(start, self.base)
+        end = min(end, self.next_seq)
+        if start >= end:
+            return
+        # Ranges [first, last) overlap or touch the block, merge them with it
+        first = bisect_left(self.sack_ends, start)
+        last = bisect_right(self.sack_starts, end)
+        if first < last:
+            start = min(start, self.sack_starts[first])
+            end = max(end, self.sack_ends[last - 1])
+        self.sack_starts[first:last] = [start]
+        self.sack_ends[first:last] = [end]
+
+    def is_sacked(self, seq):
+        i = bisect_right(self.sack_starts, seq) - 1
+        return i >= 0 and seq < self.sack_ends[i]
+
+    # Highest SACKed seq, None if nothing in flight is SACKed
+    def highest_sacked(self):
+        return self.sack_ends[-1] - 1 if self.sack_ends else None
+
+    def sacked_count(self):
+        return sum(end - start for start, end in zip(self.sack_starts, self.sack_ends))
+
+    # (seq, Segment) for every seq in flight from start (default base) up to end (default next_seq)
+    def items(self, start=None, end=None):
+        start = self.base if start is None else max(start, self.base)
+        end = self.next_seq if end is None else min(end, self.next_seq)
+        for seq in range(start, end):
+            yield seq, self.slots[seq & self.mask]
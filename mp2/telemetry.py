@@ -0,0 +1,128 @@
+# Leveled logging, counters, histograms and a sampled time-series trace
+#
+# client.py and pipeline_server.py used to print several lines for every
+# packet, so terminal I/O set the pace of a transfer. Each endpoint now keeps
+# one Telemetry instead:
+#   - log lines go to a stdlib logging logger, like mp1's servers. Levels and
+#     handlers are set up once, by logging.basicConfig() in each main(), and
+#     anything below the configured level costs a call and a cached level
+#     check. Per-packet lines are debug, the default level is info. Messages
+#     are %-formatted only when they are emitted
+#   - counters are plain ints in a dict, always on
+#   - with histograms on, observe() adds a value to a histogram with
+#     power-of-two buckets (count, sum, min, max and approximate percentiles),
+#     so RTT, cwnd, rwnd or a queue depth can be recorded for every packet
+#     without keeping the values. Off, observe() returns at once
+#   - with tracing on (which turns histograms on), observe() also keeps every
+#     `sample_every`th value of a series with its time, and write_csv()
+#     exports them for offline analysis as (time, series, value) rows, like
+#     congestion.CwndTrace
+# A benchmark that runs an endpoint in-process and never configures logging
+# gets only warnings and errors, on stderr.
+import csv
+import logging
+import math
+import time
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING, 'error': ERROR}
+
+class Histogram:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets = {}   # exponent e -> values in [2**(e-1), 2**e), zero and below in bucket None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        bucket = math.frexp(value)[1] if value > 0 else None
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    # Upper edge of the bucket holding the p-th percentile, clamped to [min, max]
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = self.buckets.get(None, 0)
+        if seen >= rank:
+            return max(self.min, min(0.0, self.max))
+        for bucket in sorted(e for e in self.buckets if e is not None):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return max(self.min, min(2.0 ** bucket, self.max))
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.total / self.count, 'min': self.min,
+                'p50': self.percentile(50), 'p99': self.percentile(99), 'max': self.max}
+
+class Telemetry:
+    def __init__(self, name, histograms=False, trace=False, sample_every=1):
+        self.logger = logging.getLogger(name)
+        # The logger's own methods, so a log line costs no more than calling logging directly
+        self.debug = self.logger.debug
+        self.info = self.logger.info
+        self.warning = self.logger.warning
+        self.error = self.logger.error
+        self.counters = {}
+        self.histograms = {}
+        self.observing = histograms or trace
+        self.start = time.monotonic()
+        self.sample_every = max(1, sample_every)
+        self.seen = {}      # series -> values observed, for sampling
+        self.samples = [] if trace else None    # (seconds since start, series, value)
+
+    def log(self, level, msg, *args):
+        self.logger.log(level, msg, *args)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        if not self.observing:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+        if self.samples is not None:
+            seen = self.seen.get(name, 0)
+            self.seen[name] = seen + 1
+            if seen % self.sample_every == 0:
+                self.samples.append((time.monotonic() - self.start, name, value))
+
+    def stats(self):
+        return {
+            'counters': dict(self.counters),
+            'histograms': {name: histogram.summary() for name, histogram in self.histograms.items()},
+        }
+
+    # Logs the counters and histogram summaries at info level
+    def report(self):
+        if not self.logger.isEnabledFor(INFO):
+            return
+        if self.counters:
+            self.info("[TELEMETRY] %s", ", ".join(f"{name}={value}" for name, value in sorted(self.counters.items())))
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                s = histogram.summary()
+                self.info("[TELEMETRY] %s: n=%d mean=%.4g min=%.4g p50=%.4g p99=%.4g max=%.4g",
+                          name, s['count'], s['mean'], s['min'], s['p50'], s['p99'], s['max'])
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['time', 'series', 'value'])
+            for elapsed, name, value in self.samples or ():
+                writer.writerow([f'{elapsed:.6f}', name, value])
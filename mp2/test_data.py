@@ -0,0 +1,9 @@
+# The test data client.py sends when no --file is given, also used by the
+# asyncio sender and the benchmarks so they all move the same bytes
+TEST_DATA = b"""_4&@=EFyR=R,?Q:3q&ir7rV22$7yE(
+                #uFJ]H*Kjk57*21K=CAQ/t6)S?Ff4L
+                JrU}E/md[(,Aq6d/DhQD3/3{3XRa]r
+                """
+
+def client_data(repeat):
+    return TEST_DATA * repeat
@@ -0,0 +1,112 @@
+# Hashed timer wheel for the asyncio transport
+#
+# Retransmission and delayed-ACK timers are started and cancelled far more often
+# than they fire: every ACK moves a connection's retransmission timer. The wheel
+# has `slots` buckets, each `tick` seconds wide. A timer goes into the bucket
+# its deadline falls in, with the number of full turns left, so starting and
+# cancelling are O(1) however many connections share the loop. Timers fire up
+# to one tick late, never early.
+#
+# The wheel keeps one loop callback, set for the next bucket that holds a
+# timer, so empty ticks cost nothing and an idle wheel schedules nothing.
+import math
+
+TICK = 0.005    # seconds per bucket
+SLOTS = 512     # buckets, one turn of the wheel is TICK * SLOTS seconds
+
+class Timer:
+    __slots__ = ('callback', 'args', 'rounds', 'cancelled', 'wheel')
+
+    def __init__(self, wheel, callback, args, rounds):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self.wheel.pending -= 1
+
+class TimerWheel:
+    def __init__(self, loop, tick=TICK, slots=SLOTS):
+        self.loop = loop
+        self.tick = tick
+        self.slots = slots
+        self.buckets = [[] for _ in range(slots)]
+        self.cursor = 0
+        self.cursor_time = 0.0  # loop time of the bucket at cursor
+        self.pending = 0        # timers neither fired nor cancelled
+        self.handle = None      # loop callback for the next tick, None while idle
+        self.wake_time = 0.0    # loop time handle runs at
+
+        # Stats
+        self.started = 0
+        self.fired = 0
+
+    # Runs callback(*args) after `delay` seconds, returns a Timer that can be cancelled
+    def call_later(self, delay, callback, *args):
+        now = self.loop.time()
+        if self.handle is None:
+            # Idle: restart the wheel from now
+            self.cursor_time = now
+
+        ticks = max(1, math.ceil((now + delay - self.cursor_time) / self.tick))
+        timer = Timer(self, callback, args, (ticks - 1) // self.slots)
+        self.buckets[(self.cursor + ticks) % self.slots].append(timer)
+        self.pending += 1
+        self.started += 1
+
+        # Wake up for this bucket if the loop callback is set for later
+        due = self.cursor_time + min(ticks, self.slots) * self.tick
+        if self.handle is None or due < self.wake_time:
+            self.schedule(due)
+        return timer
+
+    def schedule(self, when):
+        if self.handle is not None:
+            self.handle.cancel()
+        self.wake_time = when
+        self.handle = self.loop.call_at(when, self.advance)
+
+    # Loop callback: moves the cursor up to now, firing the timers due on the way
+    def advance(self):
+        now = self.loop.time()
+        while self.cursor_time + self.tick <= now and self.pending:
+            self.cursor = (self.cursor + 1) % self.slots
+            self.cursor_time += self.tick
+            bucket = self.buckets[self.cursor]
+            if not bucket:
+                continue
+            self.buckets[self.cursor] = keep = []   # callbacks may start timers in this bucket
+            for timer in bucket:
+                if timer.cancelled:
+                    continue
+                if timer.rounds:
+                    timer.rounds -= 1
+                    keep.append(timer)
+                    continue
+                timer.cancelled = True      # fired, a later cancel() is a no-op
+                self.pending -= 1
+                self.fired += 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception as e:
+                    self.loop.call_exception_handler({'message': 'timer callback failed', 'exception': e})
+
+        if self.pending:
+            # Sleep until the next bucket holding a timer, not every tick
+            for ticks in range(1, self.slots + 1):
+                if self.buckets[(self.cursor + ticks) % self.slots]:
+                    break
+            self.handle = None
+            self.schedule(self.cursor_time + ticks * self.tick)
+        else:
+            # Nothing left but cancelled timers, drop them and go idle
+            for bucket in self.buckets:
+                bucket.clear()
+            self.handle = None
+
+    def stats(self):
+        return {'pending': self.pending, 'started': self.started, 'fired': self.fired}